@@ -0,0 +1,92 @@
+"""Bookings export and bulk admin input.
+
+Exports stream straight from a MongoDB cursor: rows are formatted a batch at
+a time and handed to the response as they are read, so memory stays flat no
+matter how many bookings match. The filters select on ``_id`` ranges (an
+ObjectId carries its creation time) and the indexed status/trip fields, so
+a month's bookings are one index range scan.
+
+Trip imports accept CSV (one row per trip, header ``name,price,spots,...``)
+or a JSON array of objects with the same keys.
+"""
+import csv
+import datetime
+import io
+import itertools
+import json
+
+from bson.objectid import ObjectId
+
+EXPORT_FIELDS = ('_id', 'date', 'name', 'email', 'trip', 'trip_slug', 'travel_date', 'status', 'payment_status',
+                 'amount', 'razorpay_order_id', 'razorpay_payment_id', 'hold', 'seats')
+TRIP_FIELDS = ('name', 'slug', 'description', 'price', 'spots', 'image')
+ROWS_PER_CHUNK = 500
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_day(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d") if value else None
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def booking_filter(status=None, trip=None, date_from=None, date_to=None):
+    """Query for bookings made between ``date_from`` and ``date_to`` (inclusive, YYYY-MM-DD) with the given status and trip."""
+    query = {}
+    if status: query['status'] = status
+    if trip: query['trip'] = trip
+    start, end = parse_day(date_from), parse_day(date_to)
+    if start or end:
+        query['_id'] = {}
+        if start: query['_id']['$gte'] = ObjectId.from_datetime(start)
+        if end: query['_id']['$lt'] = ObjectId.from_datetime(end + datetime.timedelta(days=1))
+    return query
+
+
+def _cell(value):
+    return '' if value is None else str(value)
+
+
+def export_csv(cursor, fields=EXPORT_FIELDS):
+    """Yield CSV text for every document in ``cursor``, ROWS_PER_CHUNK rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in chunked(cursor, ROWS_PER_CHUNK):
+        writer.writerows([_cell(doc.get(field)) for field in fields] for doc in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_ndjson(cursor, fields=EXPORT_FIELDS):
+    """Yield one JSON object per line for every document in ``cursor``."""
+    for batch in chunked(cursor, ROWS_PER_CHUNK):
+        yield ''.join(json.dumps({field: doc.get(field) for field in fields if field in doc}, default=str) + '\n'
+                      for doc in batch)
+
+
+def read_trip_rows(file):
+    """Rows of an uploaded trips file as dicts, numbered from 1 as the admin sees them. Raises ValueError if unreadable."""
+    text = file.read().decode('utf-8-sig')
+    if (file.filename or '').lower().endswith('.json') or text.lstrip().startswith('['):
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("JSON imports must be an array of trip objects")
+        return list(enumerate(rows, start=1))
+    # Line 1 is the header
+    return list(enumerate(csv.DictReader(io.StringIO(text)), start=2))
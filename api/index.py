@@ -0,0 +1,8 @@
+"""Vercel entry point (see vercel.json): the Flask app in app.py, served as one Python function."""
+import os
+import sys
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from app import app  # noqa: E402,F401
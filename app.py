@@ -2,24 +2,33 @@ import os
 import re
 import datetime
 import time
-import certifi
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from flask_mail import Mail, Message
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, send_file, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
-from pymongo import MongoClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson.objectid import ObjectId
 from itsdangerous import URLSafeTimedSerializer
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 from werkzeug.middleware.proxy_fix import ProxyFix
-import razorpay
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
+import click
+import db
+import metrics
+from catalog_cache import CatalogCache
+from response_cache import ResponseCache, SharedVersion
+from outbox import Outbox
+from invoice import InvoiceStore
+from assets import AssetPipeline
+from images import LocalDerivatives, make_picture_sources
+from media import MediaUploader
+from payments import LazyClient, make_client, get_or_create_order
+from inventory import SeatInventory, parse_spots
+from reconcile import PaymentReconciler
+from search import TripSearch
+from template_cache import FragmentCache, TemplateBytecodeCache
+from schema import BOOKING, FILL_FIELDS, ITINERARY_DAY, NUMERIC_FIELDS, PROJECTIONS, TRIP, SchemaError, clean, migrate_numbers
+from admin_bulk import TRIP_FIELDS, booking_filter, chunked, export_csv, export_ndjson, read_trip_rows
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'), override=True)
 
@@ -41,36 +50,101 @@ try:
 except OSError:
     print("⚠️ Warning: Could not create upload folder. (Likely read-only filesystem on Vercel)")
 
+# --- INSTRUMENTATION ---
+# Every response carries a Server-Timing breakdown (mongo, razorpay, smtp, cloudinary, reportlab, jinja);
+# histograms from all workers are summed in MongoDB and served at /metrics for Prometheus.
+request_metrics = metrics.Metrics(
+    flush_interval=int(os.environ.get('METRICS_FLUSH_INTERVAL', 10)),
+    slow_request_ms=int(os.environ.get('SLOW_REQUEST_MS', 1000)),
+    token=os.environ.get('METRICS_TOKEN')
+)
+request_metrics.bind(db.metrics, is_configured=db.is_configured)
+request_metrics.init_app(app)
+db.event_listeners.append(metrics.MongoTimer())
+
+# --- STATIC ASSETS ---
+# `python assets.py build` fingerprints and precompresses static/; templates link through asset_url()
+# so built files are served from /assets/ with immutable caching. Unbuilt files fall back to /static/.
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = int(os.environ.get('STATIC_MAX_AGE', 3600))
+assets = AssetPipeline(app.static_folder, app.template_folder)
+assets.init_app(app)
+
+# Responsive images: Cloudinary uploads carry their width ladder on the document (image_variants);
+# files under UPLOAD_FOLDER use the derivatives written by `python images.py`.
+local_images = LocalDerivatives(UPLOAD_FOLDER)
+app.jinja_env.globals['picture_sources'] = make_picture_sources(local_images, assets.url)
+
+# --- TEMPLATES ---
+# `flask compile-templates` (run by the Dockerfile and the Vercel build) ships every template precompiled, so workers load bytecode
+# instead of compiling source. Trip cards and itinerary days are rendered once per trip and reused (trip_fragment).
+app.jinja_env.bytecode_cache = TemplateBytecodeCache(os.environ.get('TEMPLATE_CACHE_DIR') or os.path.join(app.root_path, '.template-cache'))
+fragments = FragmentCache(max_entries=int(os.environ.get('FRAGMENT_CACHE_SIZE', 4096)))
+# Fragment -> (template, the trip fields it shows)
+TRIP_FRAGMENTS = {
+    'card': ('fragments/trip_card.html', ('name', 'slug', 'price', 'availability', 'image', 'image_variants')),
+    'itinerary': ('fragments/itinerary.html', ('itinerary',)),
+}
+
+def fragment_field(trip, field):
+    # Cards show availability, not the seat count, so a booking only re-renders one that changes it
+    return inventory.availability(trip.get('spots')) if field == 'availability' else trip.get(field)
+
+def trip_fragment(name, trip):
+    """A trip's rendered card or itinerary days, reused until one of the fields it shows changes."""
+    template, fields = TRIP_FRAGMENTS[name]
+    return fragments.get(name, [fragment_field(trip, field) for field in fields],
+                         lambda: app.jinja_env.get_template(template).render(trip=trip))
+
+app.jinja_env.globals['trip_fragment'] = trip_fragment
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def slugify(value):
+    # 'Mechuka Valley' -> 'mechuka-valley'. Also normalises legacy URLs like 'tawang-&-bomdila'.
+    return re.sub(r'[^a-z0-9]+', '-', (value or '').lower()).strip('-')
+
+app.jinja_env.filters['slugify'] = slugify
+
 # --- 2. MONGODB ATLAS CONNECTION ---
-ca = certifi.where()
-MONGO_URI = os.environ.get('MONGO_URI') # Ensure this is set in your environment variables
+# db.py creates the client lazily in each process (no network round trip at import, safe across
+# gunicorn forks) and exposes collections through accessors such as db.trips().
+if not db.is_configured():
+    print("\n❌ CONFIG ERROR: Invalid MONGO_URI detected. Please check your .env file.\n")
 
-# Initialize collections to None to prevent NameError if connection fails
-bookings_collection = None
-trips_collection = None
-users_collection = None
-reviews_collection = None
+# Catalog, review and dashboard reads go to secondaries through db.replica(); bookings and payments stay on
+# the primary. A visitor's own writes are remembered in their (signed) session cookie as a causal position,
+# cluster and operation time, and their next reads wait for it in a causal session: the booking made in
+# book_trip() is there on the payment page, and the status an admin just set is on the dashboard, whichever
+# node or worker serves the next request.
 
-try:
-    if not MONGO_URI or "replace_with" in MONGO_URI or "your_mongo_string" in MONGO_URI:
-        raise ValueError("Invalid MONGO_URI detected. Please check your .env file.")
-
-    client = MongoClient(MONGO_URI, tlsCAFile=ca)
-    client.admin.command('ping') # Force connection check
-    db = client['dhou-wanderer']
-    bookings_collection = db['bookings']
-    trips_collection = db['trips'] 
-    users_collection = db['users']
-    reviews_collection = db['reviews']
-    print("✅ Successfully connected to MongoDB Atlas!")
-except Exception as e:
-    if "DNS query name does not exist" in str(e):
-        print("\n❌ CONFIG ERROR: The MongoDB address in your .env file is incorrect.")
-        print("   Please copy the full connection string from MongoDB Atlas (Connect -> Drivers).\n")
-    print(f"❌ MongoDB Connection Error: {e}")
+def remember_writes(position):
+    if position is not None:
+        session['read_after'] = db.dump_position(position)
+
+def own_writes():
+    """The causal position of this visitor's latest remembered write, for db.causal_session()."""
+    return db.load_position(session.get('read_after'))
+
+# --- CATALOG CACHE ---
+# Trips only change through the admin CMS, so home() and trip_details() read them from memory.
+catalog_cache = CatalogCache(
+    max_entries=int(os.environ.get('CATALOG_CACHE_SIZE', 256)),
+    ttl=int(os.environ.get('CATALOG_CACHE_TTL', 300)),
+    version_check_interval=int(os.environ.get('CATALOG_VERSION_CHECK_INTERVAL', 2))
+)
+# Loaders read from secondaries after catalog_cache.read_after, the primary's position when the version last changed
+catalog_cache.bind(db.meta, clock=db.latest_position)
+
+# --- RESPONSE CACHE ---
+# Rendered home and itinerary pages, gzip-compressed, keyed by the catalog and review versions.
+# Admin trip edits bump the catalog version (catalog_cache.invalidate) and submit_review bumps review_version.
+review_version = SharedVersion('review_version', check_interval=int(os.environ.get('CATALOG_VERSION_CHECK_INTERVAL', 2)))
+review_version.bind(db.meta, clock=db.latest_position)
+response_cache = ResponseCache(
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_MB', 32)) * 1024 * 1024,
+    versions=lambda: (catalog_cache.version, review_version.value)
+)
 
 # --- 3. EMAIL CONFIGURATION ---
 mail_username = os.environ.get('MAIL_USERNAME')
@@ -87,82 +161,375 @@ app.config.update(
     MAIL_PASSWORD=mail_password,
     MAIL_DEFAULT_SENDER=('Wanderer Travels', mail_username) if mail_username else None
 )
-mail = Mail(app)
+
+# Flask-Mail is only imported when something is actually sent (the outbox worker or the admin reminder)
+_mail = None
+
+def get_mail():
+    global _mail
+    if _mail is None:
+        from flask_mail import Mail
+        _mail = Mail(app)
+    return _mail
+
+# Routes queue mail in MongoDB and return; a background sender delivers it over one pooled SMTP connection.
+# Set OUTBOX_WORKER=off when running `flask outbox-worker` as a separate process instead.
+outbox = Outbox(
+    batch_size=int(os.environ.get('OUTBOX_BATCH_SIZE', 20)),
+    max_attempts=int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5)),
+    backoff_base=int(os.environ.get('OUTBOX_BACKOFF_SECONDS', 30))
+)
+outbox.bind(app, get_mail, db.email_outbox)
+OUTBOX_THREAD = os.environ.get('OUTBOX_WORKER', 'thread') == 'thread'
+# Serverless (Vercel) freezes a function once it has responded, so a sender thread never gets to run there:
+# set OUTBOX_WORKER=off and CRON_SECRET, and the cron in vercel.json calls /tasks/drain-outbox instead.
+CRON_SECRET = os.environ.get('CRON_SECRET')
+OUTBOX_DRAIN_SECONDS = int(os.environ.get('OUTBOX_DRAIN_SECONDS', 20))
+
+# --- INVOICES ---
+# PDFs are rendered in a process pool (INVOICE_WORKERS=0 renders inline) and stored by payment id,
+# so the receipt email, its retries and re-downloads all reuse the same file.
+invoices = InvoiceStore(workers=int(os.environ.get('INVOICE_WORKERS', 2)))
+invoices.bind(db.invoices)
+outbox.register_attachment_loader('invoice', lambda payment_id: invoices.get_or_create(payment_id))
 
 # --- RAZORPAY CONFIGURATION ---
-razorpay_client = razorpay.Client(auth=(os.environ.get('RAZORPAY_KEY_ID'), os.environ.get('RAZORPAY_KEY_SECRET')))
+# One pooled keep-alive session with explicit timeouts, so a slow Razorpay can't pin a worker indefinitely.
+# The SDK is imported and the session opened on first use, not at startup.
+razorpay_client = LazyClient(lambda: make_client(
+    os.environ.get('RAZORPAY_KEY_ID'), os.environ.get('RAZORPAY_KEY_SECRET'),
+    connect_timeout=float(os.environ.get('RAZORPAY_CONNECT_TIMEOUT', 3.05)),
+    read_timeout=float(os.environ.get('RAZORPAY_READ_TIMEOUT', 10))
+))
 
 # --- CLOUDINARY CONFIGURATION ---
-cloudinary.config(
+# Applied by the uploader before its first upload (see media.configure below)
+if not os.environ.get('CLOUDINARY_API_KEY') or not os.environ.get('CLOUDINARY_API_SECRET'):
+    print("\n❌ CONFIG ERROR: Cloudinary credentials (API KEY or SECRET) are missing.\n   Image uploads will fail. Please check your .env file.\n")
+
+# A trip's images upload in parallel, and files already on Cloudinary (same SHA-256) are never sent twice
+media = MediaUploader(max_workers=int(os.environ.get('UPLOAD_WORKERS', 8)))
+media.bind(db.media_hashes)
+media.configure(
     cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'),
     api_key=os.environ.get('CLOUDINARY_API_KEY'),
     api_secret=os.environ.get('CLOUDINARY_API_SECRET')
 )
 
-if not os.environ.get('CLOUDINARY_API_KEY') or not os.environ.get('CLOUDINARY_API_SECRET'):
-    print("\n❌ CONFIG ERROR: Cloudinary credentials (API KEY or SECRET) are missing.\n   Image uploads will fail. Please check your .env file.\n")
+# --- WORKER PROCESSES ---
+# gunicorn.conf.py imports the app once in the master (preload) and forks workers from it.
+
+def after_fork():
+    """Drop the MongoDB, Razorpay and Cloudinary clients and pools a worker inherited from the master.
+
+    Each of them is also rebuilt lazily when its owner notices a new pid; doing it here releases
+    the inherited sockets and pool handles before the worker serves its first request.
+    """
+    db.reset()
+    razorpay_client.reset()
+    media.reset()
+    invoices.reset()
+
+def find_trip(slug):
+    """Resolve a trip by its indexed slug, served from the catalog cache."""
+    slug = slugify(slug)
+    if not slug: return None
+
+    def load():
+        trips = db.replica(db.trips())
+        with db.causal_session(catalog_cache.read_after) as s:
+            trip = trips.find_one({"slug": slug}, session=s)
+            if trip is None and has_legacy_trips():
+                # Trips created before slugs existed: match the name the old way and store the slug
+                # so the next lookup is an indexed equality query. `flask backfill-slugs` does this in bulk.
+                pattern = re.escape(slug).replace('\\-', '[^a-z0-9]+')
+                trip = trips.find_one({"slug": {"$exists": False}, "name": {"$regex": f"^{pattern}$", "$options": "i"}}, session=s)
+                if trip is not None:
+                    db.trips().update_one({"_id": trip['_id']}, {"$set": {"slug": slug}})
+                    trip['slug'] = slug
+        return trip
+
+    return catalog_cache.get(('trip', slug), load)
+
+def has_legacy_trips():
+    """Whether any trip still lacks a slug. Once none do, unknown slugs (dead links, bots) cost one indexed
+    lookup instead of a regex scan; cached per catalog version, which every trip write bumps."""
+    def load():
+        with db.causal_session(catalog_cache.read_after) as s:
+            return db.replica(db.trips()).find_one({"slug": {"$exists": False}}, {"_id": 1}, session=s) is not None
+
+    return catalog_cache.get(('legacy_slugs',), load)
+
+def trip_list(view):
+    """The whole catalog, each trip read with the named projection (see schema.PROJECTIONS)."""
+    def load():
+        with db.causal_session(catalog_cache.read_after) as s:
+            return list(db.replica(db.trips()).find({}, PROJECTIONS[view], session=s))
+
+    return catalog_cache.get(('list', view), load)
+
+def booking_trip(booking):
+    """The trip a booking is for, read by the trip_id stored at booking time (never the name or slug the
+    visitor sent). Bookings from before trip_id was stored fall back to their slug or name."""
+    if booking.get('trip_id') is not None:
+        return db.trips().find_one({"_id": booking['trip_id']}, {"name": 1, "slug": 1, "price": 1})
+    return find_trip(booking.get('trip_slug') or booking.get('trip'))
+
+def trip_price(trip):
+    # Prices are ints since `flask migrate-schema`; older trips may still hold strings, so blanks and junk are 0
+    try: return int((trip or {}).get('price') or 0)
+    except (TypeError, ValueError): return 0
+
+# --- SEAT INVENTORY ---
+# trips.spots is the number of seats left. Booking takes a seat with one conditional update and holds it
+# for SEAT_HOLD_MINUTES while unpaid. Pages show availability rather than the count (sold out, FEW_SPOTS_LEFT
+# or fewer, or open), so only a booking that moves a trip between those refreshes the cached pages.
+inventory = SeatInventory(hold_minutes=int(os.environ.get('SEAT_HOLD_MINUTES', 15)),
+                          sweep_limit=int(os.environ.get('SEAT_HOLD_SWEEP_LIMIT', 50)),
+                          few_left=int(os.environ.get('FEW_SPOTS_LEFT', 5)))
+inventory.bind(db.trips, db.bookings, on_availability_change=lambda: catalog_cache.invalidate())
+app.jinja_env.globals['availability'] = inventory.availability
+
+# --- SEARCH ---
+# Home page search runs against an inverted index of the catalog (names, descriptions, itinerary days),
+# rebuilt in each worker whenever the cached trip list is reloaded. See search.py.
+trip_search = TripSearch(max_results=int(os.environ.get('SEARCH_MAX_RESULTS', 24)))
+
+# --- BOOKINGS & REVENUE LEDGER ---
+# Revenue is kept per trip in revenue_ledger and adjusted whenever a booking moves in or out of
+# 'Confirmed', so the dashboard never has to scan bookings to total it.
+
+def set_booking_status(booking_id, fields):
+    """Update a booking and keep the revenue ledger in step. Returns the booking as it was before."""
+    booking = db.bookings().find_one({"_id": booking_id})
+    if booking is None: return None
+
+    fields = dict(fields)
+    if fields.get('status') == 'Confirmed' and booking.get('status') != 'Confirmed':
+        # Freeze the amount so a later un-confirm subtracts exactly what was added
+        fields['amount'] = trip_price(booking_trip(booking))
+
+    before = db.bookings().find_one_and_update({"_id": booking_id}, {"$set": fields}, return_document=ReturnDocument.BEFORE)
+    if before is None: return None
+
+    was_confirmed = before.get('status') == 'Confirmed'
+    is_confirmed = fields.get('status', before.get('status')) == 'Confirmed'
+    if was_confirmed != is_confirmed:
+        sign = 1 if is_confirmed else -1
+        amount = fields.get('amount') if is_confirmed else before.get('amount')
+        if amount is None:
+            amount = trip_price(booking_trip(before))
+        db.revenue_ledger().update_one(
+            {"_id": before.get('trip')},
+            {"$inc": {"revenue": sign * amount, "confirmed": sign}},
+            upsert=True
+        )
+
+    # Seats follow the booking: confirming keeps its hold, cancelling gives the seats back
+    if is_confirmed and not was_confirmed:
+        inventory.confirm(before)
+    elif fields.get('status') == 'Cancelled' and before.get('status') != 'Cancelled':
+        inventory.cancel(before)
+    return before
+
+BULK_BATCH_SIZE = 1000
+
+def set_bookings_status(query, status):
+    """set_booking_status() for every booking matching ``query``, a batch at a time.
+
+    Each batch is one bulk_write to the bookings, one to the revenue ledger and one to the trips' seats,
+    instead of three round trips per booking. Returns how many bookings changed.
+    """
+    prices = {}
+    def price(booking):
+        key = booking.get('trip_id') or booking.get('trip_slug') or booking.get('trip')
+        if key not in prices: prices[key] = trip_price(booking_trip(booking))
+        return prices[key]
+
+    changed = 0
+    projection = {"trip": 1, "trip_slug": 1, "status": 1, "amount": 1, "hold": 1, "trip_id": 1, "seats": 1}
+    cursor = db.bookings().find({**query, "status": {"$ne": status}}, projection).batch_size(BULK_BATCH_SIZE)
+    for batch in chunked(cursor, BULK_BATCH_SIZE):
+        run = ObjectId()
+        updates, amounts = [], {}
+        for booking in batch:
+            update = {"$set": {"status": status, "status_changed_by": run}}
+            if status == 'Confirmed':
+                update["$set"]["amount"] = amounts[booking['_id']] = price(booking)
+                if booking.get('hold') == 'held':
+                    update["$set"]["hold"] = "confirmed"
+                    update["$unset"] = {"hold_expires_at": ""}
+            if status == 'Cancelled' and booking.get('hold') in ('held', 'confirmed'):
+                update["$set"]["hold"] = "released"
+                update["$unset"] = {"hold_expires_at": ""}
+            # Conditional on the status and hold we read: a booking that payment_verify() or the hold
+            # sweeper changed meanwhile is skipped, and `run` tells which ones this batch did change
+            updates.append(UpdateOne({"_id": booking['_id'], "status": booking.get('status'), "hold": booking.get('hold')}, update))
+        db.bookings().bulk_write(updates, ordered=False)
+        modified = {b['_id'] for b in db.bookings().find({"_id": {"$in": [b['_id'] for b in batch]}, "status_changed_by": run}, {"_id": 1})}
+        changed += len(modified)
+
+        # Revenue and seats follow only the bookings this batch changed
+        ledger, seats, lost_holds = {}, {}, []
+        for booking in batch:
+            if booking['_id'] not in modified: continue
+            revenue, confirmed = ledger.get(booking.get('trip'), (0, 0))
+            if status == 'Confirmed':
+                ledger[booking.get('trip')] = (revenue + amounts[booking['_id']], confirmed + 1)
+                if booking.get('hold') in ('expired', 'released'):
+                    lost_holds.append(booking)
+            elif booking.get('status') == 'Confirmed':
+                amount = booking.get('amount')
+                ledger[booking.get('trip')] = (revenue - (price(booking) if amount is None else amount), confirmed - 1)
+            if status == 'Cancelled' and booking.get('hold') in ('held', 'confirmed'):
+                seats[booking['trip_id']] = seats.get(booking['trip_id'], 0) + booking.get('seats', 1)
+
+        ledger_updates = [UpdateOne({"_id": trip}, {"$inc": {"revenue": revenue, "confirmed": confirmed}}, upsert=True)
+                          for trip, (revenue, confirmed) in ledger.items() if revenue or confirmed]
+        if ledger_updates: db.revenue_ledger().bulk_write(ledger_updates, ordered=False)
+        seat_updates = [UpdateOne({"_id": trip_id, "spots": {"$type": "number"}}, {"$inc": {"spots": n}})
+                        for trip_id, n in seats.items()]
+        if seat_updates:
+            db.trips().bulk_write(seat_updates, ordered=False)
+            catalog_cache.invalidate()
+        # Holds that already lapsed have to win their seats back one by one
+        for booking in lost_holds:
+            inventory.confirm(booking)
+    return changed
+
+# --- REVIEWS ---
+# Each sort mode walks one of the (trip_name, date, _id) / (trip_name, rating, _id) indexes;
+# _id breaks ties so a cursor always points at exactly one review.
+REVIEWS_PER_PAGE = 5
+
+REVIEW_SORTS = {
+    'newest': ('date', -1),
+    'oldest': ('date', 1),
+    'highest': ('rating', -1),
+    'lowest': ('rating', 1),
+}
+
+def encode_review_cursor(review, field):
+    return f"{review.get(field)}.{review['_id']}"
+
+def decode_review_cursor(token, field):
+    try:
+        value, last_id = token.rsplit('.', 1)
+        return (int(value) if field == 'rating' else value), ObjectId(last_id)
+    except Exception:
+        return None
+
+def review_page_query(trip_name, sort_option, per_page, page=1, after=None, before=None):
+    """Keyset pagination over a trip's reviews: the find() arguments for one page.
+
+    Pages are addressed by the review on their edge, so page 500 costs the
+    same indexed range read as page 1. Returns (filter, sort, skip, limit).
+    """
+    field, direction = REVIEW_SORTS.get(sort_option, REVIEW_SORTS['newest'])
+    scan = -direction if before else direction
+    query = {"trip_name": trip_name}
+
+    edge = decode_review_cursor(before or after, field) if (before or after) else None
+    if edge:
+        op = '$gt' if scan == 1 else '$lt'
+        value, last_id = edge
+        query['$or'] = [{field: {op: value}}, {field: value, "_id": {op: last_id}}]
+
+    # Old ?page=N links without a cursor still work, at skip() cost
+    skip = (page - 1) * per_page if not edge and page > 1 else 0
+    return query, [(field, scan), ("_id", scan)], skip, per_page + 1
+
+def review_page_result(docs, sort_option, per_page, page=1, before=None):
+    """Turn the documents read for review_page_query() into (reviews, prev_cursor, next_cursor)."""
+    field = REVIEW_SORTS.get(sort_option, REVIEW_SORTS['newest'])[0]
+    backwards = bool(before)
+    has_more = len(docs) > per_page
+    docs = docs[:per_page]
+    if backwards:
+        docs.reverse()
+    if not docs:
+        return [], None, None
+
+    has_next = True if backwards else has_more
+    has_prev = has_more if backwards else page > 1
+    prev_cursor = encode_review_cursor(docs[0], field) if has_prev else None
+    next_cursor = encode_review_cursor(docs[-1], field) if has_next else None
+    return docs, prev_cursor, next_cursor
+
+def fetch_reviews_page(trip_name, sort_option, per_page, page=1, after=None, before=None, session=None):
+    query, sort, skip, limit = review_page_query(trip_name, sort_option, per_page, page, after, before)
+    docs = list(db.replica(db.reviews()).find(query, session=session).sort(sort).skip(skip).limit(limit))
+    return review_page_result(docs, sort_option, per_page, page, before)
+
+# Shared by the Flask routes below and the async read path in asgi.py
+
+def home_view(search_query):
+    """The projection the home page reads trips with: searching needs their text, the cards don't."""
+    return 'search' if search_query else 'card'
+
+def home_trips(all_trips, search_query):
+    """The trips the home page lists: the whole catalog, or the best search matches for ``q``."""
+    return trip_search.search(all_trips, search_query) if search_query else all_trips
+
+def review_page_args():
+    """(page, sort_option, after, before) from the itinerary page's query string."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    sort_option = request.args.get('sort', 'newest')
+    if sort_option not in REVIEW_SORTS: sort_option = 'newest'
+    return page, sort_option, request.args.get('after'), request.args.get('before')
+
+def render_trip_details(trip_data, summary, reviews_page, page, sort_option, per_page=REVIEWS_PER_PAGE):
+    # Count and average come from the summary submit_review() maintains, not from the reviews themselves
+    summary = summary or {}
+    review_count = summary.get('count', 0)
+    avg_rating = summary.get('sum', 0) / review_count if review_count > 0 else 0
+    total_pages = max((review_count + per_page - 1) // per_page, 1)
+    reviews, prev_cursor, next_cursor = reviews_page
+    return render_template('details.html', trip=trip_data, reviews=reviews, avg_rating=round(avg_rating, 1), review_count=review_count, page=page, total_pages=total_pages, sort_option=sort_option, prev_cursor=prev_cursor, next_cursor=next_cursor)
+
+def render_payment(booking, trip_name, price, order):
+    return render_template('payment.html', 
+                           trip=trip_name, 
+                           amount=price, 
+                           order=order,
+                           key_id=os.environ.get('RAZORPAY_KEY_ID'),
+                           user_email=booking.get('email'),
+                           user_name=booking.get('name'))
 
 # --- 4. WEBSITE ROUTES ---
 
 @app.route('/')
+@response_cache.cached(args=('q',))
 def home():
-    if trips_collection is None: return "Database Connection Error", 500
+    if not db.is_configured(): return "Database Connection Error", 500
     
-    # Search Logic
+    # Search Logic: ranked lookups in the in-memory index over the cached catalog
     search_query = request.args.get('q')
-    query = {"name": {"$regex": search_query, "$options": "i"}} if search_query else {}
-    
-    all_trips = list(trips_collection.find(query))
-    return render_template('index.html', trips=all_trips, search_query=search_query)
+    all_trips = trip_list(home_view(search_query))
+    return render_template('index.html', trips=home_trips(all_trips, search_query), search_query=search_query)
 
 @app.route('/itinerary/<trip_name>')
+@response_cache.cached(args=('page', 'sort', 'after', 'before'))
 def trip_details(trip_name):
-    if trips_collection is None: return "Database Connection Error", 500
+    if not db.is_configured(): return "Database Connection Error", 500
     
-    # Use regex for case-insensitive matching (handles 'Bihar', 'bihar', 'Bihar Trip' vs 'bihar-trip')
-    search_name = re.escape(trip_name.replace('-', ' '))
-    trip_data = trips_collection.find_one({"name": {"$regex": f"^{search_name}$", "$options": "i"}})
+    # Slug lookup handles 'Bihar', 'bihar', 'Bihar Trip' vs 'bihar-trip' with a single indexed query
+    trip_data = find_trip(trip_name)
     
     if not trip_data:
         return "Trip not found", 404
         
     # Fetch reviews
-    reviews = []
-    avg_rating = 0
-    review_count = 0
-    page = request.args.get('page', 1, type=int)
-    sort_option = request.args.get('sort', 'newest')
-    per_page = 5
-    total_pages = 1
-
-    if reviews_collection is not None:
-        query = {"trip_name": trip_data['name']}
-        review_count = reviews_collection.count_documents(query)
-        
-        if review_count > 0:
-            # Calculate average rating using aggregation
-            pipeline = [{"$match": query}, {"$group": {"_id": None, "avg_rating": {"$avg": "$rating"}}}]
-            agg_result = list(reviews_collection.aggregate(pipeline))
-            if agg_result: avg_rating = agg_result[0]['avg_rating']
-            
-            total_pages = (review_count + per_page - 1) // per_page
-            
-            # Sort Logic
-            sort_criteria = [("date", -1)] # Default: Newest
-            if sort_option == 'oldest':
-                sort_criteria = [("date", 1)]
-            elif sort_option == 'highest':
-                sort_criteria = [("rating", -1)]
-            elif sort_option == 'lowest':
-                sort_criteria = [("rating", 1)]
-
-            reviews = list(reviews_collection.find(query).sort(sort_criteria).skip((page - 1) * per_page).limit(per_page))
-            
-    return render_template('details.html', trip=trip_data, reviews=reviews, avg_rating=round(avg_rating, 1), review_count=review_count, page=page, total_pages=total_pages, sort_option=sort_option)
+    page, sort_option, after, before = review_page_args()
+    # From a secondary, once it has every review the current review_version covers
+    with db.causal_session(review_version.read_after) as s:
+        summary = db.replica(db.review_summaries()).find_one({"_id": trip_data['name']}, session=s)
+        reviews_page = fetch_reviews_page(trip_data['name'], sort_option, REVIEWS_PER_PAGE, page=page, after=after, before=before, session=s)
+    return render_trip_details(trip_data, summary, reviews_page, page, sort_option)
 
 @app.route('/submit-review', methods=['POST'])
 def submit_review():
-    if reviews_collection is None: return "Database Connection Error", 500
+    if not db.is_configured(): return "Database Connection Error", 500
     
     trip_name = request.form.get('trip_name')
     rating = request.form.get('rating')
@@ -170,177 +537,125 @@ def submit_review():
     user_name = request.form.get('user_name') or "Traveler"
     
     if rating:
-        reviews_collection.insert_one({
-            "trip_name": trip_name, "user_name": user_name, "rating": int(rating), "comment": comment, "date": datetime.datetime.now().strftime("%Y-%m-%d")
+        rating = min(max(int(rating), 1), 5)
+        db.reviews().insert_one({
+            "trip_name": trip_name, "user_name": user_name, "rating": rating, "comment": comment, "date": datetime.datetime.now().strftime("%Y-%m-%d")
         })
+        db.review_summaries().update_one(
+            {"_id": trip_name},
+            {"$inc": {"count": 1, "sum": rating, f"histogram.{rating}": 1}},
+            upsert=True
+        )
+        review_version.bump()
         
-    return redirect(url_for('trip_details', trip_name=trip_name.lower().replace(' ', '-')))
+    return redirect(url_for('trip_details', trip_name=request.form.get('trip_slug') or slugify(trip_name)))
 
 @app.route('/book', methods=['POST'])
 def book_trip():
-    if bookings_collection is None: return "Database Connection Error", 500
+    if not db.is_configured(): return "Database Connection Error", 500
 
-    destination = request.form.get('destination', 'Expedition')
-    user_name = request.form.get('full_name', 'Traveler')
-    user_email = request.form.get('email')
-    travel_date = request.form.get('travel_date')
-    
-    booking_doc = {
-        'name': user_name, 'email': user_email, 'trip': destination,
-        'travel_date': travel_date,
+    try:
+        booking_doc = clean(BOOKING, {'name': request.form.get('full_name'), 'email': request.form.get('email'),
+                                      'trip': request.form.get('destination'), 'trip_slug': request.form.get('trip_slug'),
+                                      'travel_date': request.form.get('travel_date')})
+    except SchemaError as e:
+        return f"Invalid booking: {e}", 400
+    user_name, user_email = booking_doc['name'], booking_doc['email']
+
+    # The trip, its price and its seats all come from the one trip document the slug names; the form's
+    # destination is only checked against it, so the two can't disagree on the booking
+    trip = find_trip(booking_doc['trip_slug'] or slugify(booking_doc['trip']))
+    if trip is None:
+        return "Invalid booking: unknown trip", 400
+    if booking_doc['trip'].strip().casefold() != trip['name'].strip().casefold():
+        return "Invalid booking: destination does not match the trip", 400
+    destination = trip['name']
+    trip_slug = trip.get('slug') or slugify(destination)
+    booking_doc.update({'trip': destination, 'trip_slug': trip_slug, 'trip_id': trip['_id']})
+
+    booking_doc.update({
         'status': 'Pending', 'date': datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
         'payment_status': 'Unpaid'
-    }
+    })
+
+    # Hold a seat before anything else; when the trip is full the update matches nothing and nobody waits
+    inventory.maybe_release_expired()
+    held = None
+    left = inventory.reserve(trip['_id'])
+    if left is False:
+        return f"Sorry, {destination} is sold out.", 409
+    if left is not None:
+        held = trip['_id']
+        booking_doc.update(inventory.hold_fields(held))
     
     booking_id = None
     try:
-        result = bookings_collection.insert_one(booking_doc)
+        with db.causal_session() as s:
+            result = db.bookings().insert_one(booking_doc, session=s)
+            remember_writes(db.causal_position(s))
         booking_id = result.inserted_id
         
         try:
-            msg = Message(f"Booking Received: {destination}", recipients=[user_email])
-            msg.html = render_template('emails/booking_confirmation.html', name=user_name, trip=destination)
-            mail.send(msg)
-            print(f"✅ Booking Email sent to {user_email}")
+            html = render_template('emails/booking_confirmation.html', name=user_name, trip=destination)
+            outbox.enqueue(f"Booking Received: {destination}", [user_email], html=html, start_worker=OUTBOX_THREAD)
         except Exception as email_error:
-            print(f"❌ Email sending failed: {email_error}")
+            print(f"❌ Could not queue booking email: {email_error}")
 
         return redirect(url_for('payment_page', booking_id=booking_id))
     except Exception as e:
         print(f"Error: {e}")
+        if held is not None and booking_id is None:
+            inventory.release(held)
         flash("An error occurred while processing your booking. Please try again.")
-        return redirect(url_for('trip_details', trip_name=destination.replace(' ', '-').lower()))
+        return redirect(url_for('trip_details', trip_name=trip_slug))
 
 @app.route('/payment')
 def payment_page():
     booking_id = request.args.get('booking_id')
     if not booking_id: return redirect(url_for('home'))
     
-    if bookings_collection is None: return "Database Connection Error", 500
+    if not db.is_configured(): return "Database Connection Error", 500
     
-    booking = bookings_collection.find_one({"_id": ObjectId(booking_id)})
+    try:
+        with db.causal_session(own_writes()) as s:
+            booking = db.bookings().find_one({"_id": ObjectId(booking_id)}, session=s)
+    except Exception:
+        return "Booking not found", 404
     if not booking: return "Booking not found", 404
+    if booking.get('payment_status') == 'Paid':
+        flash("This booking has already been paid for.")
+        return redirect(url_for('home'))
+    if inventory.is_cancelled(booking):
+        return "This booking was cancelled.", 409
+    # A hold that lapsed before payment gets its seats back only if they are still free
+    if not inventory.renew(booking):
+        return f"Sorry, your seat hold expired and {booking.get('trip')} is now sold out.", 409
     
     trip_name = booking.get('trip')
-    trip = trips_collection.find_one({"name": trip_name})
-    price = int(trip.get('price', 0)) if trip else 0
-    
-    # Create Razorpay Order
-    amount_paise = price * 100
-    order_data = {
-        "amount": amount_paise,
-        "currency": "INR",
-        "receipt": str(booking_id),
-        "notes": {"trip": trip_name, "email": booking.get('email')}
-    }
+    price = trip_price(booking_trip(booking))
     
+    # Reuse the booking's Razorpay order when amount and currency still match; create one otherwise
     try:
-        order = razorpay_client.order.create(data=order_data)
-        bookings_collection.update_one({"_id": ObjectId(booking_id)}, {"$set": {"razorpay_order_id": order['id']}})
+        order = get_or_create_order(razorpay_client, db.bookings(), booking, price * 100, "INR",
+                                    notes={"trip": trip_name, "email": booking.get('email')})
     except Exception as e:
         return f"Error creating payment order: {e}", 500
 
-    return render_template('payment.html', 
-                           trip=trip_name, 
-                           amount=price, 
-                           order=order,
-                           key_id=os.environ.get('RAZORPAY_KEY_ID'),
-                           user_email=booking.get('email'),
-                           user_name=booking.get('name'))
+    return render_payment(booking, trip_name, price, order)
 
-def create_invoice(booking, price, payment_id):
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    # Define Colors
-    primary_color = colors.HexColor("#28a745")
-    text_color = colors.HexColor("#333333")
-    light_gray = colors.HexColor("#f4f4f4")
-    
-    # --- Header Section ---
-    # Logo: Try to load from static folder, fallback to text
-    logo_path = os.path.join(app.root_path, 'static', 'img', 'logo.png')
-    logo_drawn = False
-
-    # Fallback: If app.root_path fails, try current working directory
-    if not os.path.exists(logo_path):
-        logo_path = os.path.join(os.getcwd(), 'static', 'img', 'logo.png')
-    
-    # Debugging for Vercel Logs
-    if os.path.exists(logo_path):
-        print(f"✅ Logo found at: {logo_path}, Size: {os.path.getsize(logo_path)} bytes")
-        try:
-            c.drawImage(logo_path, 50, height - 100, width=120, height=50, preserveAspectRatio=True, mask='auto')
-            logo_drawn = True
-        except Exception as e:
-            print(f"❌ Error drawing logo: {e}")
-            pass
-    else:
-        print(f"❌ Logo NOT found at: {logo_path}")
-
-    if not logo_drawn:
-        c.setFont("Helvetica-Bold", 24)
-        c.setFillColor(primary_color)
-        c.drawString(50, height - 80, "Wanderer")
-
-    # Invoice Details (Top Right)
-    c.setFillColor(text_color)
-    c.setFont("Helvetica-Bold", 20)
-    c.drawRightString(width - 50, height - 70, "INVOICE")
-    
-    c.setFont("Helvetica", 10)
-    c.drawRightString(width - 50, height - 90, f"Date: {datetime.datetime.now().strftime('%Y-%m-%d')}")
-    c.drawRightString(width - 50, height - 105, f"ID: {payment_id}")
-    
-    c.setStrokeColor(colors.lightgrey)
-    c.line(50, height - 120, width - 50, height - 120)
-    
-    # --- Bill To Section ---
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(50, height - 150, "Billed To:")
-    
-    c.setFont("Helvetica", 12)
-    c.drawString(50, height - 170, booking.get('name', 'Traveler'))
-    c.drawString(50, height - 190, booking.get('email', ''))
-    
-    # --- Table Header ---
-    y = height - 240
-    c.setFillColor(light_gray)
-    c.rect(50, y, width - 100, 30, fill=1, stroke=0)
-    
-    c.setFillColor(text_color)
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(60, y + 10, "DESCRIPTION")
-    c.drawRightString(width - 60, y + 10, "AMOUNT")
-    
-    # --- Table Content ---
-    y -= 30
-    c.setFont("Helvetica", 10)
-    c.drawString(60, y + 10, f"Trip Package: {booking.get('trip')}")
-    c.drawRightString(width - 60, y + 10, f"INR {price:,.2f}")
-    
-    c.setStrokeColor(colors.lightgrey)
-    c.line(50, y, width - 50, y)
-    
-    # --- Total ---
-    y -= 40
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(width - 200, y, "Total:")
-    c.setFillColor(primary_color)
-    c.drawString(width - 60, y, f"INR {price:,.2f}")
-    
-    # --- Footer ---
-    c.setFillColor(text_color)
-    c.setFont("Helvetica-Oblique", 10)
-    c.drawCentredString(width / 2, 50, "Thank you for traveling with Wanderer!")
-    
-    c.save()
-    buffer.seek(0)
-    return buffer
+def receipt_email(booking, payment_id):
+    """The receipt for a paid booking as Outbox.enqueue() arguments, and the price its invoice shows."""
+    html = render_template('emails/booking_success_email.html', name=booking['name'], trip=booking['trip'], payment_id=payment_id, date=datetime.datetime.now().strftime("%d %b, %Y"))
+    # Attach Invoice: rendered by the outbox worker when the email goes out, not in this request
+    price = trip_price(booking_trip(booking))
+    message = {"subject": f"Booking Successful: {booking['trip']}", "recipients": [booking['email']], "html": html,
+               "attachment_refs": [("Invoice.pdf", "application/pdf", "invoice", payment_id)]}
+    return message, price
 
 @app.route('/payment/verify', methods=['POST'])
 def payment_verify():
+    from razorpay.errors import SignatureVerificationError
+
     # Get payment details from form
     payment_id = request.form.get('razorpay_payment_id')
     order_id = request.form.get('razorpay_order_id')
@@ -356,36 +671,41 @@ def payment_verify():
         # Verify signature
         razorpay_client.utility.verify_payment_signature(params_dict)
         
-        if bookings_collection is not None:
-            booking = bookings_collection.find_one({'razorpay_order_id': order_id})
+        if db.is_configured():
+            with db.causal_session(own_writes()) as s:
+                booking = db.bookings().find_one({'razorpay_order_id': order_id}, session=s)
             if booking:
                 print(f"✅ Payment Verified. Updating Booking {booking['_id']} to Paid/Confirmed.")
-                bookings_collection.update_one({'_id': booking['_id']}, {'$set': {'payment_status': 'Paid', 'status': 'Confirmed'}})
+                set_booking_status(booking['_id'], {'payment_status': 'Paid', 'status': 'Confirmed', 'razorpay_payment_id': payment_id})
+                session['invoices'] = (session.get('invoices') or [])[-9:] + [payment_id]
                 
-                # Send Receipt Email
+                # Queue Receipt Email
                 try:
-                    msg = Message(f"Booking Successful: {booking['trip']}", recipients=[booking['email']])
-                    msg.html = render_template('emails/booking_success_email.html', name=booking['name'], trip=booking['trip'], payment_id=payment_id, date=datetime.datetime.now().strftime("%d %b, %Y"))
-                    
-                    # Generate and Attach Invoice
-                    trip_data = trips_collection.find_one({"name": booking['trip']})
-                    price = trip_data.get('price', '0') if trip_data else '0'
-                    pdf = create_invoice(booking, price, payment_id)
-                    msg.attach("Invoice.pdf", "application/pdf", pdf.read())
-                    
-                    mail.send(msg)
-                    print(f"✅ Receipt Email sent to {booking['email']}")
+                    message, price = receipt_email(booking, payment_id)
+                    invoices.request(payment_id, booking, price)
+                    outbox.enqueue(**message, start_worker=OUTBOX_THREAD)
                 except Exception as e:
-                    print(f"❌ Error sending receipt email: {e}")
+                    print(f"❌ Error queueing receipt email: {e}")
                 
-                return render_template('booking_success.html', booking=booking)
+                return render_template('booking_success.html', booking=booking, payment_id=payment_id)
             else:
                 print(f"❌ Error: Booking not found for Order ID {order_id}")
 
         return redirect(url_for('home'))
-    except razorpay.errors.SignatureVerificationError:
+    except SignatureVerificationError:
         return "Payment Verification Failed", 400
 
+@app.route('/invoice/<payment_id>')
+def download_invoice(payment_id):
+    # Only the admin and the browser that completed the payment may download an invoice
+    if not session.get('admin_logged_in') and payment_id not in (session.get('invoices') or []):
+        return "Invoice not found", 404
+    if not db.is_configured(): return "Database Connection Error", 500
+
+    pdf = invoices.get_or_create(payment_id)
+    if pdf is None: return "Invoice not found", 404
+    return send_file(io.BytesIO(pdf), mimetype='application/pdf', as_attachment=True, download_name=f"Invoice-{payment_id}.pdf")
+
 # --- 5. ADMIN CMS ROUTES ---
 
 @app.route('/admin-login', methods=['GET', 'POST'])
@@ -407,9 +727,12 @@ def admin_forgot_password():
         return redirect(url_for('admin_login'))
 
     try:
+        from flask_mail import Message
+        mail = get_mail()  # registers the extension Message() reads its default sender from
         msg = Message("Admin Password Reminder", recipients=[admin_email])
         msg.body = f"Hello,\n\nYour Admin Password is: {os.environ.get('ADMIN_PASSWORD')}\n\nKeep it safe!"
-        mail.send(msg)
+        with metrics.timed('smtp'):
+            mail.send(msg)
         flash(f"Password reminder sent to {admin_email}")
     except Exception as e:
         print(f"Error sending email: {e}")
@@ -426,57 +749,164 @@ def admin_page():
     if not session.get('admin_logged_in'):
         return redirect(url_for('admin_login'))
     
-    if bookings_collection is None or trips_collection is None:
+    if not db.is_configured():
         return "Database Connection Error", 500
 
-    all_bookings = list(bookings_collection.find().sort('_id', -1))
-    all_trips = list(trips_collection.find())
-    
-    # Dynamic revenue calculation based on actual trip prices
-    # Added safety check: (t.get('price') or 0) ensures we don't crash on empty strings or None
-    trip_prices = {}
-    for t in all_trips:
-        try: trip_prices[t.get('name')] = int(t.get('price') or 0)
-        except ValueError: trip_prices[t.get('name')] = 0
-        
-    total_revenue = sum(trip_prices.get(b.get('trip'), 0) for b in all_bookings if b.get('status') == 'Confirmed')
+    # Bookings are paged newest-first by _id, optionally filtered by status and trip
+    per_page = 50
+    status_filter = request.args.get('status') or None
+    trip_filter = request.args.get('trip') or None
+    query = {}
+    if status_filter: query['status'] = status_filter
+    if trip_filter: query['trip'] = trip_filter
+
+    after, before = request.args.get('after'), request.args.get('before')
+    try:
+        if before: query['_id'] = {'$gt': ObjectId(before)}
+        elif after: query['_id'] = {'$lt': ObjectId(after)}
+    except Exception:
+        return "Invalid page cursor", 400
+
+    # Dashboard reads come from a secondary, after this admin's latest status change
+    direction = 1 if before else -1
+    with db.causal_session(own_writes()) as s:
+        bookings = list(db.replica(db.bookings()).find(query, session=s).sort('_id', direction).limit(per_page + 1))
+        # Revenue comes from the ledger that set_booking_status() maintains
+        trip_revenue = {row['_id']: row for row in db.replica(db.revenue_ledger()).find(session=s)}
+        failed_emails = db.replica(db.email_outbox()).count_documents({"status": "failed"}, session=s)
+    has_more = len(bookings) > per_page
+    bookings = bookings[:per_page]
+    if before: bookings.reverse()
+    newer_cursor = str(bookings[0]['_id']) if bookings and (after or (before and has_more)) else None
+    older_cursor = str(bookings[-1]['_id']) if bookings and (has_more if not before else True) else None
+
+    all_trips = trip_list('row')
+    total_revenue = sum(row.get('revenue', 0) for row in trip_revenue.values())
     
-    return render_template('admin.html', bookings=all_bookings, trips=all_trips, revenue=total_revenue)
+    return render_template('admin.html', bookings=bookings, trips=all_trips, revenue=total_revenue, trip_revenue=trip_revenue,
+                           failed_emails=failed_emails, status_filter=status_filter, trip_filter=trip_filter,
+                           newer_cursor=newer_cursor, older_cursor=older_cursor)
 
 @app.route('/admin/add-trip', methods=['POST'])
 def add_new_trip():
     if not session.get('admin_logged_in'):
         return redirect(url_for('admin_login'))
     
-    if trips_collection is None: return "Database Connection Error", 500
+    if not db.is_configured(): return "Database Connection Error", 500
 
-    # VALIDATION: Ensure Trip Name is present
-    name = request.form.get('name')
-    if not name:
-        flash("Trip Name is required")
+    # VALIDATION: the form's "spots" is the trip's total seats
+    try:
+        fields = clean(TRIP, {**request.form.to_dict(), 'capacity': request.form.get('spots')}, fields=('name', 'description', 'price', 'capacity'))
+    except SchemaError as e:
+        flash(f"Could not add the trip: {e}")
         return redirect(url_for('admin_page'))
 
     # Applying Form Config: enctype allows 'image_file' to be sent as a file object
     file = request.files.get('image_file')
     filename = "https://via.placeholder.com/400x300?text=No+Image"
+    image_variants = None
     
     if file and allowed_file(file.filename):
         try:
-            upload_result = cloudinary.uploader.upload(file)
-            filename = upload_result['secure_url']
+            filename, image_variants = media.submit_all({'image': file})['image'].result()
         except Exception as e:
             flash(f"Error uploading image: {e}")
             return redirect(url_for('admin_page'))
 
+    # Names with no ASCII letters or digits slugify to nothing; such a trip is reached by its id instead
+    trip_id = ObjectId()
     trip_doc = {
-        "name": name,
-        "description": request.form.get('description'),
-        "price": request.form.get('price'),
+        "_id": trip_id,
+        **fields,
+        "slug": slugify(fields['name']) or str(trip_id),
         "image": filename,
-        "spots": request.form.get('spots')
+        "image_variants": image_variants,
     }
+    trip_doc["spots"] = trip_doc["capacity"]
 
-    trips_collection.insert_one(trip_doc)
+    try:
+        db.trips().insert_one(trip_doc)
+    except DuplicateKeyError:
+        flash(f"A trip with the URL '/itinerary/{trip_doc['slug']}' already exists")
+        return redirect(url_for('admin_page'))
+    catalog_cache.invalidate()
+    return redirect(url_for('admin_page'))
+
+@app.route('/admin/import-trips', methods=['POST'])
+def import_trips():
+    """Create or update trips from a CSV or JSON file, matched on their slug. Images are URLs; no uploads happen here."""
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+    if not db.is_configured(): return "Database Connection Error", 500
+
+    file = request.files.get('trips_file')
+    if not file or not file.filename:
+        flash("Choose a CSV or JSON file to import")
+        return redirect(url_for('admin_page'))
+    try:
+        rows = read_trip_rows(file)
+    except ValueError as e:
+        flash(f"Could not read {file.filename}: {e}")
+        return redirect(url_for('admin_page'))
+
+    created = updated = 0
+    skipped = []
+    for batch in chunked(rows, BULK_BATCH_SIZE):
+        trips = {}
+        for line, row in batch:
+            row = {k: (str(v).strip() if v is not None else None) for k, v in row.items() if k in TRIP_FIELDS}
+            row['capacity'] = row.pop('spots', None)
+            # Blank cells leave the stored value alone, so only the filled-in ones are checked
+            given = ['name'] + [key for key in ('description', 'price', 'capacity', 'image') if row.get(key)]
+            slug = slugify(row.get('slug') or row.get('name'))
+            try:
+                row = clean(TRIP, row, fields=given)
+            except SchemaError:
+                skipped.append(line)
+                continue
+            if not slug:
+                skipped.append(line)
+                continue
+            trips[slug] = (line, row)
+
+        existing = {t['slug']: t for t in db.trips().find({"slug": {"$in": list(trips)}}, {"slug": 1, "capacity": 1})}
+        updates, lines = [], []
+        for slug, (line, row) in trips.items():
+            trip = existing.get(slug)
+            if trip is None and row.get('price') is None:
+                skipped.append(line)  # a new trip needs a price
+                continue
+            lines.append(line)
+            capacity = row.pop('capacity', None)
+            fields = {**row, "slug": slug}
+            if trip is None:
+                updates.append(UpdateOne({"slug": slug}, {"$set": {**fields, "capacity": capacity},
+                                                          "$setOnInsert": {"spots": capacity}}, upsert=True))
+                continue
+            # As in edit_trip: a new total shifts the seats left by the difference
+            update = {"$set": fields}
+            if capacity is not None:
+                update["$set"]["capacity"] = capacity
+                if isinstance(trip.get('capacity'), int):
+                    update["$inc"] = {"spots": capacity - trip['capacity']}
+                else:
+                    update["$set"]["spots"] = capacity
+            updates.append(UpdateOne({"_id": trip['_id'], "capacity": trip.get('capacity')}, update))
+
+        if not updates: continue
+        try:
+            result = db.trips().bulk_write(updates, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            # e.g. a slug created by someone else meanwhile; the other rows are still written
+            result = e.details
+            skipped.extend(lines[err['index']] for err in result['writeErrors'])
+        created += result.get('nUpserted', 0)
+        updated += result.get('nModified', 0)
+
+    catalog_cache.invalidate()
+    message = f"Imported {created} new trips and updated {updated}"
+    if skipped: message += f"; skipped rows {', '.join(map(str, sorted(skipped)[:20]))}{'…' if len(skipped) > 20 else ''}"
+    flash(message)
     return redirect(url_for('admin_page'))
 
 @app.route('/admin/edit-trip/<trip_id>', methods=['GET', 'POST'])
@@ -484,68 +914,99 @@ def edit_trip(trip_id):
     if not session.get('admin_logged_in'):
         return redirect(url_for('admin_login'))
     
-    if trips_collection is None: return "Database Connection Error", 500
+    if not db.is_configured(): return "Database Connection Error", 500
 
     try:
-        trip = trips_collection.find_one({"_id": ObjectId(trip_id)})
+        trip = db.trips().find_one({"_id": ObjectId(trip_id)})
     except:
         return "Invalid Trip ID", 400
 
     if request.method == 'POST':
-        name = request.form.get('name')
-        if not name:
-            flash("Trip Name is required")
+        try:
+            update_data = clean(TRIP, {**request.form.to_dict(), 'capacity': request.form.get('spots')}, fields=('name', 'description', 'price', 'capacity'))
+        except SchemaError as e:
+            flash(f"Could not save the trip: {e}")
             return redirect(url_for('edit_trip', trip_id=trip_id))
+        update_data["slug"] = slugify(update_data['name']) or str(ObjectId(trip_id))
+        # The form edits the total; seats already held or sold stay taken
+        capacity = update_data.pop('capacity')
+        old_capacity = (trip or {}).get('capacity')
+        seats_update = {}
+        if capacity is not None and isinstance(old_capacity, int):
+            seats_update = {"$inc": {"spots": capacity - old_capacity}}
+        else:
+            update_data["spots"] = capacity
+        update_data["capacity"] = capacity
 
-        update_data = {
-            "name": name,
-            "description": request.form.get('description'),
-            "price": request.form.get('price'),
-            "spots": request.form.get('spots')
-        }
+        # Get list of indices from the hidden inputs to know which days were submitted; days without a title are dropped
+        days = {}
+        for index in request.form.getlist('day_indices'):
+            if not (request.form.get(f'day_title_{index}') or '').strip(): continue
+            try:
+                days[index] = clean(ITINERARY_DAY, {'title': request.form.get(f'day_title_{index}'),
+                                                    'description': request.form.get(f'day_desc_{index}')})
+            except SchemaError as e:
+                flash(f"Could not save day {len(days) + 1}: {e}")
+                return redirect(url_for('edit_trip', trip_id=trip_id))
 
+        # --- Uploads ---
+        # Collect every new file first so they all go to Cloudinary at once
+        uploads = {}
         file = request.files.get('image_file')
         if file and allowed_file(file.filename):
+            uploads['image'] = file
+
+        for index in days:
+            day_file = request.files.get(f'day_image_{index}')
+            if day_file and allowed_file(day_file.filename):
+                uploads[index] = day_file
+
+        pending = media.submit_all(uploads)
+        uploaded = {}
+        for key, future in pending.items():
             try:
-                upload_result = cloudinary.uploader.upload(file)
-                update_data["image"] = upload_result['secure_url']
+                uploaded[key] = future.result()
             except Exception as e:
-                flash(f"Error uploading main image: {e}")
+                flash(f"Error uploading {'main' if key == 'image' else 'itinerary'} image: {e}")
                 return redirect(url_for('edit_trip', trip_id=trip_id))
+
+        if 'image' in uploaded:
+            update_data["image"], update_data["image_variants"] = uploaded['image']
             
         # --- Itinerary Processing ---
         itinerary = []
-        # Get list of indices from the hidden inputs to know which days were submitted
-        day_indices = request.form.getlist('day_indices')
+        # Days that keep their image keep its derivatives too
+        existing_variants = {day.get('image'): day.get('image_variants') for day in (trip or {}).get('itinerary', [])}
         
-        for index in day_indices:
-            day_title = request.form.get(f'day_title_{index}')
-            if not day_title: continue # Skip empty days
-
-            day_desc = request.form.get(f'day_desc_{index}')
+        for index, day in days.items():
             existing_day_img = request.form.get(f'existing_day_img_{index}')
             
             day_image_name = existing_day_img
+            day_image_variants = existing_variants.get(existing_day_img)
             
-            # Check if a new image was uploaded for this specific day
-            day_file = request.files.get(f'day_image_{index}')
-            if day_file and allowed_file(day_file.filename):
-                try:
-                    upload_result = cloudinary.uploader.upload(day_file)
-                    day_image_name = upload_result['secure_url']
-                except Exception as e:
-                    flash(f"Error uploading itinerary image: {e}")
-                    return redirect(url_for('edit_trip', trip_id=trip_id))
+            # Use the new image if one was uploaded for this specific day
+            if index in uploaded:
+                day_image_name, day_image_variants = uploaded[index]
             
             itinerary.append({
-                "title": day_title,
-                "description": day_desc,
-                "image": day_image_name
+                **day,
+                "image": day_image_name,
+                "image_variants": day_image_variants
             })
             
         update_data['itinerary'] = itinerary
         
-        trips_collection.update_one({"_id": ObjectId(trip_id)}, {"$set": update_data})
+        try:
+            # Conditional on the capacity we read, so two concurrent edits can't both apply their delta
+            result = db.trips().update_one({"_id": ObjectId(trip_id), "capacity": old_capacity},
+                                           {"$set": update_data, **seats_update})
+        except DuplicateKeyError:
+            flash(f"Another trip already uses the URL '/itinerary/{update_data['slug']}'")
+            return redirect(url_for('edit_trip', trip_id=trip_id))
+        if not result.matched_count:
+            flash("The trip's seats changed while you were editing; please try again")
+            return redirect(url_for('edit_trip', trip_id=trip_id))
+        catalog_cache.invalidate()
         return redirect(url_for('admin_page'))
 
     return render_template('edit_trip.html', trip=trip)
@@ -554,17 +1015,300 @@ def edit_trip(trip_id):
 def delete_trip(trip_id):
     if not session.get('admin_logged_in'):
         return redirect(url_for('admin_login'))
-    if trips_collection is None: return "Database Connection Error", 500
-    trips_collection.delete_one({"_id": ObjectId(trip_id)})
+    if not db.is_configured(): return "Database Connection Error", 500
+    db.trips().delete_one({"_id": ObjectId(trip_id)})
+    catalog_cache.invalidate()
+    return redirect(url_for('admin_page'))
+
+@app.route('/admin/retry-emails')
+def retry_emails():
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+    if not db.is_configured(): return "Database Connection Error", 500
+    count = outbox.retry_failed()
+    remember_writes(db.latest_position())
+    if OUTBOX_THREAD: outbox.start()
+    flash(f"Re-queued {count} emails")
     return redirect(url_for('admin_page'))
 
+@app.route('/tasks/drain-outbox')
+def drain_outbox():
+    """Send the emails that are due, for at most OUTBOX_DRAIN_SECONDS. Called by a cron with the CRON_SECRET bearer token."""
+    if not CRON_SECRET:
+        return "Not Found", 404
+    if request.headers.get('Authorization') != f"Bearer {CRON_SECRET}":
+        return "Unauthorized", 401
+    if not db.is_configured(): return "Database Connection Error", 500
+    return {"sent": outbox.drain(deadline=time.monotonic() + OUTBOX_DRAIN_SECONDS)}
+
 @app.route('/update-status/<booking_id>/<new_status>')
 def update_status(booking_id, new_status):
     if not session.get('admin_logged_in'):
         return redirect(url_for('admin_login'))
-    if bookings_collection is None: return "Database Connection Error", 500
-    bookings_collection.update_one({'_id': ObjectId(booking_id)}, {'$set': {'status': new_status}})
-    return redirect(url_for('admin_page'))
+    if not db.is_configured(): return "Database Connection Error", 500
+    set_booking_status(ObjectId(booking_id), {'status': new_status})
+    remember_writes(db.latest_position())
+    return redirect(request.referrer or url_for('admin_page'))
+
+BOOKING_STATUSES = ('Pending', 'Confirmed', 'Cancelled')
+
+@app.route('/admin/bookings/bulk-status', methods=['POST'])
+def bulk_update_status():
+    """Set one status on the ticked bookings, or on every booking matching the export filters."""
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+    if not db.is_configured(): return "Database Connection Error", 500
+
+    new_status = request.form.get('new_status')
+    if new_status not in BOOKING_STATUSES:
+        flash("Choose a status to apply")
+        return redirect(request.referrer or url_for('admin_page'))
+    try:
+        if request.form.get('scope') == 'filter':
+            query = booking_filter(request.form.get('status'), request.form.get('trip'),
+                                   request.form.get('from'), request.form.get('to'))
+        else:
+            ids = [ObjectId(i) for i in request.form.getlist('booking_ids')]
+            if not ids:
+                flash("No bookings selected")
+                return redirect(request.referrer or url_for('admin_page'))
+            query = {"_id": {"$in": ids}}
+    except Exception as e:
+        flash(f"Invalid selection: {e}")
+        return redirect(request.referrer or url_for('admin_page'))
+
+    changed = set_bookings_status(query, new_status)
+    remember_writes(db.latest_position())
+    flash(f"Marked {changed} bookings as {new_status}")
+    return redirect(request.referrer or url_for('admin_page'))
+
+@app.route('/admin/bookings/export')
+def export_bookings():
+    """Stream the bookings matching status/trip/from/to as CSV (default) or NDJSON (?format=ndjson)."""
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+    if not db.is_configured(): return "Database Connection Error", 500
+
+    try:
+        query = booking_filter(request.args.get('status'), request.args.get('trip'),
+                               request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return str(e), 400
+
+    ndjson = request.args.get('format') == 'ndjson'
+    # A long scan for a secondary; it streams after this function returns, so outside any session
+    cursor = db.replica(db.bookings()).find(query).sort('_id', 1).batch_size(BULK_BATCH_SIZE)
+    filename = f"bookings-{datetime.datetime.now().strftime('%Y%m%d-%H%M')}.{'ndjson' if ndjson else 'csv'}"
+    return Response(stream_with_context(export_ndjson(cursor) if ndjson else export_csv(cursor)),
+                    mimetype='application/x-ndjson' if ndjson else 'text/csv',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"', 'Cache-Control': 'no-store'})
+
+# --- 6. MAINTENANCE COMMANDS ---
+
+@app.cli.command('ensure-indexes')
+def ensure_indexes():
+    """Create every index declared in db.INDEXES. Run once per deploy (see Procfile release phase)."""
+    if not db.is_configured():
+        print("❌ Database Connection Error")
+        return
+    failed = db.ensure_indexes()
+    if failed:
+        raise SystemExit(f"❌ {len(failed)} indexes failed: {', '.join(failed)}")
+    print(f"✅ Ensured {sum(len(models) for models in db.INDEXES.values())} indexes.")
+
+@app.cli.command('compile-templates')
+def compile_templates():
+    """Precompile every template into the bytecode cache shipped with the build (see template_cache.py)."""
+    cache = app.jinja_env.bytecode_cache
+    names = cache.compile_all(app.jinja_env)
+    print(f"✅ Compiled {len(names)} templates into {cache.directory}.")
+
+@app.cli.command('backfill-slugs')
+def backfill_slugs():
+    """One-off: give every existing trip a slug."""
+    if not db.is_configured():
+        print("❌ Database Connection Error")
+        return
+
+    updated = 0
+    seen = set(t['slug'] for t in db.trips().find({"slug": {"$exists": True}}, {"slug": 1}))
+    for trip in db.trips().find({"slug": {"$exists": False}}, {"name": 1}):
+        slug = slugify(trip.get('name')) or str(trip['_id'])
+        if slug in seen:
+            print(f"⚠️ Skipping '{trip.get('name')}' ({trip['_id']}): slug '{slug}' is already taken")
+            continue
+        db.trips().update_one({"_id": trip['_id']}, {"$set": {"slug": slug}})
+        seen.add(slug)
+        updated += 1
+
+    catalog_cache.invalidate()
+    print(f"✅ Backfilled {updated} trip slugs. Run `flask ensure-indexes` to (re)create the unique slug index.")
+
+@app.cli.command('rebuild-review-summaries')
+def rebuild_review_summaries():
+    """Recompute every trip's review summary from the reviews."""
+    if not db.is_configured():
+        print("❌ Database Connection Error")
+        return
+
+    pipeline = [
+        {"$group": {"_id": {"trip": "$trip_name", "rating": "$rating"}, "n": {"$sum": 1}}},
+    ]
+    summaries = {}
+    for row in db.reviews().aggregate(pipeline):
+        trip, rating = row['_id'].get('trip'), row['_id'].get('rating')
+        if trip is None or rating is None: continue
+        summary = summaries.setdefault(trip, {"count": 0, "sum": 0, "histogram": {}})
+        summary['count'] += row['n']
+        summary['sum'] += rating * row['n']
+        summary['histogram'][str(rating)] = row['n']
+
+    db.review_summaries().delete_many({})
+    if summaries:
+        db.review_summaries().insert_many([{"_id": trip, **summary} for trip, summary in summaries.items()])
+    review_version.bump()
+    print(f"✅ Rebuilt review summaries for {len(summaries)} trips.")
+
+@app.cli.command('migrate-schema')
+def migrate_schema():
+    """Store the numeric fields of existing trips and bookings as numbers (see schema.NUMERIC_FIELDS)."""
+    if not db.is_configured():
+        print("❌ Database Connection Error")
+        return
+
+    for name, collection in (('trips', db.trips()), ('bookings', db.bookings())):
+        changed, unreadable = migrate_numbers(collection, NUMERIC_FIELDS[name], fill=FILL_FIELDS.get(name))
+        for doc_id, fields in unreadable.items():
+            print(f"⚠️ Cleared unreadable {name} fields on {doc_id}: {fields}")
+        print(f"✅ Converted {changed} {name}.")
+
+    catalog_cache.invalidate()
+
+@app.cli.command('rebuild-revenue')
+def rebuild_revenue():
+    """Recompute the revenue ledger from confirmed bookings."""
+    if not db.is_configured():
+        print("❌ Database Connection Error")
+        return
+
+    # Bookings confirmed before the ledger existed carry no 'amount'; price them from their trip
+    pipeline = [
+        {"$match": {"status": "Confirmed"}},
+        {"$lookup": {"from": db.trips().name, "localField": "trip", "foreignField": "name", "as": "trip_doc"}},
+        {"$project": {"trip": 1, "value": {"$ifNull": ["$amount", {"$convert": {
+            "input": {"$arrayElemAt": ["$trip_doc.price", 0]}, "to": "int", "onError": 0, "onNull": 0
+        }}]}}},
+        {"$group": {"_id": "$trip", "revenue": {"$sum": "$value"}, "confirmed": {"$sum": 1}}},
+    ]
+    rows = list(db.bookings().aggregate(pipeline))
+
+    db.revenue_ledger().delete_many({})
+    if rows: db.revenue_ledger().insert_many(rows)
+    print(f"✅ Rebuilt revenue ledger for {len(rows)} trips (₹{sum(r['revenue'] for r in rows):,}).")
+
+@app.cli.command('rebuild-inventory')
+def rebuild_inventory():
+    """Convert trips to numeric seat counts and recompute seats left from the bookings holding them."""
+    if not db.is_configured():
+        print("❌ Database Connection Error")
+        return
+
+    pipeline = [
+        {"$match": {"hold": {"$in": ["held", "confirmed"]}}},
+        {"$group": {"_id": "$trip_id", "seats": {"$sum": {"$ifNull": ["$seats", 1]}}}},
+    ]
+    taken = {row['_id']: row['seats'] for row in db.bookings().aggregate(pipeline)}
+
+    updated = 0
+    for trip in db.trips().find({}, {"name": 1, "spots": 1, "capacity": 1}):
+        # Trips from before inventory stored the admin's "Total Spots" as a string
+        capacity = trip.get('capacity') if isinstance(trip.get('capacity'), int) else parse_spots(trip.get('spots'))
+        if capacity is None:
+            print(f"⚠️ Skipping '{trip.get('name')}' ({trip['_id']}): no usable seat count")
+            continue
+        db.trips().update_one({"_id": trip['_id']}, {"$set": {"capacity": capacity, "spots": capacity - taken.get(trip['_id'], 0)}})
+        updated += 1
+
+    catalog_cache.invalidate()
+    print(f"✅ Rebuilt seat inventory for {updated} trips.")
+
+@app.cli.command('release-expired-holds')
+def release_expired_holds():
+    """Release the seats of unpaid bookings whose hold has expired (book_trip also does this as it goes)."""
+    if not db.is_configured():
+        print("❌ Database Connection Error")
+        return
+    print(f"✅ Released {inventory.release_expired()} expired seat holds.")
+
+def apply_reconciled_payments(paid):
+    """Mark bookings paid from Razorpay's records, as payment_verify() would, and queue their receipts.
+
+    ``paid`` is ``[(booking, payment), ...]``. Each step is one bulk write for the whole batch.
+    """
+    run = ObjectId()
+    db.bookings().bulk_write([
+        # Skips bookings that /payment/verify marked paid meanwhile; `run` tells which ones this call changed
+        UpdateOne({"_id": booking['_id'], "payment_status": {"$ne": "Paid"}},
+                  {"$set": {"payment_status": "Paid", "razorpay_payment_id": payment['id'], "reconciled_by": run}})
+        for booking, payment in paid
+    ], ordered=False)
+    changed = {b['_id'] for b in db.bookings().find({"_id": {"$in": [b['_id'] for b, _ in paid]}, "reconciled_by": run}, {"_id": 1})}
+    if not changed: return 0
+    set_bookings_status({"_id": {"$in": list(changed)}}, 'Confirmed')
+
+    messages, invoice_requests = [], []
+    for booking, payment in paid:
+        if booking['_id'] not in changed: continue
+        try:
+            message, price = receipt_email(booking, payment['id'])
+        except Exception as e:
+            print(f"❌ Error preparing receipt for booking {booking['_id']}: {e}")
+            continue
+        messages.append(message)
+        invoice_requests.append((payment['id'], booking, price))
+    invoices.request_many(invoice_requests)
+    outbox.enqueue_many(messages, start_worker=False)
+    return len(changed)
+
+@app.cli.command('reconcile-payments')
+@click.option('--min-age', default=15, show_default=True, help="Minutes an order must be old before it is checked.")
+@click.option('--since-days', default=30, show_default=True, help="Only bookings made in the last N days.")
+@click.option('--recheck-after', default=60, show_default=True, help="Minutes before an unpaid order is asked about again.")
+@click.option('--workers', default=int(os.environ.get('RECONCILE_WORKERS', 4)), show_default=True, help="Concurrent Razorpay requests.")
+@click.option('--rps', default=float(os.environ.get('RECONCILE_RPS', 5)), show_default=True, help="Razorpay requests per second.")
+@click.option('--every', default=0, help="Keep running, reconciling every N minutes.")
+@click.option('--dry-run', is_flag=True, help="Only report payments that would be applied.")
+def reconcile_payments(min_age, since_days, recheck_after, workers, rps, every, dry_run):
+    """Confirm bookings that Razorpay has been paid for but whose browser never reached /payment/verify."""
+    if not db.is_configured():
+        print("❌ Database Connection Error")
+        return
+
+    reconciler = PaymentReconciler(razorpay_client, max_workers=workers, requests_per_second=rps)
+    reconciler.bind(db.bookings)
+    while True:
+        stats = reconciler.run(apply_reconciled_payments, dry_run=dry_run, min_age_minutes=min_age,
+                               since_days=since_days, recheck_after_minutes=recheck_after)
+        print(f"✅ Checked {stats['checked']} orders in {stats['seconds']:.1f}s: {stats['paid']} paid, {stats['errors']} errors.")
+        if not every: break
+        time.sleep(every * 60)
+
+@app.cli.command('outbox-worker')
+def outbox_worker():
+    """Run the email outbox sender in the foreground (use with OUTBOX_WORKER=off on the web processes)."""
+    if not db.is_configured():
+        print("❌ Database Connection Error")
+        return
+    print("📨 Outbox worker started.")
+    outbox.run_forever()
+
+@app.cli.command('outbox-retry-failed')
+def outbox_retry_failed():
+    """Re-queue every email that ran out of delivery attempts."""
+    if not db.is_configured():
+        print("❌ Database Connection Error")
+        return
+    print(f"✅ Re-queued {outbox.retry_failed()} failed emails.")
 
 # --- DEBUG ROUTE (Use this to check files on Vercel) ---
 @app.route('/debug-files')
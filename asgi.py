@@ -0,0 +1,209 @@
+"""ASGI entry point: an async read path for the public pages, Flask for everything else.
+
+    uvicorn asgi:app --workers 4
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+``/``, ``/itinerary/<trip>`` and ``/payment`` are answered by coroutines that
+read MongoDB through pymongo's AsyncMongoClient and issue independent queries
+together (the review summary and the page of reviews go out at once), so a
+warm itinerary page costs one round trip and one worker keeps many requests
+in flight while they wait on Atlas. Catalog and review reads go to secondaries
+and the booking to the primary, as in app.py. They render the same templates inside a
+Flask request context, so url_for, asset_url, the session, the response
+cache, Server-Timing and /metrics behave exactly as under ``app:app``.
+
+Every other route, including the admin CMS and the payment callback, and any
+case the handlers below don't cover (redirects, flashes, errors) is served by
+the unchanged Flask app mounted underneath.
+"""
+import asyncio
+
+from a2wsgi import WSGIMiddleware
+from bson.objectid import ObjectId
+from flask import render_template, request as flask_request
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.test import EnvironBuilder
+
+import app as web
+import db
+
+flask_asgi = WSGIMiddleware(web.app)
+
+# Returned by a handler to let the Flask route answer the request instead
+FLASK = object()
+
+
+class ToFlask:
+    async def __call__(self, scope, receive, send):
+        await flask_asgi(scope, receive, send)
+
+
+def flask_environ(request):
+    scope = request.scope
+    environ = EnvironBuilder(
+        path=scope['path'],
+        base_url=f"{request.url.scheme}://{request.url.netloc}{scope.get('root_path', '')}",
+        query_string=scope['query_string'].decode('latin-1'),
+        method=request.method,
+        headers=[(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']],
+    ).get_environ()
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    return environ
+
+
+def to_starlette(response):
+    out = Response(response.get_data(), status_code=response.status_code, background=BackgroundTask(response.close))
+    out.raw_headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()]
+    return out
+
+
+def refresh_versions():
+    # The shared version counters are read with the sync client, at most every few seconds; keep that off the loop
+    web.catalog_cache.version
+    web.review_version.value
+
+
+async def serve(request, handler):
+    """Run ``handler`` inside a Flask request context, with the app's before/after request hooks."""
+    await run_in_threadpool(refresh_versions)
+    ctx = web.app.request_context(flask_environ(request))
+    ctx.push()
+    try:
+        rv = web.app.preprocess_request()
+        if rv is None:
+            rv = await handler()
+        if rv is FLASK:
+            return ToFlask()
+        response = web.app.process_response(web.app.make_response(rv))
+    except Exception as e:
+        ctx.pop(e)
+        raise
+    ctx.pop()
+    return to_starlette(response)
+
+
+async def cached_page(view_args, args, render):
+    """The response cache around an async view, as ResponseCache.cached does for Flask views."""
+    cache = web.response_cache
+    if cache.bypass():
+        return await render()
+    key = cache.key(view_args, args)
+    hit = cache.lookup(key)
+    if hit is not None:
+        return hit
+    rv = await render()
+    return rv if rv is FLASK else cache.store(key, rv)
+
+
+async def catalog_read(read):
+    """``read(session)`` on a secondary that has every write behind the current catalog version."""
+    async with db.async_causal_session(web.catalog_cache.read_after) as s:
+        return await read(s)
+
+
+async def review_read(read):
+    async with db.async_causal_session(web.review_version.read_after) as s:
+        return await read(s)
+
+
+async def catalog(key, load):
+    value = web.catalog_cache.lookup(key)
+    if value is None:
+        value = await load()
+        web.catalog_cache.store(key, value)
+    return value
+
+
+async def find_trip(slug):
+    slug = web.slugify(slug)
+    if not slug: return None
+
+    async def load():
+        trip = await catalog_read(lambda s: db.replica(db.get_async_db().trips).find_one({"slug": slug}, session=s))
+        if trip is None:
+            # Trips from before slugs existed: the sync lookup matches the name and stores the slug
+            trip = await run_in_threadpool(web.find_trip, slug)
+        return trip
+
+    return await catalog(('trip', slug), load)
+
+
+# --- Routes ---
+
+async def home(request):
+    async def render():
+        if not db.is_configured(): return FLASK
+        search_query = flask_request.args.get('q')
+        view = web.home_view(search_query)
+        trips = await catalog(('list', view), lambda: catalog_read(
+            lambda s: db.replica(db.get_async_db().trips).find({}, web.PROJECTIONS[view], session=s).to_list()))
+        return render_template('index.html', trips=web.home_trips(trips, search_query), search_query=search_query)
+
+    return await serve(request, lambda: cached_page({}, ('q',), render))
+
+
+async def trip_details(request):
+    trip_name = request.path_params['trip_name']
+
+    async def render():
+        if not db.is_configured(): return FLASK
+        trip_data = await find_trip(trip_name)
+        if not trip_data:
+            return "Trip not found", 404
+
+        page, sort_option, after, before = web.review_page_args()
+        query, sort, skip, limit = web.review_page_query(trip_data['name'], sort_option, web.REVIEWS_PER_PAGE, page, after, before)
+        database = db.get_async_db()
+        # A session per query: the two run at once
+        summary, docs = await asyncio.gather(
+            review_read(lambda s: db.replica(database.review_summaries).find_one({"_id": trip_data['name']}, session=s)),
+            review_read(lambda s: db.replica(database.reviews).find(query, session=s).sort(sort).skip(skip).limit(limit).to_list()),
+        )
+        reviews_page = web.review_page_result(docs, sort_option, web.REVIEWS_PER_PAGE, page, before)
+        return web.render_trip_details(trip_data, summary, reviews_page, page, sort_option)
+
+    return await serve(request, lambda: cached_page({'trip_name': trip_name}, ('page', 'sort', 'after', 'before'), render))
+
+
+async def payment_page(request):
+    async def handler():
+        booking_id = flask_request.args.get('booking_id')
+        if not booking_id or not db.is_configured(): return FLASK
+        try:
+            async with db.async_causal_session(web.own_writes()) as s:
+                booking = await db.get_async_db().bookings.find_one({"_id": ObjectId(booking_id)}, session=s)
+        except Exception:
+            return FLASK
+        if not booking or booking.get('payment_status') == 'Paid': return FLASK
+        # Renewing a lapsed seat hold writes through the sync client; Flask also refuses cancelled bookings
+        if web.inventory.is_expired(booking) or web.inventory.is_cancelled(booking): return FLASK
+
+        trip_name = booking.get('trip')
+        # Priced by the trip stored on the booking, as web.booking_trip() does
+        if booking.get('trip_id') is not None:
+            trip = await db.get_async_db().trips.find_one({"_id": booking['trip_id']}, {"price": 1})
+        else:
+            trip = await find_trip(booking.get('trip_slug') or trip_name)
+        price = web.trip_price(trip)
+        # Order reuse and the Razorpay API call stay on the sync client, in a worker thread
+        try:
+            order = await run_in_threadpool(web.get_or_create_order, web.razorpay_client, db.bookings(), booking,
+                                            price * 100, "INR", notes={"trip": trip_name, "email": booking.get('email')})
+        except Exception as e:
+            return f"Error creating payment order: {e}", 500
+        return web.render_payment(booking, trip_name, price, order)
+
+    return await serve(request, handler)
+
+
+app = Starlette(routes=[
+    Route('/', home),
+    Route('/itinerary/{trip_name}', trip_details),
+    Route('/payment', payment_page),
+    Mount('/', app=flask_asgi),
+])
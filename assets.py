@@ -0,0 +1,226 @@
+"""Static asset pipeline.
+
+    python assets.py build     # fingerprint + precompress everything under static/
+    python assets.py report    # list CSS and font files no template uses
+
+``build`` copies every file under ``static/`` to ``static/.build/`` with a
+content hash in its name (``logo.png`` -> ``logo.3f2a9c01d4e5.png``),
+rewrites ``url()`` references inside CSS to the hashed names, writes
+``.gz`` (and ``.br`` when the brotli package is installed) siblings for
+text formats, and records the mapping in ``static/.build/manifest.json``.
+
+At runtime ``asset_url()`` turns a path relative to ``static/`` into its
+``/assets/<hashed name>`` URL, served with far-future immutable caching and
+the best precompressed variant the browser accepts. Without a manifest it
+falls back to the plain ``/static/`` URL, so development needs no build.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
+BUILD_DIRNAME = '.build'
+MANIFEST_NAME = 'manifest.json'
+
+COMPRESSIBLE = {'.css', '.js', '.svg', '.ttf', '.eot', '.otf', '.json', '.txt', '.html', '.xml', '.map', '.ico'}
+FONT_EXTENSIONS = {'.woff', '.woff2', '.ttf', '.eot', '.otf'}
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+# Anything in a template that looks like a path under static/
+TEMPLATE_REF_RE = re.compile(r"""(?:/static/|asset_url\(\s*['"]|filename=['"])([^'"\s{}?#)]+)""")
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _fingerprint(rel_path, digest):
+    base, ext = os.path.splitext(rel_path)
+    return f"{base}.{digest}{ext}"
+
+
+def _is_external(ref):
+    return ref.startswith(('data:', 'http:', 'https:', '//', '#', 'about:'))
+
+
+def _resolve(css_rel_path, ref):
+    # 'wp-content/x/css/a.css' + '../fonts/b.woff2?v=1#iefix' -> 'wp-content/x/fonts/b.woff2'
+    ref = ref.split('?', 1)[0].split('#', 1)[0]
+    if ref.startswith('/static/'):
+        return ref[len('/static/'):]
+    joined = os.path.normpath(os.path.join(os.path.dirname(css_rel_path), ref))
+    return joined.replace(os.sep, '/')
+
+
+class AssetPipeline:
+    def __init__(self, static_folder=None, template_folder=None):
+        self.static_folder = static_folder or os.path.join(ROOT_PATH, 'static')
+        self.template_folder = template_folder or os.path.join(ROOT_PATH, 'templates')
+        self.build_folder = os.path.join(self.static_folder, BUILD_DIRNAME)
+        self.manifest = {}
+
+    # --- Build ---
+
+    def _source_files(self):
+        for dirpath, dirnames, filenames in os.walk(self.static_folder):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                if filename.startswith('.'): continue
+                full = os.path.join(dirpath, filename)
+                yield os.path.relpath(full, self.static_folder).replace(os.sep, '/')
+
+    def build(self):
+        if os.path.isdir(self.build_folder):
+            shutil.rmtree(self.build_folder)
+        manifest = {}
+
+        files = sorted(self._source_files())
+        # CSS goes last so the fonts and images it points at already have their hashed names
+        for rel in [f for f in files if not f.endswith('.css')] + [f for f in files if f.endswith('.css')]:
+            with open(os.path.join(self.static_folder, rel), 'rb') as f:
+                data = f.read()
+            if rel.endswith('.css'):
+                data = self._rewrite_css(rel, data, manifest)
+
+            hashed = _fingerprint(rel, _digest(data))
+            target = os.path.join(self.build_folder, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            if os.path.splitext(rel)[1].lower() in COMPRESSIBLE:
+                self._precompress(target, data)
+            manifest[rel] = hashed
+
+        with open(os.path.join(self.build_folder, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=0, sort_keys=True)
+        self.manifest = manifest
+        return manifest
+
+    def _rewrite_css(self, css_rel, data, manifest):
+        text = data.decode('utf-8', errors='surrogateescape')
+
+        def replace(match):
+            quote, ref = match.group(1), match.group(2).strip()
+            if _is_external(ref): return match.group(0)
+            hashed = manifest.get(_resolve(css_rel, ref))
+            if not hashed: return match.group(0)
+            suffix = ref[len(ref.split('?', 1)[0].split('#', 1)[0]):]
+            new_ref = os.path.relpath(hashed, os.path.dirname(css_rel) or '.').replace(os.sep, '/')
+            return f"url({quote}{new_ref}{suffix}{quote})"
+
+        return CSS_URL_RE.sub(replace, text).encode('utf-8', errors='surrogateescape')
+
+    def _precompress(self, target, data):
+        with open(target + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(target + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+    # --- Report ---
+
+    def template_references(self):
+        refs = set()
+        for dirpath, _, filenames in os.walk(self.template_folder):
+            for filename in filenames:
+                with open(os.path.join(dirpath, filename), encoding='utf-8', errors='ignore') as f:
+                    refs.update(TEMPLATE_REF_RE.findall(f.read()))
+        return refs
+
+    def unused_files(self):
+        """CSS and font files that no template reaches, directly or through CSS url()s."""
+        files = set(self._source_files())
+        reachable, pending = set(), [r for r in self.template_references() if r in files]
+        while pending:
+            rel = pending.pop()
+            if rel in reachable: continue
+            reachable.add(rel)
+            if rel.endswith('.css'):
+                with open(os.path.join(self.static_folder, rel), encoding='utf-8', errors='ignore') as f:
+                    for _, ref in CSS_URL_RE.findall(f.read()):
+                        if not _is_external(ref.strip()):
+                            target = _resolve(rel, ref.strip())
+                            if target in files: pending.append(target)
+
+        candidates = [f for f in files if os.path.splitext(f)[1].lower() in FONT_EXTENSIONS | {'.css'}]
+        unused = [(f, os.path.getsize(os.path.join(self.static_folder, f))) for f in candidates if f not in reachable]
+        return sorted(unused, key=lambda item: -item[1])
+
+    # --- Serving ---
+
+    def load_manifest(self):
+        path = os.path.join(self.build_folder, MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+            print(f"✅ Loaded asset manifest ({len(self.manifest)} files)")
+        return self.manifest
+
+    def url(self, path):
+        path = path.lstrip('/')
+        if path.startswith('static/'): path = path[len('static/'):]
+        hashed = self.manifest.get(path)
+        if hashed:
+            return url_for('serve_asset', filename=hashed)
+        return url_for('static', filename=path)
+
+    def serve(self, filename):
+        full = safe_join(self.build_folder, filename)
+        if full is None or not os.path.isfile(full):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        accepted = request.accept_encodings
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[candidate] and os.path.isfile(full + suffix):
+                encoding, full = candidate, full + suffix
+                break
+
+        response = send_file(full, mimetype=mimetype, max_age=ONE_YEAR, conditional=True)
+        response.headers['Cache-Control'] = f'public, max-age={ONE_YEAR}, immutable'
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def init_app(self, app):
+        self.load_manifest()
+        app.add_url_rule('/assets/<path:filename>', 'serve_asset', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+
+
+def main(argv):
+    pipeline = AssetPipeline()
+    command = argv[1] if len(argv) > 1 else 'build'
+    if command == 'build':
+        manifest = pipeline.build()
+        print(f"✅ Built {len(manifest)} assets into {pipeline.build_folder}"
+              + ("" if brotli else " (brotli not installed: .gz only)"))
+    elif command != 'report':
+        print(__doc__)
+        return 1
+
+    unused = pipeline.unused_files()
+    print(f"\n{len(unused)} CSS/font files are never referenced by a template ({sum(s for _, s in unused) / 1024:,.0f} KB):")
+    for rel, size in unused:
+        print(f"  {size / 1024:8.1f} KB  {rel}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
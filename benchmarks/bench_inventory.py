@@ -0,0 +1,137 @@
+"""Seat inventory under flash-sale contention, fully offline.
+
+    python benchmarks/bench_inventory.py                                  # mongomock
+    python benchmarks/bench_inventory.py --mongo-uri mongodb://localhost:27017/ --bookers 2000 --concurrency 400
+
+Creates one trip with ``--seats`` seats and lets ``--bookers`` travellers hit
+POST /book for it at once from ``--concurrency`` threads. Every round, a share
+of the winners (``--pay-ratio``) pays through /payment and /payment/verify,
+the remaining holds are expired and released, and the next round competes for
+the seats that came back.
+
+After each round the seat counts must add up: nobody got a seat the trip did
+not have, every refused booker was refused because the trip was full, and
+seats left + held + confirmed equals the capacity. Any mismatch exits with
+status 1. Prints bookings/sec and latency per round; throughput should stay
+flat as the trip sells out, since a full trip answers with one update that
+matches nothing.
+
+MongoDB is mongomock unless ``--mongo-uri`` points at a local mongod; the
+``dhou-wanderer`` database there is dropped, so never point it at real data.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bson.objectid import ObjectId
+
+from bench_routes import FakeRazorpay, connect, percentile
+
+
+def seats_taken(db, trip_id, hold):
+    return sum(b.get('seats', 1) for b in db.bookings().find({"trip_id": trip_id, "hold": hold}, {"seats": 1}))
+
+
+def run_round(app, slug, bookers, concurrency):
+    local = threading.local()
+
+    def one(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/book', data={'destination': 'Flash Sale', 'trip_slug': slug,
+                                              'full_name': f'Booker {i}', 'email': f'booker{i}@example.com'})
+        return (time.perf_counter() - started) * 1000, response.status_code, response.headers.get('Location')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(bookers)))
+    wall = time.perf_counter() - started
+    return results, wall
+
+
+def pay(app, db, locations):
+    client = app.test_client()
+    for location in locations:
+        booking_id = location.split('booking_id=')[-1]
+        client.get(f'/payment?booking_id={booking_id}')
+        order_id = db.bookings().find_one({"_id": ObjectId(booking_id)})['razorpay_order_id']
+        client.post('/payment/verify', data={'razorpay_payment_id': f'pay_{booking_id}', 'razorpay_order_id': order_id,
+                                             'razorpay_signature': 'bench'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', help="local mongod to use instead of mongomock")
+    parser.add_argument('--seats', type=int, default=100)
+    parser.add_argument('--bookers', type=int, default=500, help="booking attempts per round")
+    parser.add_argument('--concurrency', type=int, default=200, help="threads booking at once")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--pay-ratio', type=float, default=0.5, help="share of each round's winners that pay")
+    parser.add_argument('--verbose', action='store_true', help="show the app's own log lines while measuring")
+    args = parser.parse_args()
+
+    db = connect(args.mongo_uri)
+    import app as appmod
+    appmod.razorpay_client = FakeRazorpay()
+    database = db.get_db()
+    for name in database.list_collection_names():
+        database[name].drop()
+
+    trip_id = db.trips().insert_one({"name": "Flash Sale", "slug": "flash-sale", "price": "4999",
+                                     "capacity": args.seats, "spots": args.seats}).inserted_id
+    print(f"{args.bookers} bookers x {args.rounds} rounds on one trip with {args.seats} seats, "
+          f"{args.concurrency} threads, {'mongod' if args.mongo_uri else 'mongomock'}\n")
+    print(f"{'round':>5} {'free':>5} {'won':>5} {'refused':>7} {'errors':>6} {'paid':>5} {'booked/s':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+
+    failures = []
+    for round_no in range(1, args.rounds + 1):
+        free = db.trips().find_one({"_id": trip_id})['spots']
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            results, wall = run_round(appmod.app, 'flash-sale', args.bookers, args.concurrency)
+        won = [location for _, status, location in results if status == 302 and 'booking_id=' in (location or '')]
+        refused = sum(1 for _, status, _ in results if status == 409)
+        errors = len(results) - len(won) - refused
+
+        paid = won[:int(len(won) * args.pay_ratio)]
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            pay(appmod.app, db, paid)
+
+        spots = db.trips().find_one({"_id": trip_id})['spots']
+        held, confirmed = seats_taken(db, trip_id, 'held'), seats_taken(db, trip_id, 'confirmed')
+        if len(won) != min(free, args.bookers):
+            failures.append(f"round {round_no}: {len(won)} bookings won {free} free seats")
+        if spots < 0 or spots + held + confirmed != args.seats:
+            failures.append(f"round {round_no}: {spots} left + {held} held + {confirmed} confirmed != {args.seats} seats")
+        if errors:
+            failures.append(f"round {round_no}: {errors} bookings failed with an error")
+
+        latencies = sorted(ms for ms, _, _ in results)
+        print(f"{round_no:>5} {free:>5} {len(won):>5} {refused:>7} {errors:>6} {len(paid):>5} {len(results) / wall:>9.1f} "
+              f"{statistics.median(latencies):>8.2f} {percentile(latencies, 99):>8.2f} {latencies[-1]:>8.2f}")
+
+        # Everyone who didn't pay walks away; their seats come back for the next round
+        appmod.inventory.release_expired(now=datetime.datetime.utcnow() + datetime.timedelta(minutes=appmod.inventory.hold_minutes + 1))
+
+    trip = db.trips().find_one({"_id": trip_id})
+    confirmed = seats_taken(db, trip_id, 'confirmed')
+    print(f"\nFinal: {trip['spots']} seats left, {confirmed} confirmed, capacity {args.seats}")
+    if trip['spots'] + confirmed != args.seats:
+        failures.append(f"final: {trip['spots']} left + {confirmed} confirmed != {args.seats} seats")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ No seat was sold twice and no booker was refused while seats were free.")
+
+
+if __name__ == '__main__':
+    main()
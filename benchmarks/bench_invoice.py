@@ -0,0 +1,60 @@
+"""Invoice rendering throughput.
+
+    python benchmarks/bench_invoice.py --count 200 --workers 4
+
+Compares rendering the way payment_verify() used to (logo looked up and
+decoded for every invoice), the cached renderer inline, and the cached
+renderer in a process pool. Needs no database or network.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice import load_logo, render_invoice  # noqa: E402
+
+BOOKING = {'name': 'Benchmark Traveler', 'email': 'bench@example.com', 'trip': 'Mechuka Valley'}
+
+
+def render_uncached(i):
+    load_logo.cache_clear()
+    return render_invoice(BOOKING, 24999, f"pay_bench{i:06d}")
+
+
+def render_cached(i):
+    return render_invoice(BOOKING, 24999, f"pay_bench{i:06d}")
+
+
+def measure(label, count, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {count / elapsed:8.1f} invoices/sec  ({elapsed * 1000 / count:.2f} ms each)")
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    # Warm-up so imports and font loading aren't billed to the first run
+    render_cached(0)
+
+    before = measure("before (per-request setup)", args.count, lambda: [render_uncached(i) for i in range(args.count)])
+    measure("cached, inline", args.count, lambda: [render_cached(i) for i in range(args.count)])
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(render_cached, range(args.workers)))
+        after = measure(f"cached, {args.workers} processes", args.count,
+                        lambda: list(pool.map(render_cached, range(args.count), chunksize=8)))
+
+    print(f"\nspeed-up: {after / before:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Payment reconciliation over a large backlog, fully offline.
+
+    python benchmarks/bench_reconcile.py                                   # 2,000 orders on mongomock
+    python benchmarks/bench_reconcile.py --mongo-uri mongodb://localhost:27017/ --orders 50000 --rps 200 --workers 16
+
+Seeds ``--orders`` unpaid bookings that reached checkout, of which
+``--paid-ratio`` were actually captured by a stand-in Razorpay (the browser
+never came back), then runs the same reconciler as ``flask reconcile-payments``.
+
+The stand-in answers ``order.payments()`` after ``--razorpay-ms`` of latency
+and counts how many requests were in flight and per second, so the run shows
+whether the ``--workers`` / ``--rps`` limits held. Afterwards every captured
+booking must be Paid and Confirmed, its revenue in the ledger and its receipt
+and invoice queued exactly once, and no other booking touched; a second run
+must find nothing to do. Any mismatch exits with status 1.
+
+MongoDB is mongomock unless ``--mongo-uri`` points at a local mongod; the
+``dhou-wanderer`` database there is dropped, so never point it at real data.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import sys
+import time
+from collections import Counter
+
+from bench_routes import FakeRazorpay, connect
+
+
+class FakeRazorpayPayments(FakeRazorpay):
+    """FakeRazorpay that also knows which orders were paid, and measures the load put on it."""
+
+    def __init__(self, captured, latency_ms=0):
+        super().__init__(latency_ms)
+        self.captured = captured
+        self.calls = Counter()
+        self.in_flight = self.max_in_flight = 0
+
+    def payments(self, order_id):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.calls[int(time.monotonic())] += 1
+        try:
+            time.sleep(self.latency)
+            if order_id in self.captured:
+                return {"count": 1, "items": [{"id": f"pay_{order_id}", "order_id": order_id, "status": "captured"}]}
+            return {"count": 1, "items": [{"id": f"pay_failed_{order_id}", "order_id": order_id, "status": "failed"}]}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def seed(db, orders, paid_ratio):
+    database = db.get_db()
+    for name in database.list_collection_names():
+        database.drop_collection(name)
+    db.ensure_indexes()
+
+    db.trips().insert_one({"name": "Backlog Trek", "slug": "backlog-trek", "price": "5000"})
+    created_at = datetime.datetime.utcnow() - datetime.timedelta(hours=2)
+    captured, docs = set(), []
+    every = round(1 / paid_ratio) if paid_ratio else 0
+    for i in range(orders):
+        order_id = f"order_backlog{i:08d}"
+        if every and i % every == 0:
+            captured.add(order_id)
+        docs.append({
+            "name": f"Guest {i}", "email": f"guest{i}@example.com", "trip": "Backlog Trek", "trip_slug": "backlog-trek",
+            "status": "Pending", "payment_status": "Unpaid", "date": created_at.strftime("%Y-%m-%d %H:%M"),
+            "razorpay_order_id": order_id,
+            "razorpay_order": {"id": order_id, "amount": 500000, "currency": "INR", "created_at": created_at},
+        })
+        if len(docs) == 10000:
+            db.bookings().insert_many(docs)
+            docs = []
+    if docs: db.bookings().insert_many(docs)
+    # A booking still at checkout: too young to be checked
+    db.bookings().insert_one({"name": "Fresh", "email": "fresh@example.com", "trip": "Backlog Trek", "status": "Pending",
+                              "payment_status": "Unpaid", "razorpay_order_id": "order_fresh",
+                              "razorpay_order": {"id": "order_fresh", "created_at": datetime.datetime.utcnow()}})
+    return captured
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', help="local mongod to use instead of mongomock")
+    parser.add_argument('--orders', type=int, default=2000, help="unpaid bookings with an order")
+    parser.add_argument('--paid-ratio', type=float, default=0.2, help="share of them Razorpay captured")
+    parser.add_argument('--workers', type=int, default=8, help="concurrent Razorpay requests")
+    parser.add_argument('--rps', type=float, default=500, help="Razorpay requests per second")
+    parser.add_argument('--razorpay-ms', type=float, default=20, help="simulated Razorpay API latency")
+    parser.add_argument('--verbose', action='store_true', help="show the app's own log lines")
+    args = parser.parse_args()
+
+    db = connect(args.mongo_uri)
+    import app as appmod
+    from reconcile import PaymentReconciler
+
+    print(f"Seeding {args.orders:,} unpaid orders into {'mongod' if args.mongo_uri else 'mongomock'}...")
+    captured = seed(db, args.orders, args.paid_ratio)
+    fake = FakeRazorpayPayments(captured, args.razorpay_ms)
+    appmod.razorpay_client = fake
+
+    reconciler = PaymentReconciler(fake, max_workers=args.workers, requests_per_second=args.rps)
+    reconciler.bind(db.bookings)
+    with appmod.app.app_context(), contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+        stats = reconciler.run(appmod.apply_reconciled_payments)
+        again = reconciler.run(appmod.apply_reconciled_payments)
+
+    busiest = max(fake.calls.values()) if fake.calls else 0
+    print(f"\nChecked {stats['checked']:,} orders in {stats['seconds']:.2f}s "
+          f"({stats['checked'] / stats['seconds'] if stats['seconds'] else 0:,.0f} orders/s): "
+          f"{stats['paid']:,} paid, {stats['errors']} errors")
+    print(f"Razorpay load: at most {fake.max_in_flight} requests in flight (limit {args.workers}), "
+          f"busiest second {busiest} requests (limit {args.rps:g})")
+
+    failures = []
+    paid = db.bookings().count_documents({"payment_status": "Paid", "status": "Confirmed"})
+    if stats['paid'] != len(captured) or paid != len(captured):
+        failures.append(f"{len(captured)} orders were captured but {stats['paid']} were found and {paid} bookings are Paid")
+    if stats['checked'] != args.orders:
+        failures.append(f"checked {stats['checked']} of {args.orders} orders")
+    if again['checked']:
+        failures.append(f"a second run checked {again['checked']} orders again")
+    ledger = db.revenue_ledger().find_one({"_id": "Backlog Trek"}) or {}
+    if ledger.get('confirmed', 0) != len(captured) or ledger.get('revenue', 0) != 5000 * len(captured):
+        failures.append(f"revenue ledger shows {ledger.get('confirmed', 0)} bookings / ₹{ledger.get('revenue', 0):,}")
+    receipts = db.email_outbox().count_documents({"subject": "Booking Successful: Backlog Trek"})
+    invoices = db.invoices().count_documents({})
+    if receipts != len(captured) or invoices != len(captured):
+        failures.append(f"{receipts} receipts and {invoices} invoices queued for {len(captured)} payments")
+    if fake.max_in_flight > args.workers:
+        failures.append(f"{fake.max_in_flight} Razorpay requests ran at once")
+    if busiest > args.rps + 1:
+        failures.append(f"{busiest} Razorpay requests in one second")
+    if db.bookings().find_one({"razorpay_order_id": "order_fresh"}).get('payment_checked_at'):
+        failures.append("an order younger than --min-age was checked")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Every captured payment was applied once and nothing else changed.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Read routing on a replica set: where each route's reads go, and whether visitors see their own writes.
+
+    python benchmarks/bench_replicas.py --mongo-uri "mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0"
+    python benchmarks/bench_replicas.py --mongo-uri ... --primary-only      # as before: every read on the primary
+
+Needs a replica set, such as the single-machine one described under "Read
+Scaling" in the README. Its ``dhou-wanderer`` database is dropped and
+reseeded, so never point it at real data.
+
+Routing: each route is requested with the catalog, fragment and response
+caches emptied first, so every read it makes reaches MongoDB, and the reads
+(find, aggregate, count, getMore) are counted per collection on the primary
+and on the secondaries. Catalog, review and dashboard reads should all land
+on secondaries; bookings and the shared version counters stay on the primary.
+
+Consistency: books ``--bookings`` trips through ``/book`` and follows each
+redirect to its payment page, and submits ``--reviews`` reviews and follows
+each redirect to the itinerary page, counting bookings not found and reviews
+missing from the page that follows. The run fails if either count is not
+zero.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import threading
+import uuid
+from collections import Counter
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from bench_routes import FakeRazorpay, connect, seed  # noqa: E402
+
+READ_COMMANDS = {'find', 'aggregate', 'count', 'getMore'}
+
+
+class ReadCounter:
+    """A pymongo CommandListener counting read commands by (server address, collection)."""
+
+    def __init__(self):
+        self.reads = Counter()
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name not in READ_COMMANDS:
+            return
+        collection = event.command.get('collection') if event.command_name == 'getMore' else event.command.get(event.command_name)
+        with self._lock:
+            self.reads[(event.connection_id, collection)] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def take(self):
+        with self._lock:
+            reads, self.reads = self.reads, Counter()
+        return reads
+
+
+def split_by_role(reads, primary):
+    on_primary, on_secondaries = Counter(), Counter()
+    for (address, collection), n in reads.items():
+        (on_primary if address == primary else on_secondaries)[collection] += n
+    return on_primary, on_secondaries
+
+
+def describe(counts):
+    return ", ".join(f"{name} {n}" for name, n in sorted(counts.items())) or "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', required=True, help="replica set to seed and use")
+    parser.add_argument('--primary-only', action='store_true', help="MONGO_SECONDARY_READS=off, for comparison")
+    parser.add_argument('--trips', type=int, default=200)
+    parser.add_argument('--seed-bookings', type=int, default=5000)
+    parser.add_argument('--seed-reviews', type=int, default=5000)
+    parser.add_argument('--bookings', type=int, default=200, help="book-then-pay round trips to check")
+    parser.add_argument('--reviews', type=int, default=100, help="review-then-read round trips to check")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # Settings db.py reads at import time
+    os.environ['MONGO_SECONDARY_READS'] = 'off' if args.primary_only else 'on'
+    counter = ReadCounter()
+    db = connect(args.mongo_uri)
+    db.event_listeners.append(counter)
+    import app as appmod
+    appmod.razorpay_client = FakeRazorpay()
+
+    client = db.get_client()
+    client.admin.command('ping')
+    if client.primary is None:
+        sys.exit("❌ --mongo-uri must name a replica set (add ?replicaSet=<name>)")
+    print(f"Primary {client.primary[0]}:{client.primary[1]}, {len(client.secondaries)} secondaries, "
+          f"reads {'on the primary only' if args.primary_only else f'from secondaries up to {db.MAX_STALENESS_SECONDS}s behind'}")
+
+    rng = random.Random(args.seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        trips = seed(db, args.trips, args.seed_bookings, args.seed_reviews, rng)
+    popular = trips[0]
+    booking = db.bookings().find_one({"payment_status": "Unpaid"}, {"_id": 1})
+
+    # Visitors go through the response cache; only the dashboard needs the admin, who bypasses it
+    web = appmod.app.test_client()
+    admin = appmod.app.test_client()
+    with admin.session_transaction() as sess:
+        sess['admin_logged_in'] = True
+
+    def clear_caches():
+        appmod.catalog_cache.clear()
+        appmod.response_cache.clear()
+        appmod.fragments.clear()
+
+    routes = {
+        'home': '/',
+        'home?q': f"/?q={popular['name'].split()[0]}",
+        'trip_details': f"/itinerary/{popular['slug']}",
+        'trip_details sort=highest': f"/itinerary/{popular['slug']}?sort=highest",
+        'payment_page': f"/payment?booking_id={booking['_id']}",
+        'admin_page': '/admin-dashboard',
+        'admin_page status=Pending': '/admin-dashboard?status=Pending',
+    }
+    print(f"\n{'route':<28}{'primary reads':<40}secondary reads")
+    for name, path in routes.items():
+        clear_caches()
+        counter.take()
+        with contextlib.redirect_stdout(io.StringIO()):
+            status = (admin if name.startswith('admin') else web).get(path).status_code
+        on_primary, on_secondaries = split_by_role(counter.take(), client.primary)
+        print(f"{name:<28}{describe(on_primary):<40}{describe(on_secondaries)}" + (f"  (HTTP {status})" if status >= 400 else ""))
+
+    missing_bookings = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(args.bookings):
+            trip = rng.choice(trips)
+            response = web.post('/book', data={"destination": trip['name'], "trip_slug": trip['slug'], "full_name": "Bench Guest",
+                                               "email": "bench@example.com", "travel_date": "2025-12-01"})
+            if response.status_code != 302 or '/payment' not in response.location:
+                continue  # sold out
+            if web.get(response.location).status_code == 404:
+                missing_bookings += 1
+
+    missing_reviews = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(args.reviews):
+            trip = rng.choice(trips)
+            comment = f"bench review {uuid.uuid4().hex}"
+            page = web.post('/submit-review', data={"trip_name": trip['name'], "trip_slug": trip['slug'], "rating": "5",
+                                                    "comment": comment, "user_name": "Bench"}, follow_redirects=True)
+            if comment not in page.get_data(as_text=True):
+                missing_reviews += 1
+
+    print(f"\nBooking not found on the payment page after /book: {missing_bookings} of {args.bookings}")
+    print(f"Own review missing from the itinerary page after /submit-review: {missing_reviews} of {args.reviews}")
+    if missing_bookings or missing_reviews:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""Route latency and throughput, fully offline.
+
+    python benchmarks/bench_routes.py --scale 0.02                 # quick run on mongomock
+    python benchmarks/bench_routes.py --mongo-uri mongodb://localhost:27017/ --out before.json
+    python benchmarks/bench_routes.py --mongo-uri mongodb://localhost:27017/ --compare before.json
+
+Seeds a catalog of realistic size (by default 2,000 trips, 200,000 bookings
+and 200,000 reviews, skewed so popular trips hold most of the reviews and
+bookings) and drives the app in-process through Flask's test client, so no
+port, browser or network is involved.
+
+MongoDB is mongomock unless ``--mongo-uri`` points at a local mongod; the
+``dhou-wanderer`` database there is dropped and reseeded, so never point it at
+real data. mongomock has no query planner and scans every document, so use a
+small ``--scale`` with it and a local mongod for numbers that resemble
+production. Razorpay is replaced by an in-memory client (``--razorpay-ms``
+adds simulated API latency), email stays in the outbox, and no route in the
+list uploads to Cloudinary.
+
+Prints requests/sec and p50/p90/p99/max latency per route and writes them as
+JSON (``--out``). ``--compare`` prints the change against an earlier file.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+# Settings the app reads at import time: never start a mail thread, render invoices inline
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('ADMIN_PASSWORD', 'bench')
+os.environ['OUTBOX_WORKER'] = 'off'
+os.environ['INVOICE_WORKERS'] = '0'
+
+WORDS = ("valley lake pass monastery river falls hills forest trek camp village fort meadow "
+         "glacier peak temple island delta plateau canyon").split()
+REGIONS = ("Tawang Mechuka Ziro Majuli Kaziranga Shillong Cherrapunji Dzukou Loktak Gangtok "
+           "Pelling Yuksom Dirang Bomdila Roing Haflong Tura Aizawl Unakoti Namdapha").split()
+STATUSES = (('Pending', 0.35), ('Confirmed', 0.55), ('Cancelled', 0.10))
+SORTS = ('newest', 'oldest', 'highest', 'lowest')
+
+
+# --- Stand-ins ---
+
+class FakeRazorpay:
+    """Just enough of razorpay.Client for payment_page() and payment_verify()."""
+
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.order = self
+        self.utility = self
+
+    def create(self, data):
+        time.sleep(self.latency)
+        with self._lock:
+            n = next(self._ids)
+        return {"id": f"order_bench{n:08d}", "amount": data['amount'], "currency": data['currency']}
+
+    def verify_payment_signature(self, params):
+        time.sleep(self.latency)
+        return True
+
+
+def connect(mongo_uri):
+    import db
+    if mongo_uri:
+        os.environ['MONGO_URI'] = mongo_uri
+    else:
+        import mongomock
+        from mongomock.collection import BulkOperationBuilder
+        # mongomock's bulk builder predates UpdateOne(sort=...), which pymongo now always passes (as None)
+        add_update = BulkOperationBuilder.add_update
+        BulkOperationBuilder.add_update = lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+        os.environ['MONGO_URI'] = 'mongodb://mongomock.invalid/'
+        db.MongoClient = lambda uri, **options: mongomock.MongoClient(uri)
+    db.reset()
+    return db
+
+
+# --- Seed data ---
+
+def skewed_index(rng, n):
+    # Roughly Zipf: a few trips get most of the traffic
+    return min(int(rng.paretovariate(1.16)) - 1, n - 1)
+
+
+def seed(db, n_trips, n_bookings, n_reviews, rng):
+    from pymongo import InsertOne
+
+    database = db.get_db()
+    for name in database.list_collection_names():
+        database.drop_collection(name)
+    db.ensure_indexes()
+
+    trips = []
+    for i in range(n_trips):
+        name = f"{rng.choice(REGIONS)} {rng.choice(WORDS).title()} {i}"
+        slug = name.lower().replace(' ', '-')
+        trips.append({
+            "name": name, "slug": slug,
+            "description": " ".join(rng.choice(WORDS) for _ in range(60)),
+            "price": str(rng.randrange(4000, 60000, 500)),
+            "spots": str(rng.randint(4, 30)),
+            "image": "https://via.placeholder.com/400x300?text=No+Image",
+            "itinerary": [{"title": f"Day {d + 1}", "description": " ".join(rng.choice(WORDS) for _ in range(40)),
+                           "image": None, "image_variants": None} for d in range(rng.randint(3, 8))],
+        })
+    db.trips().insert_many(trips)
+
+    start = datetime.datetime(2023, 1, 1)
+    summaries = defaultdict(lambda: {"count": 0, "sum": 0, "histogram": Counter()})
+    batch = []
+    for i in range(n_reviews):
+        trip = trips[skewed_index(rng, n_trips)]
+        rating = rng.choices((1, 2, 3, 4, 5), weights=(4, 6, 15, 35, 40))[0]
+        batch.append(InsertOne({
+            "trip_name": trip['name'], "user_name": f"traveler{i}", "rating": rating,
+            "comment": " ".join(rng.choice(WORDS) for _ in range(25)),
+            "date": (start + datetime.timedelta(minutes=rng.randrange(1_000_000))).strftime("%Y-%m-%d"),
+        }))
+        summary = summaries[trip['name']]
+        summary['count'] += 1
+        summary['sum'] += rating
+        summary['histogram'][str(rating)] += 1
+        if len(batch) == 10000:
+            db.reviews().bulk_write(batch, ordered=False)
+            batch = []
+    if batch: db.reviews().bulk_write(batch, ordered=False)
+    if summaries:
+        db.review_summaries().insert_many([{"_id": name, "count": s['count'], "sum": s['sum'], "histogram": dict(s['histogram'])}
+                                           for name, s in summaries.items()])
+
+    ledger = defaultdict(lambda: {"revenue": 0, "confirmed": 0})
+    statuses, weights = zip(*STATUSES)
+    batch = []
+    for i in range(n_bookings):
+        trip = trips[skewed_index(rng, n_trips)]
+        status = rng.choices(statuses, weights=weights)[0]
+        doc = {
+            "name": f"Guest {i}", "email": f"guest{i}@example.com", "trip": trip['name'], "trip_slug": trip['slug'],
+            "travel_date": "2025-12-01", "status": status,
+            "date": (start + datetime.timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M"),
+            "payment_status": "Paid" if status == 'Confirmed' else "Unpaid",
+        }
+        if status == 'Confirmed':
+            doc['amount'] = int(trip['price'])
+            ledger[trip['name']]['revenue'] += doc['amount']
+            ledger[trip['name']]['confirmed'] += 1
+        batch.append(InsertOne(doc))
+        if len(batch) == 10000:
+            db.bookings().bulk_write(batch, ordered=False)
+            batch = []
+    if batch: db.bookings().bulk_write(batch, ordered=False)
+    if ledger:
+        db.revenue_ledger().insert_many([{"_id": name, **row} for name, row in ledger.items()])
+    return trips
+
+
+# --- Scenarios ---
+
+def build_scenarios(appmod, db, trips, rng, iterations):
+    """Returns {name: (method, request_factory)}; each factory yields (path, kwargs) for one request."""
+    popular = trips[0]
+    names = [t['name'] for t in trips]
+    terms = [t['name'].split()[0] for t in trips[:50]] + [t['name'].split()[1].lower() for t in trips[:50]]
+
+    # Cursor 40 pages into the most-reviewed trip, as if a reader kept clicking "Next"
+    deep = {}
+    for sort in SORTS:
+        after = None
+        for _ in range(40):
+            _, _, cursor = appmod.fetch_reviews_page(popular['name'], sort, 5, after=after)
+            if cursor is None: break
+            after = cursor
+        deep[sort] = after
+
+    # Unpaid bookings to open the payment page for, and a separate set with orders to verify
+    unpaid = [str(b['_id']) for b in db.bookings().find({"payment_status": "Unpaid"}, {"_id": 1}).limit(iterations * 2)]
+    to_pay, to_verify = unpaid[:iterations], unpaid[iterations:]
+    for booking_id in to_verify:
+        db.bookings().update_one({"_id": appmod.ObjectId(booking_id)}, {"$set": {"razorpay_order_id": f"order_v{booking_id}"}})
+    verify_ids, verify_lock = iter(to_verify), threading.Lock()
+
+    def next_verify():
+        with verify_lock:
+            return next(verify_ids)
+
+    scenarios = {
+        'home': ('GET', lambda: ('/', {})),
+        'home?q': ('GET', lambda: (f'/?q={rng.choice(terms)}', {})),
+        'trip_details': ('GET', lambda: (f"/itinerary/{trips[skewed_index(rng, len(trips))]['slug']}", {})),
+    }
+    for sort in SORTS:
+        scenarios[f'trip_details sort={sort}'] = ('GET', lambda sort=sort: (f"/itinerary/{popular['slug']}?sort={sort}", {}))
+        if deep[sort]:
+            scenarios[f'trip_details sort={sort} page 41'] = (
+                'GET', lambda sort=sort: (f"/itinerary/{popular['slug']}?sort={sort}&page=41&after={deep[sort]}", {}))
+    scenarios.update({
+        'book_trip': ('POST', lambda: ('/book', {"data": {
+            "destination": rng.choice(names), "full_name": "Bench Guest", "email": "bench@example.com", "travel_date": "2025-12-01"}})),
+        'payment_page': ('GET', lambda: (f"/payment?booking_id={rng.choice(to_pay)}", {})),
+        'payment_verify': ('POST', lambda: ('/payment/verify', {"data": (lambda b: {
+            "razorpay_order_id": f"order_v{b}", "razorpay_payment_id": f"pay_{b}", "razorpay_signature": "bench"})(next_verify())})),
+        'admin_page': ('GET', lambda: ('/admin-dashboard', {})),
+        'admin_page status=Pending': ('GET', lambda: ('/admin-dashboard?status=Pending', {})),
+        'admin_page trip filter': ('GET', lambda: (f"/admin-dashboard?trip={popular['name']}", {})),
+    })
+    return scenarios
+
+
+# --- Runner ---
+
+def percentile(sorted_values, pct):
+    if not sorted_values: return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_scenario(app, method, factory, iterations, warmup, concurrency, clear_caches, admin=False):
+    local = threading.local()
+
+    def one(_):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+            # Only admin routes log in: an admin bypasses the response cache and sees extra markup on public pages
+            if admin:
+                with client.session_transaction() as sess:
+                    sess['admin_logged_in'] = True
+        path, kwargs = factory()
+        if clear_caches: clear_caches()
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, response.status_code
+
+    for i in range(warmup): one(i)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(iterations)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(ms for ms, _ in results)
+    errors = sum(1 for _, status in results if status >= 400)
+    return {
+        "requests": iterations, "errors": errors, "rps": iterations / wall if wall else 0.0,
+        "mean_ms": statistics.fmean(latencies), "p50_ms": percentile(latencies, 50), "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99), "max_ms": latencies[-1],
+    }
+
+
+def print_table(results, baseline=None):
+    print(f"\n{'route':<34}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}")
+    for name, r in results.items():
+        line = f"{name:<34}{r['rps']:>9.1f}{r['p50_ms']:>9.2f}{r['p90_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['max_ms']:>9.2f}{r['errors']:>8}"
+        old = (baseline or {}).get(name)
+        if old and old.get('p50_ms'):
+            line += f"   p50 {100 * (r['p50_ms'] - old['p50_ms']) / old['p50_ms']:+6.1f}%  req/s {100 * (r['rps'] - old['rps']) / old['rps']:+6.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', help="local mongod to seed and use instead of mongomock")
+    parser.add_argument('--trips', type=int, default=2000)
+    parser.add_argument('--bookings', type=int, default=200000)
+    parser.add_argument('--reviews', type=int, default=200000)
+    parser.add_argument('--scale', type=float, default=1.0, help="multiplies the three data volumes")
+    parser.add_argument('--iterations', type=int, default=200, help="measured requests per route")
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=1, help="threads issuing requests at once")
+    parser.add_argument('--routes', help="comma-separated subset of route names (prefix match)")
+    parser.add_argument('--razorpay-ms', type=float, default=0, help="simulated Razorpay API latency")
+    parser.add_argument('--cold-cache', action='store_true', help="clear the catalog, fragment and response caches before every request")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help="show the app's own log lines while measuring")
+    parser.add_argument('--out', default=os.path.join(ROOT_PATH, 'benchmarks', 'results', 'routes.json'))
+    parser.add_argument('--compare', help="earlier --out file to diff against")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = connect(args.mongo_uri)
+    import app as appmod
+    appmod.razorpay_client = FakeRazorpay(args.razorpay_ms)
+
+    volumes = {k: max(1, int(getattr(args, k) * args.scale)) for k in ('trips', 'bookings', 'reviews')}
+    print(f"Seeding {volumes['trips']:,} trips, {volumes['bookings']:,} bookings, {volumes['reviews']:,} reviews "
+          f"into {'mongod' if args.mongo_uri else 'mongomock'}...")
+    started = time.perf_counter()
+    trips = seed(db, volumes['trips'], volumes['bookings'], volumes['reviews'], rng)
+    print(f"  done in {time.perf_counter() - started:.1f}s")
+
+    scenarios = build_scenarios(appmod, db, trips, rng, args.iterations + args.warmup)
+    if args.routes:
+        wanted = [w.strip() for w in args.routes.split(',')]
+        scenarios = {k: v for k, v in scenarios.items() if any(k.startswith(w) for w in wanted)}
+
+    def clear_caches():
+        appmod.catalog_cache.clear()
+        appmod.fragments.clear()
+        appmod.response_cache.clear()
+
+    results = {}
+    for name, (method, factory) in scenarios.items():
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            results[name] = run_scenario(appmod.app, method, factory, args.iterations, args.warmup, args.concurrency,
+                                         clear_caches if args.cold_cache else None, admin=name.startswith('admin'))
+        print(f"  {name:<34} {results[name]['p50_ms']:8.2f} ms p50")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get('routes')
+    print_table(results, baseline)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump({
+            "created_at": datetime.datetime.utcnow().isoformat() + 'Z',
+            "backend": 'mongod' if args.mongo_uri else 'mongomock',
+            "volumes": volumes, "iterations": args.iterations, "concurrency": args.concurrency,
+            "cold_cache": args.cold_cache, "razorpay_ms": args.razorpay_ms,
+            "python": sys.version.split()[0], "routes": results,
+        }, f, indent=1)
+    print(f"\nSaved {args.out}")
+
+
+if __name__ == '__main__':
+    main()
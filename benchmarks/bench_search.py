@@ -0,0 +1,74 @@
+"""Home page search latency as the catalog grows.
+
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --sizes 1000,10000,100000 --queries 2000
+
+Builds the search index over synthetic catalogs of each size (trips with
+realistic names, descriptions and itineraries) and times a mix of one-word,
+prefix and multi-word queries against it. Prints the index build time and
+p50/p99 query latency per size; query latency should stay roughly flat while
+build time grows with the catalog. No database is involved.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from bench_routes import REGIONS, WORDS, percentile  # noqa: E402
+from search import SearchIndex  # noqa: E402
+
+
+def catalog(n, rng):
+    return [{
+        "name": f"{rng.choice(REGIONS)} {rng.choice(WORDS).title()} {i}",
+        "description": " ".join(rng.choice(WORDS) for _ in range(60)),
+        "itinerary": [{"title": f"Day {d + 1}: {rng.choice(REGIONS)} {rng.choice(WORDS)}",
+                       "description": " ".join(rng.choice(WORDS) for _ in range(40))} for d in range(rng.randint(3, 8))],
+    } for i in range(n)]
+
+
+def queries(n, rng):
+    kinds = [
+        lambda: rng.choice(REGIONS),
+        lambda: rng.choice(REGIONS)[:3],
+        lambda: f"{rng.choice(REGIONS)} {rng.choice(WORDS)}",
+        lambda: f"{rng.choice(WORDS)} {rng.choice(WORDS)[:2]}",
+        lambda: "nowhere",
+    ]
+    return [rng.choice(kinds)() for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='500,2000,10000,50000', help="comma-separated catalog sizes")
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=24, help="results per query, as SEARCH_MAX_RESULTS")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'trips':>8} {'build ms':>9} {'tokens':>7} {'p50 ms':>8} {'p99 ms':>8} {'mean hits':>10}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        rng = random.Random(args.seed)
+        trips = catalog(size, rng)
+        started = time.perf_counter()
+        index = SearchIndex(trips)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        latencies, hits = [], []
+        for query in queries(args.queries, rng):
+            started = time.perf_counter()
+            results = index.search(query, args.limit)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits.append(len(results))
+        latencies.sort()
+        print(f"{size:>8} {build_ms:>9.0f} {len(index.vocabulary):>7} {percentile(latencies, 50):>8.3f} "
+              f"{percentile(latencies, 99):>8.3f} {statistics.fmean(hits):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""Throughput and memory of one container under each gunicorn profile, fully offline.
+
+    python benchmarks/bench_server.py                                  # mongomock, 20s per profile
+    python benchmarks/bench_server.py --mongo-uri mongodb://localhost:27017/ --duration 60 --concurrency 64
+
+Starts the app under real gunicorn processes, one profile at a time, and
+drives it over HTTP from ``--concurrency`` keep-alive clients for
+``--duration`` seconds. The traffic mix is mostly home, search and itinerary
+pages, plus payment pages for new bookings, each of which creates a Razorpay
+order that takes ``--razorpay-ms`` (the request a sync worker spends waiting).
+
+Profiles:
+
+- ``default``: ``gunicorn app:app`` without gunicorn.conf.py, as the Procfile
+  and Dockerfile ran it before: one sync worker.
+- ``no-preload``: gunicorn.conf.py with GUNICORN_PRELOAD=off.
+- ``cpu``: gunicorn.conf.py with WEB_WORKLOAD=cpu (sync workers).
+- ``io``: gunicorn.conf.py as shipped.
+- ``gevent``: gunicorn.conf.py with WEB_WORKLOAD=gevent, if gevent is installed.
+
+Prints requests/sec, latency and errors per profile, and the memory of the
+container (PSS summed over master and workers) and of each worker (PSS, and
+USS: the pages no other process shares). Linux only, since memory is read
+from /proc.
+
+With mongomock the catalog lives inside each server process: a preloaded
+master seeds it once and its workers share it, without preload every worker
+seeds its own copy, which inflates no-preload memory. Use ``--mongo-uri``
+with a throwaway local mongod (its ``dhou-wanderer`` database is dropped) for
+memory numbers that resemble production.
+"""
+import argparse
+import http.client
+import itertools
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+ROOT_PATH = os.path.dirname(BENCH_PATH)
+sys.path.insert(0, ROOT_PATH)
+
+from bench_routes import FakeRazorpay, connect, percentile, seed  # noqa: E402
+
+PROFILES = {
+    'default': None,
+    'no-preload': {'GUNICORN_PRELOAD': 'off'},
+    'cpu': {'WEB_WORKLOAD': 'cpu'},
+    'io': {},
+    'gevent': {'WEB_WORKLOAD': 'gevent'},
+}
+# (route, weight)
+MIX = (('home', 40), ('search', 10), ('itinerary', 30), ('payment', 20))
+
+
+# --- Server side: the WSGI app the gunicorn processes load ---
+
+def payment_booking_id(i):
+    return f"{i + 1:024x}"
+
+
+def seed_server(db, trips, payments, rng):
+    from bson.objectid import ObjectId
+
+    seeded = seed(db, trips, trips * 5, trips * 10, rng)
+    if payments:
+        db.bookings().insert_many([{
+            "_id": ObjectId(payment_booking_id(i)), "name": f"Payer {i}", "email": f"payer{i}@example.com",
+            "trip": seeded[i % len(seeded)]['name'], "trip_slug": seeded[i % len(seeded)]['slug'],
+            "status": "Pending", "payment_status": "Unpaid",
+        } for i in range(payments)])
+    return seeded
+
+
+def child_app():
+    """gunicorn's app factory (``bench_server:child_app()``); settings come from BENCH_* variables."""
+    mongo_uri = os.environ.get('BENCH_MONGO_URI')
+    db = connect(mongo_uri)
+    if not mongo_uri:
+        import mongomock
+        # One store per process, so the data outlives the client app.after_fork() drops
+        store = mongomock.store.ServerStore()
+        db.MongoClient = lambda uri, **options: mongomock.MongoClient(uri, _store=store)
+        seed_server(db, int(os.environ['BENCH_TRIPS']), int(os.environ['BENCH_PAYMENTS']), random.Random(42))
+
+    import app as appmod
+    from payments import LazyClient
+    latency = float(os.environ.get('BENCH_RAZORPAY_MS', 0))
+    appmod.razorpay_client = LazyClient(lambda: FakeRazorpay(latency))
+    return appmod.app
+
+
+# --- Client side ---
+
+def pick_route(rng):
+    routes, weights = zip(*MIX)
+    return rng.choices(routes, weights=weights)[0]
+
+
+def load(port, slugs, duration, concurrency, payments):
+    """Requests from ``concurrency`` keep-alive clients for ``duration`` seconds: (latencies in ms, errors)."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    next_payment = itertools.count()
+    deadline = time.monotonic() + duration
+
+    def client(n):
+        rng = random.Random(n)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        mine, failed = [], []
+        while time.monotonic() < deadline:
+            route = pick_route(rng)
+            if route == 'home':
+                path = '/'
+            elif route == 'search':
+                path = '/?' + urllib.parse.urlencode({'q': rng.choice(slugs).split('-')[0]})
+            elif route == 'itinerary':
+                path = f"/itinerary/{rng.choice(slugs[:50])}"
+            else:
+                i = next(next_payment)
+                if i >= payments:
+                    continue
+                path = f"/payment?booking_id={payment_booking_id(i)}"
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed.append(f"{route} {response.status}")
+                else:
+                    mine.append((time.perf_counter() - started) * 1000)
+            except (OSError, http.client.HTTPException) as e:
+                failed.append(f"{route} {type(e).__name__}")
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors.extend(failed)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return latencies, errors
+
+
+def memory_kb(pid):
+    """(PSS, USS) of a process in kB, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields.get('Pss', 0), fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; the parent pid is the second field after it
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            found.append(int(entry))
+    return found
+
+
+def wait_ready(port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            ok = conn.getresponse().status == 200
+            conn.close()
+            if ok:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run_profile(name, overrides, args, port, slugs, workdir):
+    env = dict(os.environ, BENCH_TRIPS=str(args.trips), BENCH_PAYMENTS=str(args.payments),
+               BENCH_RAZORPAY_MS=str(args.razorpay_ms), PYTHONUNBUFFERED='1')
+    if args.mongo_uri:
+        env['BENCH_MONGO_URI'] = args.mongo_uri
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{port}",
+               '--pythonpath', f"{ROOT_PATH},{BENCH_PATH}"]
+    if overrides is not None:
+        env.update(overrides)
+        command += ['--config', os.path.join(ROOT_PATH, 'gunicorn.conf.py')]
+    command.append('bench_server:child_app()')
+
+    # Run from an empty directory, so the default profile doesn't pick up ./gunicorn.conf.py
+    log = open(os.path.join(workdir, f"{name}.log"), 'w+')
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        if not wait_ready(port, process, args.startup_timeout):
+            log.seek(0)
+            print(f"❌ {name}: gunicorn did not start\n{log.read()[-3000:]}")
+            return None
+        # Warm every worker's caches before measuring
+        load(port, slugs, args.warmup, args.concurrency, 0)
+        started = time.perf_counter()
+        latencies, errors = load(port, slugs, args.duration, args.concurrency, args.payments)
+        elapsed = time.perf_counter() - started
+
+        workers = [memory_kb(pid) for pid in children(process.pid)]
+        master = memory_kb(process.pid)
+        latencies.sort()
+        result = {
+            "workers": len(workers),
+            "rps": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 50) if latencies else 0,
+            "p99_ms": percentile(latencies, 99) if latencies else 0,
+            "errors": len(errors),
+            "pss_total_mb": (master[0] + sum(pss for pss, _ in workers)) / 1024,
+            "pss_worker_mb": statistics.fmean(pss for pss, _ in workers) / 1024 if workers else 0,
+            "uss_worker_mb": statistics.fmean(uss for _, uss in workers) / 1024 if workers else 0,
+        }
+        if errors:
+            print(f"⚠️ {name}: {len(errors)} failed requests, e.g. {', '.join(sorted(set(errors))[:5])}")
+        return result
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=args.graceful_timeout + 10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', help="local mongod to seed and use instead of mongomock")
+    parser.add_argument('--profiles', default=','.join(PROFILES), help="comma-separated subset of the profiles")
+    parser.add_argument('--trips', type=int, default=200)
+    parser.add_argument('--payments', type=int, default=20000, help="unpaid bookings the payment route draws from")
+    parser.add_argument('--duration', type=float, default=20, help="measured seconds per profile")
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--concurrency', type=int, default=32, help="keep-alive clients at once")
+    parser.add_argument('--razorpay-ms', type=float, default=150, help="simulated Razorpay API latency")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--startup-timeout', type=float, default=120)
+    parser.add_argument('--graceful-timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    profiles = [p.strip() for p in args.profiles.split(',')]
+    if 'gevent' in profiles:
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            print("Skipping the gevent profile: gevent is not installed")
+            profiles.remove('gevent')
+
+    db = connect(args.mongo_uri)
+    if not args.mongo_uri:
+        # Seeded the same way as in the servers, to learn the slugs they will have
+        slugs = [trip['slug'] for trip in seed_server(db, args.trips, 0, random.Random(42))]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in profiles:
+            if args.mongo_uri:
+                # Payment pages store the order they create, so every profile starts from freshly seeded bookings
+                print(f"Seeding {args.trips:,} trips and {args.payments:,} unpaid bookings into mongod...")
+                slugs = [trip['slug'] for trip in seed_server(db, args.trips, args.payments, random.Random(42))]
+            print(f"  {name}...")
+            results[name] = run_profile(name, PROFILES[name], args, args.port, slugs, workdir)
+
+    print(f"\n{'profile':<11} {'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} "
+          f"{'PSS MB':>8} {'PSS/worker':>10} {'USS/worker':>10}")
+    for name, r in results.items():
+        if r is None:
+            print(f"{name:<11} failed to start")
+            continue
+        print(f"{name:<11} {r['workers']:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>7} "
+              f"{r['pss_total_mb']:>8.1f} {r['pss_worker_mb']:>10.1f} {r['uss_worker_mb']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Cold-start profile: import-time breakdown and time to first request.
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --max-first-request-ms 1500 --json startup.json   # CI
+
+Every run is a fresh interpreter, like a serverless cold start or a new
+gunicorn worker. The report lists what ``import app`` spends its time on
+(from ``python -X importtime``), the median import and first-request times,
+and which deferred integrations were loaded along the way.
+
+Exits with status 1 when a threshold is exceeded or when a module listed in
+``--forbid`` (by default the PDF, payment, upload and mail libraries, which
+the app only loads on first use) has been imported by startup plus the first
+request. Needs no database or network.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFERRED = ('reportlab', 'razorpay', 'cloudinary', 'flask_mail', 'requests', 'PIL')
+
+# Prefixes the child's result line, so prints from the app, libraries or atexit hooks around it don't matter
+RESULT_MARKER = '@@bench_startup-result@@ '
+
+# Runs in the child interpreter
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get({path!r})
+finished = time.perf_counter()
+print({marker!r} + json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (finished - started) * 1000,
+    "status": response.status_code,
+    "loaded": sorted({{name.split('.')[0] for name in sys.modules}} & set({deferred!r})),
+}}), flush=True)
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault('SECRET_KEY', 'startup-profile')
+    env['OUTBOX_WORKER'] = 'off'
+    return env
+
+
+def run_once(path, watch=DEFERRED):
+    code = CHILD.format(path=path, deferred=tuple(watch), marker=RESULT_MARKER)
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT_PATH, env=child_env(),
+                         capture_output=True, text=True, check=True).stdout
+    for line in out.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"No result from the child interpreter; its output was:\n{out}")
+
+
+def import_breakdown():
+    """Cumulative microseconds for each module ``app`` imports directly, from -X importtime."""
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT_PATH, env=child_env(),
+                         capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith('import time:') or '|' not in line: continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit(): continue
+        # Two spaces of indent = imported by a top-level module, i.e. by app.py itself
+        if name.startswith('   ') and not name.startswith('    '):
+            rows.append((name.strip(), int(cumulative)))
+    return sorted(rows, key=lambda row: -row[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/admin-login', help="first request (default needs no database)")
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--max-import-ms', type=float)
+    parser.add_argument('--max-first-request-ms', type=float)
+    parser.add_argument('--forbid', default='reportlab,razorpay,cloudinary,flask_mail',
+                        help="comma-separated modules that must not load at startup ('' to disable)")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    breakdown = import_breakdown()
+    total = sum(us for _, us in breakdown) or 1
+    print("import app: direct imports by cumulative time (one -X importtime run)")
+    for name, us in breakdown[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {us * 100 / total:5.1f}%  {name}")
+
+    forbid = [m for m in args.forbid.split(',') if m]
+    runs = [run_once(args.path, set(DEFERRED) | set(forbid)) for _ in range(args.runs)]
+    import_ms = statistics.median(r['import_ms'] for r in runs)
+    first_request_ms = statistics.median(r['first_request_ms'] for r in runs)
+    loaded = runs[-1]['loaded']
+    print(f"\nmedian of {args.runs} cold starts:")
+    print(f"  import app            {import_ms:8.1f} ms")
+    print(f"  first request         {first_request_ms:8.1f} ms  (GET {args.path} -> {runs[-1]['status']})")
+    print(f"  deferred libs loaded  {', '.join(loaded) or 'none'}")
+
+    failures = []
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"import took {import_ms:.0f} ms (limit {args.max_import_ms:.0f} ms)")
+    if args.max_first_request_ms is not None and first_request_ms > args.max_first_request_ms:
+        failures.append(f"first request took {first_request_ms:.0f} ms (limit {args.max_first_request_ms:.0f} ms)")
+    forbidden = [m for m in forbid if m in loaded]
+    if forbidden:
+        failures.append(f"loaded at startup: {', '.join(forbidden)}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"import_ms": import_ms, "first_request_ms": first_request_ms, "loaded": loaded,
+                       "breakdown_us": dict(breakdown), "runs": runs, "failures": failures}, f, indent=1)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
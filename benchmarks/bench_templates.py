@@ -0,0 +1,110 @@
+"""Template cost: loading on a cold start, and rendering the busiest pages.
+
+    python benchmarks/bench_templates.py
+    python benchmarks/bench_templates.py --trips 2000 --renders 200
+
+Loading: every template is loaded into an empty template cache, compiling
+from source and then from the bytecode ``flask compile-templates`` writes, as
+a new worker or serverless instance would.
+
+Rendering: CPU time per render of the home page (``--trips`` cards), a page
+of search results and an itinerary page, with the fragment cache emptied
+before every render (each card and itinerary rendered inline, as before
+fragments) and warm (cards and itineraries reused). Only the template work is
+timed; no database or HTTP is involved.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from bench_routes import REGIONS, WORDS, connect, percentile  # noqa: E402
+
+
+def catalog(n, rng):
+    trips = []
+    for i in range(n):
+        name = f"{rng.choice(REGIONS)} {rng.choice(WORDS).title()} {i}"
+        trips.append({
+            "_id": i, "name": name, "slug": name.lower().replace(' ', '-'),
+            "price": rng.randrange(4000, 60000, 500), "spots": rng.randint(0, 30), "capacity": 30,
+            "image": "https://via.placeholder.com/400x300?text=No+Image", "image_variants": None,
+            "description": " ".join(rng.choice(WORDS) for _ in range(60)),
+            "itinerary": [{"title": f"Day {d + 1}: {rng.choice(REGIONS)}", "description": " ".join(rng.choice(WORDS) for _ in range(40)),
+                           "image": "mechuka-4.jpeg" if d % 2 else None, "image_variants": None} for d in range(rng.randint(3, 8))],
+        })
+    return trips
+
+
+def cpu_ms(render, renders, before=None):
+    timings = []
+    for _ in range(renders):
+        if before: before()
+        started = time.process_time()
+        render()
+        timings.append((time.process_time() - started) * 1000)
+    timings.sort()
+    return statistics.fmean(timings), percentile(timings, 99)
+
+
+def load_all(env):
+    env.cache.clear()
+    started = time.perf_counter()
+    for name in env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        env.get_template(name)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trips', type=int, default=200, help="trips on the home page")
+    parser.add_argument('--renders', type=int, default=100, help="measured renders per page")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    connect(None)  # mongomock, for the metrics the renders record
+    import app as appmod
+    from flask import render_template
+    from template_cache import TemplateBytecodeCache
+
+    env = appmod.app.jinja_env
+    directory = tempfile.mkdtemp(prefix='template-cache-')
+    try:
+        env.bytecode_cache = None
+        source_ms = min(load_all(env) for _ in range(5))
+        env.bytecode_cache = TemplateBytecodeCache(directory)
+        count = len(env.bytecode_cache.compile_all(env))
+        bytecode_ms = min(load_all(env) for _ in range(5))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print(f"Loading {count} templates into an empty cache: {source_ms:.1f} ms from source, {bytecode_ms:.1f} ms from bytecode")
+
+    trips = catalog(args.trips, random.Random(args.seed))
+    trip = max(trips, key=lambda t: len(t['itinerary']))
+    pages = {
+        f"home ({args.trips} cards)": lambda: render_template('index.html', trips=trips, search_query=None),
+        "search (24 cards)": lambda: render_template('index.html', trips=trips[:24], search_query="valley"),
+        f"itinerary ({len(trip['itinerary'])} days)": lambda: render_template(
+            'details.html', trip=trip, reviews=[], avg_rating=4.5, review_count=120, page=1, total_pages=12,
+            sort_option='newest', prev_cursor=None, next_cursor='x'),
+    }
+
+    print(f"\n{'page':<22} {'inline ms':>10} {'p99':>7} {'fragments ms':>13} {'p99':>7} {'speed-up':>9}")
+    with appmod.app.test_request_context('/'):
+        for name, render in pages.items():
+            inline = cpu_ms(render, args.renders, before=appmod.fragments.clear)
+            render()
+            cached = cpu_ms(render, args.renders)
+            print(f"{name:<22} {inline[0]:>10.2f} {inline[1]:>7.2f} {cached[0]:>13.2f} {cached[1]:>7.2f} "
+                  f"{inline[0] / cached[0] if cached[0] else 0:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+from pymongo import ReturnDocument
+
+
+class CatalogCache:
+    """Bounded, TTL-based in-process cache for trip catalog reads.
+
+    Every gunicorn worker keeps its own copy. A version counter stored in
+    Mongo is bumped on every admin write so other workers notice the change
+    on their next version check and drop their entries.
+    """
+
+    VERSION_DOC_ID = 'catalog_version'
+
+    def __init__(self, max_entries=256, ttl=300, version_check_interval=2):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.get_meta = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        self.clock = None
+        # Causal position at or after the write that produced the current version; loaders read after it
+        self.read_after = None
+
+    def bind(self, get_meta, clock=None):
+        """``get_meta`` returns the collection holding the shared version counter.
+
+        ``clock`` returns the primary's current causal position (db.latest_position).
+        It is read whenever the version changes, so loaders reading from secondaries
+        can wait for the writes that changed it (see ``read_after``).
+        """
+        self.get_meta = get_meta
+        self.clock = clock
+
+    @property
+    def version(self):
+        self._sync_version()
+        return self._version or 0
+
+    def get(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss.
+
+        ``None`` results are not cached so a trip created a moment later is
+        picked up without waiting for the TTL.
+        """
+        value = self.lookup(key)
+        if value is None:
+            value = loader()
+            self.store(key, value)
+        return value
+
+    def lookup(self, key):
+        """The cached value for ``key``, or None. For callers that load misses themselves (asgi.py)."""
+        self._sync_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        return None
+
+    def store(self, key, value):
+        if value is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self):
+        """Drop local entries and bump the shared version for other workers."""
+        self.clear()
+        if self.get_meta is None:
+            return
+        try:
+            doc = self.get_meta().find_one_and_update(
+                {'_id': self.VERSION_DOC_ID},
+                {'$inc': {'value': 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self.read_after = self._now()
+            self._version = doc['value']
+            self._version_checked_at = time.monotonic()
+        except Exception as e:
+            print(f"❌ Catalog cache version bump failed: {e}")
+
+    def _now(self):
+        if self.clock is None:
+            return None
+        try:
+            return self.clock()
+        except Exception as e:
+            print(f"❌ Catalog cache clock read failed: {e}")
+            return None
+
+    def _sync_version(self):
+        if self.get_meta is None:
+            return
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        try:
+            doc = self.get_meta().find_one({'_id': self.VERSION_DOC_ID})
+        except Exception as e:
+            print(f"❌ Catalog cache version check failed: {e}")
+            return
+        version = doc['value'] if doc else 0
+        if version != self._version:
+            # Before clearing, so no loader refills the cache from a secondary that hasn't caught up
+            self.read_after = self._now()
+            self.clear()
+            self._version = version
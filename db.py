@@ -0,0 +1,268 @@
+"""MongoDB access layer.
+
+The client is created lazily, once per process: nothing touches the network
+at import time (faster cold starts), and a process forked by gunicorn builds
+its own client instead of inheriting the parent's sockets. Routes reach
+collections through the accessors below instead of module globals.
+
+Indexes are declared in INDEXES and created by ``flask ensure-indexes`` at
+deploy time, never on the request path.
+
+Reads are routed by workload. Catalog, review and dashboard reads go through
+``replica()`` to a secondary no more than MONGO_MAX_STALENESS_SECONDS behind
+the primary, so adding secondaries adds read capacity. Bookings, payments and
+the shared version counters stay on the primary. A reader that must see a
+particular write (its own booking, the reviews a version bump announced)
+reads in a ``causal_session()`` given that write's causal position (its
+cluster time and operation time); a secondary then waits until it has
+applied the write before answering.
+"""
+import contextlib
+import os
+import threading
+
+import certifi
+from bson import json_util
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+from pymongo.errors import ConfigurationError
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+DB_NAME = 'dhou-wanderer'
+
+_client = None
+_client_pid = None
+_async_client = None
+_async_client_pid = None
+_lock = threading.Lock()
+
+# pymongo monitoring listeners (e.g. metrics.MongoTimer) given to every client this module creates
+event_listeners = []
+
+
+def mongo_uri():
+    return os.environ.get('MONGO_URI')
+
+
+def is_configured():
+    uri = mongo_uri()
+    return bool(uri) and "replace_with" not in uri and "your_mongo_string" not in uri
+
+
+def client_options():
+    return {
+        "tlsCAFile": certifi.where(),
+        "appname": "wanderer",
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', 20)),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+        "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_MS', 60000)),
+        "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        "socketTimeoutMS": int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 20000)),
+        "retryWrites": True,
+        "event_listeners": list(event_listeners),
+    }
+
+
+def get_client():
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                if not is_configured():
+                    raise RuntimeError("Invalid MONGO_URI detected. Please check your .env file.")
+                # MongoClient connects in the background; the first query waits for server selection
+                _client = MongoClient(mongo_uri(), **client_options())
+                _client_pid = pid
+    return _client
+
+
+def get_async_client():
+    """pymongo's native asyncio client, for the async read path in asgi.py.
+
+    It belongs to the event loop that first uses it, which under uvicorn is
+    the one loop of each worker process.
+    """
+    global _async_client, _async_client_pid
+    pid = os.getpid()
+    if _async_client is None or _async_client_pid != pid:
+        with _lock:
+            if _async_client is None or _async_client_pid != pid:
+                if not is_configured():
+                    raise RuntimeError("Invalid MONGO_URI detected. Please check your .env file.")
+                from pymongo import AsyncMongoClient
+                _async_client = AsyncMongoClient(mongo_uri(), **client_options())
+                _async_client_pid = pid
+    return _async_client
+
+
+def reset():
+    """Drop this process's clients, e.g. from a post-fork hook. The next access creates new ones."""
+    global _client, _client_pid, _async_client, _async_client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+        # AsyncMongoClient.close() is a coroutine tied to its loop; an unused client just needs dropping
+        _async_client = None
+        _async_client_pid = None
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def get_async_db():
+    return get_async_client()[DB_NAME]
+
+
+# --- Read routing ---
+# maxStalenessSeconds can't be under 90: the servers' heartbeat plus idle write periods, with margin
+SECONDARY_READS = os.environ.get('MONGO_SECONDARY_READS', 'on') != 'off'
+MAX_STALENESS_SECONDS = max(int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', 90)), 90)
+REPLICA_READ_PREFERENCE = SecondaryPreferred(max_staleness=MAX_STALENESS_SECONDS) if SECONDARY_READS else Primary()
+
+
+def replica(collection):
+    """``collection`` (sync or async) reading from a fresh enough secondary, or the primary when none is.
+
+    Writes through it still go to the primary.
+    """
+    return collection.with_options(read_preference=REPLICA_READ_PREFERENCE)
+
+
+def _start_session(client, after):
+    try:
+        session = client.start_session(causal_consistency=True)
+    except (ConfigurationError, NotImplementedError):
+        # No sessions on this deployment (a standalone pre-3.6 server, mongomock): reads are as fresh as the node they hit
+        return None
+    for position in after:
+        if position is None:
+            continue
+        # Cluster time first: a node only waits for an afterClusterTime the driver has also gossiped to it
+        if position.get('cluster_time') is not None:
+            session.advance_cluster_time(position['cluster_time'])
+        session.advance_operation_time(position['operation_time'])
+    return session
+
+
+@contextlib.contextmanager
+def causal_session(*after):
+    """A causally consistent session whose reads see every operation up to the positions in ``after``.
+
+    ``None`` positions are skipped. Yields None where sessions aren't supported;
+    pymongo accepts ``session=None``, so callers pass it through unchanged.
+    """
+    session = _start_session(get_client(), after)
+    if session is None:
+        yield None
+        return
+    with session:
+        yield session
+
+
+@contextlib.asynccontextmanager
+async def async_causal_session(*after):
+    """causal_session() for the async client. One operation at a time per session: open one per concurrent read."""
+    session = _start_session(get_async_client(), after)
+    if session is None:
+        yield None
+        return
+    async with session:
+        yield session
+
+
+def causal_position(session):
+    """Where ``session``'s last read or write left it, for a later causal_session(); None without one.
+
+    Both halves are kept: the operation time to read after, and the signed
+    cluster time that lets the server accept it.
+    """
+    if session is None or session.operation_time is None:
+        return None
+    return {'cluster_time': session.cluster_time, 'operation_time': session.operation_time}
+
+
+def latest_position():
+    """The primary's newest causal position: a causal_session() given it sees every write acknowledged before this call."""
+    with causal_session() as session:
+        meta().find_one({'_id': 'catalog_version'}, {'_id': 1}, session=session)
+        return causal_position(session)
+
+
+def dump_position(position):
+    """``position`` as a string, e.g. for a cookie (its cluster time holds BSON types JSON can't)."""
+    # Canonical mode keeps the signature's keyId an Int64, which the server requires
+    return json_util.dumps(position, json_options=json_util.CANONICAL_JSON_OPTIONS)
+
+
+def load_position(value):
+    """The position dump_position() wrote, or None if ``value`` is missing or unreadable."""
+    try:
+        position = json_util.loads(value) if value else None
+    except (TypeError, ValueError):
+        return None
+    return position if isinstance(position, dict) and position.get('operation_time') is not None else None
+
+
+def bookings(): return get_db()['bookings']
+def trips(): return get_db()['trips']
+def users(): return get_db()['users']
+def reviews(): return get_db()['reviews']
+def review_summaries(): return get_db()['review_summaries']
+def meta(): return get_db()['meta']
+def email_outbox(): return get_db()['email_outbox']
+def invoices(): return get_db()['invoices']
+def revenue_ledger(): return get_db()['revenue_ledger']
+def media_hashes(): return get_db()['media_hashes']
+def metrics(): return get_db()['metrics']
+
+
+OUTBOX_KEEP_SENT_DAYS = int(os.environ.get('OUTBOX_KEEP_SENT_DAYS', 30))
+
+INDEXES = {
+    'trips': [
+        IndexModel([("slug", ASCENDING)], name="slug_unique", unique=True,
+                   partialFilterExpression={"slug": {"$type": "string"}}),
+        IndexModel([("name", ASCENDING)], name="name"),
+    ],
+    'bookings': [
+        IndexModel([("razorpay_order_id", ASCENDING)], name="razorpay_order_id", sparse=True),
+        IndexModel([("status", ASCENDING), ("_id", DESCENDING)], name="status_recent"),
+        IndexModel([("trip", ASCENDING), ("_id", DESCENDING)], name="trip_recent"),
+        IndexModel([("trip", ASCENDING), ("status", ASCENDING), ("_id", DESCENDING)], name="trip_status_recent"),
+        # Only unpaid seat holds are swept for expiry
+        IndexModel([("hold_expires_at", ASCENDING)], name="hold_expiry",
+                   partialFilterExpression={"hold": "held"}),
+        # Unpaid bookings that reached checkout, walked by `flask reconcile-payments`
+        IndexModel([("payment_status", ASCENDING), ("_id", ASCENDING)], name="unpaid_orders",
+                   partialFilterExpression={"razorpay_order_id": {"$exists": True}}),
+    ],
+    # One index per review sort field; each serves both directions
+    'reviews': [
+        IndexModel([("trip_name", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)], name="trip_date"),
+        IndexModel([("trip_name", ASCENDING), ("rating", ASCENDING), ("_id", ASCENDING)], name="trip_rating"),
+    ],
+    'email_outbox': [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_due"),
+        # Only delivered messages carry sent_at, so failed ones are never expired
+        IndexModel([("sent_at", ASCENDING)], name="sent_ttl", expireAfterSeconds=OUTBOX_KEEP_SENT_DAYS * 86400),
+    ],
+}
+
+
+def ensure_indexes():
+    """Create every declared index. Safe to run repeatedly; returns the names of failed indexes."""
+    database = get_db()
+    failed = []
+    for collection_name, models in INDEXES.items():
+        for model in models:
+            try:
+                database[collection_name].create_indexes([model])
+            except Exception as e:
+                name = model.document.get('name')
+                failed.append(f"{collection_name}.{name}")
+                print(f"❌ Could not create index {collection_name}.{name}: {e}")
+    return failed
@@ -0,0 +1,122 @@
+"""gunicorn settings for app:app and asgi:app. gunicorn reads this file from the working directory.
+
+    gunicorn app:app                                        # WEB_WORKLOAD=io: threaded workers
+    WEB_WORKLOAD=gevent gunicorn app:app                    # needs `pip install gevent`
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker      # -k overrides the worker class chosen here
+
+The app is imported once in the master and workers are forked from it
+(``preload_app``), so templates, the asset manifest and every imported module
+are shared copy-on-write instead of loaded once per worker. The objects the
+master allocated are frozen out of the garbage collector before the first
+fork: a collection would otherwise write to every page it visits and un-share
+them. Each worker then drops the MongoDB, Razorpay and Cloudinary clients and
+pools it inherited (``app.after_fork``) and opens its own.
+
+Workers are sized from the CPUs the container may actually use (its cgroup
+quota, not the host's core count) and the workload:
+
+- ``io`` (default): ``gthread`` workers, CPUs + 1 of them with GUNICORN_THREADS
+  threads each. A request waiting on SMTP, Razorpay or MongoDB holds one
+  thread, not the whole worker.
+- ``cpu``: ``sync`` workers, 2 × CPUs + 1, for CPU-bound deployments (e.g.
+  inline invoice rendering).
+- ``gevent``: one worker per CPU serving GUNICORN_WORKER_CONNECTIONS
+  greenlets. The standard library is monkey-patched here, before the app,
+  pymongo, requests or smtplib are imported, so every blocking call they make
+  yields; invoices render inline because a process pool can't be forked from
+  a greenlet.
+
+Workers are recycled after GUNICORN_MAX_REQUESTS requests (with jitter so
+they don't all restart together) and get GUNICORN_GRACEFUL_TIMEOUT seconds to
+finish in-flight requests on restart. WEB_CONCURRENCY, as set by Heroku and
+Render, overrides the worker count.
+"""
+import gc
+import math
+import os
+import sys
+
+
+def available_cpus():
+    """CPUs this process may use: the container's CPU quota when it has one, else the CPUs it may run on."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>", or "max <period>" when unlimited
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: a quota of -1 means unlimited
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+
+WORKLOADS = {
+    # worker class, workers for n CPUs, threads per worker
+    'io': ('gthread', lambda n: n + 1, 8),
+    'cpu': ('sync', lambda n: 2 * n + 1, 1),
+    'gevent': ('gevent', lambda n: n, 1),
+}
+
+workload = os.environ.get('WEB_WORKLOAD', 'io')
+if workload not in WORKLOADS:
+    sys.exit(f"❌ WEB_WORKLOAD must be one of {', '.join(WORKLOADS)}, not '{workload}'")
+worker_class, default_workers, default_threads = WORKLOADS[workload]
+cpus = available_cpus()
+
+workers = int(os.environ.get('WEB_CONCURRENCY') or default_workers(cpus))
+threads = int(os.environ.get('GUNICORN_THREADS') or default_threads)
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 200))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'on') != 'off'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+
+# Worker heartbeats go to a tmpfs file instead of the container's (possibly slow, overlay) disk
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+if worker_class == 'gevent':
+    try:
+        from gevent import monkey
+    except ImportError:
+        sys.exit("❌ WEB_WORKLOAD=gevent needs gevent: pip install gevent")
+    monkey.patch_all()
+    os.environ.setdefault('INVOICE_WORKERS', '0')
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before the first worker is forked
+    cfg = server.cfg
+    if cfg.preload_app:
+        gc.freeze()
+    server.log.info(f"{workload} profile on {cpus} CPUs: {cfg.workers} {cfg.worker_class_str} workers"
+                    + (f" × {cfg.threads} threads" if cfg.worker_class_str == 'gthread' else "")
+                    + (f" × {cfg.worker_connections} connections" if cfg.worker_class_str == 'gevent' else "")
+                    + (", preloaded" if cfg.preload_app else ""))
+
+
+def post_fork(server, worker):
+    # Without preload the app isn't imported yet and has nothing to drop
+    app = sys.modules.get('app')
+    if app is not None and hasattr(app, 'after_fork'):
+        app.after_fork()
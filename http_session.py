@@ -0,0 +1,25 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+
+class TimeoutSession(requests.Session):
+    """requests.Session with keep-alive pooling and a default timeout on every call.
+
+    The Razorpay SDK never passes a timeout, so without this a slow API
+    holds a web worker indefinitely.
+    """
+
+    def __init__(self, timeout=(3.05, 10), pool_size=10, name='http'):
+        super().__init__()
+        self.timeout = timeout
+        self.name = name
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with metrics.timed(self.name):
+            return super().request(*args, **kwargs)
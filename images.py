@@ -0,0 +1,149 @@
+"""Responsive image derivatives.
+
+Remote images get their width ladder as Cloudinary eager transformations at
+upload time; the derivative URLs are stored next to the image on the trip
+and itinerary documents (``image_variants``).
+
+Images that live under ``static/wp-content/uploads/2021/01`` are resized
+locally:
+
+    python images.py        # writes <uploads>/derived/*.webp|*.avif + manifest.json
+
+Templates call ``picture_sources(image, variants, sizes)`` to emit the
+``<source srcset>`` tags for whichever of the two applies.
+"""
+import json
+import os
+import sys
+
+from markupsafe import Markup, escape
+
+ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
+UPLOADS_PATH = os.path.join(ROOT_PATH, 'static', 'wp-content', 'uploads', '2021', '01')
+DERIVED_DIRNAME = 'derived'
+
+WIDTHS = (400, 800, 1200, 1600)
+FORMATS = ('avif', 'webp')
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+RESIZABLE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+
+
+def ladder_widths(original_width, widths=WIDTHS):
+    # Never upscale: widths below the original, plus the original itself if it falls inside the ladder
+    ladder = [w for w in widths if w < original_width]
+    if original_width <= max(widths): ladder.append(original_width)
+    return ladder
+
+
+# --- Cloudinary (remote images) ---
+
+def eager_transformations():
+    return [{"width": w, "crop": "limit", "fetch_format": fmt, "quality": "auto"} for fmt in FORMATS for w in WIDTHS]
+
+
+def upload_with_variants(file, **options):
+    """Upload to Cloudinary and ask it to pre-generate the width ladder.
+
+    Returns (secure_url, variants) where variants is {format: [[width, url], ...]}
+    or None for non-images such as mp4.
+    """
+    import cloudinary.uploader
+    import cloudinary.utils
+
+    result = cloudinary.uploader.upload(file, eager=eager_transformations(), eager_async=True, **options)
+    if result.get('resource_type') != 'image':
+        return result['secure_url'], None
+
+    variants = {}
+    for fmt in FORMATS:
+        ladder = []
+        for w in ladder_widths(result.get('width') or max(WIDTHS)):
+            url, _ = cloudinary.utils.cloudinary_url(
+                result['public_id'], version=result.get('version'), secure=True,
+                width=w, crop="limit", fetch_format=fmt, quality="auto"
+            )
+            ladder.append([w, url])
+        variants[fmt] = ladder
+    return result['secure_url'], variants
+
+
+# --- Local files under static/ ---
+
+def build_local_derivatives(folder=UPLOADS_PATH, widths=WIDTHS, formats=FORMATS):
+    """Resize every image in ``folder`` into ``folder/derived`` and write a manifest."""
+    from PIL import Image, features
+
+    formats = [fmt for fmt in formats if features.check(fmt)]
+    out_dir = os.path.join(folder, DERIVED_DIRNAME)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+
+    for filename in sorted(os.listdir(folder)):
+        base, ext = os.path.splitext(filename)
+        source = os.path.join(folder, filename)
+        if ext.lower() not in RESIZABLE_EXTENSIONS or not os.path.isfile(source):
+            continue
+        try:
+            with Image.open(source) as img:
+                img.load()
+                if img.mode not in ('RGB', 'RGBA'):
+                    img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'P') else 'RGB')
+                entry = {}
+                for fmt in formats:
+                    ladder = []
+                    for w in ladder_widths(img.width, widths):
+                        name = f"{base}-{w}w.{fmt}"
+                        target = os.path.join(out_dir, name)
+                        if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+                            resized = img.resize((w, round(img.height * w / img.width)), Image.LANCZOS) if w != img.width else img
+                            resized.save(target, fmt.upper(), quality=70)
+                        ladder.append([w, f"{DERIVED_DIRNAME}/{name}"])
+                    entry[fmt] = ladder
+                manifest[filename] = entry
+        except Exception as e:
+            print(f"❌ Could not resize {filename}: {e}")
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+class LocalDerivatives:
+    def __init__(self, folder=UPLOADS_PATH, static_prefix='wp-content/uploads/2021/01'):
+        self.static_prefix = static_prefix
+        self.manifest = {}
+        path = os.path.join(folder, DERIVED_DIRNAME, 'manifest.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+
+    def variants(self, filename, url_for_static):
+        entry = self.manifest.get(filename)
+        if not entry: return None
+        return {fmt: [[w, url_for_static(f"{self.static_prefix}/{rel}")] for w, rel in ladder] for fmt, ladder in entry.items()}
+
+
+# --- Templates ---
+
+def srcset(ladder):
+    return ', '.join(f"{url} {w}w" for w, url in ladder)
+
+
+def make_picture_sources(local, url_for_static):
+    def picture_sources(image, variants=None, sizes='100vw'):
+        """<source> tags for a <picture>; empty when the image has no derivatives."""
+        if not variants and image and 'http' not in image:
+            variants = local.variants(image, url_for_static)
+        if not variants: return Markup('')
+        tags = [
+            f'<source type="{MIME_TYPES[fmt]}" srcset="{escape(srcset(variants[fmt]))}" sizes="{escape(sizes)}">'
+            for fmt in FORMATS if variants.get(fmt)
+        ]
+        return Markup(''.join(tags))
+    return picture_sources
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else UPLOADS_PATH
+    manifest = build_local_derivatives(folder)
+    print(f"✅ Wrote derivatives for {len(manifest)} images into {os.path.join(folder, DERIVED_DIRNAME)}")
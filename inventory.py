@@ -0,0 +1,216 @@
+"""Seat inventory for trips.
+
+``trips.spots`` is an integer count of seats still available and
+``trips.capacity`` the total the admin set. A booking reserves its seats with
+one conditional ``$inc`` (``spots >= seats``), so concurrent bookers can never
+oversell and never wait on a lock: the update either takes the seats or
+matches nothing.
+
+Unpaid bookings hold their seats until ``hold_expires_at``. Expired holds are
+released by ``release_expired()``, which book_trip() calls at most once per
+``sweep_interval`` per worker and ``flask release-expired-holds`` runs on
+demand. Inside a request the sweep stops after ``sweep_limit`` holds and a
+background thread releases the rest, so a backlog never stalls a booker. payment_verify() turns the hold into a confirmed seat.
+
+Booking ``hold`` states: ``held`` -> ``confirmed``, or ``held`` -> ``expired``;
+``released`` when an admin cancels. Trips whose ``spots`` is not a number yet
+(created before inventory existed) are not limited until
+``flask rebuild-inventory`` converts them.
+
+Pages show a trip's availability (sold out, a few seats left, or available),
+not its exact count, so ``on_availability_change`` only fires when a
+reservation or release moves a trip from one of those to another.
+"""
+import datetime
+import threading
+import time
+
+from pymongo import ReturnDocument
+
+
+def parse_spots(value):
+    """Admin form value -> non-negative int, or None when blank or not a number."""
+    try:
+        return max(int(str(value).strip()), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def availability(spots, few_left=5):
+    """What trip pages show for ``spots`` seats left: 'sold_out', 'few_left', 'available', or None when unlimited."""
+    if not isinstance(spots, (int, float)):
+        return None
+    if spots <= 0:
+        return 'sold_out'
+    return 'few_left' if spots <= few_left else 'available'
+
+
+class SeatInventory:
+    def __init__(self, hold_minutes=15, sweep_interval=60, sweep_limit=50, few_left=5):
+        self.hold_minutes = hold_minutes
+        self.few_left = few_left
+        self.sweep_interval = sweep_interval
+        self.sweep_limit = sweep_limit
+        self.get_trips = None
+        self.get_bookings = None
+        self.on_availability_change = None
+        self._swept_at = 0.0
+        self._sweeper = None
+        self._lock = threading.Lock()
+
+    def bind(self, get_trips, get_bookings, on_availability_change=None):
+        """``on_availability_change()`` is called when a trip's availability() changes (e.g. to drop cached pages)."""
+        self.get_trips = get_trips
+        self.get_bookings = get_bookings
+        self.on_availability_change = on_availability_change
+
+    def availability(self, spots):
+        return availability(spots, self.few_left)
+
+    def _changed(self, before, after):
+        if self.on_availability_change is not None and self.availability(before) != self.availability(after):
+            self.on_availability_change()
+
+    # --- Seats ---
+
+    def reserve(self, trip_id, seats=1):
+        """Take ``seats`` from the trip in one atomic step.
+
+        Returns the seats left afterwards, None when the trip has no numeric
+        inventory (unlimited), or False when there aren't enough seats.
+        """
+        trip = self.get_trips().find_one_and_update(
+            {"_id": trip_id, "spots": {"$gte": seats}},
+            {"$inc": {"spots": -seats}},
+            projection={"spots": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if trip is not None:
+            self._changed(trip['spots'] + seats, trip['spots'])
+            return trip['spots']
+        current = self.get_trips().find_one({"_id": trip_id}, {"spots": 1}) or {}
+        return False if isinstance(current.get('spots'), (int, float)) else None
+
+    def release(self, trip_id, seats=1):
+        trip = self.get_trips().find_one_and_update(
+            {"_id": trip_id, "spots": {"$type": "number"}},
+            {"$inc": {"spots": seats}},
+            projection={"spots": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if trip is not None: self._changed(trip['spots'] - seats, trip['spots'])
+
+    # --- Holds on bookings ---
+
+    def expiry(self, now=None):
+        return (now or datetime.datetime.utcnow()) + datetime.timedelta(minutes=self.hold_minutes)
+
+    def hold_fields(self, trip_id, seats=1):
+        """Fields a new booking stores to hold ``seats`` it has just reserved."""
+        return {"trip_id": trip_id, "seats": seats, "hold": "held", "hold_expires_at": self.expiry()}
+
+    def is_expired(self, booking, now=None):
+        now = now or datetime.datetime.utcnow()
+        return booking.get('hold') == 'expired' or (
+            booking.get('hold') == 'held' and booking.get('hold_expires_at') is not None and booking['hold_expires_at'] <= now)
+
+    def is_cancelled(self, booking):
+        """Cancelled by an admin, seats given back: the booking can't be paid for any more."""
+        return booking.get('hold') == 'released' and booking.get('status') == 'Cancelled'
+
+    def renew(self, booking):
+        """Make sure an unpaid booking holds its seats before payment. Returns False when it can't have them.
+
+        An expired hold, or a released one an admin has since reopened, takes its seats again if they
+        are still free. A cancelled booking is refused, so confirm() never has to oversell for it.
+        """
+        if self.is_cancelled(booking):
+            return False
+        hold = booking.get('hold')
+        if hold != 'released' and not self.is_expired(booking):
+            return True
+        if hold == 'held':
+            # Expired but not swept yet: the seats are still taken, just extend the hold
+            self.get_bookings().update_one({"_id": booking['_id'], "hold": "held"},
+                                           {"$set": {"hold_expires_at": self.expiry()}})
+            return True
+        if self.reserve(booking['trip_id'], booking.get('seats', 1)) is False:
+            return False
+        self.get_bookings().update_one({"_id": booking['_id'], "hold": hold},
+                                       {"$set": {"hold": "held", "status": "Pending",
+                                                 "hold_expires_at": self.expiry()}})
+        return True
+
+    def confirm(self, booking):
+        """Turn the booking's hold into a confirmed seat. Returns False if the seats had to be oversold."""
+        if booking.get('hold') not in ('held', 'expired', 'released'):
+            return True
+        result = self.get_bookings().update_one({"_id": booking['_id'], "hold": "held"},
+                                                {"$set": {"hold": "confirmed"}, "$unset": {"hold_expires_at": ""}})
+        if result.modified_count:
+            return True
+        # The hold lapsed or was cancelled and its seats went back; the booking stands, so take them again.
+        # Claim the booking first so a repeated confirmation can't take the seats twice.
+        result = self.get_bookings().update_one({"_id": booking['_id'], "hold": {"$in": ["expired", "released"]}},
+                                                {"$set": {"hold": "confirmed"}, "$unset": {"hold_expires_at": ""}})
+        if not result.modified_count:
+            return True
+        oversold = self.reserve(booking['trip_id'], booking.get('seats', 1)) is False
+        if oversold:
+            trip = self.get_trips().find_one_and_update({"_id": booking['trip_id']}, {"$inc": {"spots": -booking.get('seats', 1)}},
+                                                        projection={"spots": 1}, return_document=ReturnDocument.AFTER)
+            if trip is not None: self._changed(trip['spots'] + booking.get('seats', 1), trip['spots'])
+            self.get_bookings().update_one({"_id": booking['_id']}, {"$set": {"oversold": True}})
+            print(f"⚠️ Booking {booking['_id']} was confirmed after losing its seat hold and the trip was full: oversold")
+        return not oversold
+
+    def cancel(self, booking):
+        """Give back the seats of a booking that is being cancelled."""
+        result = self.get_bookings().update_one({"_id": booking['_id'], "hold": {"$in": ["held", "confirmed"]}},
+                                                {"$set": {"hold": "released"}, "$unset": {"hold_expires_at": ""}})
+        if result.modified_count:
+            self.release(booking['trip_id'], booking.get('seats', 1))
+
+    def release_expired(self, now=None, limit=None):
+        """Release the seats of unpaid holds past their expiry, at most ``limit`` of them. Returns how many were released."""
+        now = now or datetime.datetime.utcnow()
+        released = 0
+        while limit is None or released < limit:
+            # Claim one at a time so two sweepers never release the same hold twice
+            booking = self.get_bookings().find_one_and_update(
+                {"hold": "held", "hold_expires_at": {"$lte": now}},
+                {"$set": {"hold": "expired", "status": "Cancelled"}},
+                projection={"trip_id": 1, "seats": 1}
+            )
+            if booking is None:
+                return released
+            self.release(booking['trip_id'], booking.get('seats', 1))
+            released += 1
+        return released
+
+    def _sweep_rest(self):
+        try:
+            self.release_expired()
+        except Exception as e:
+            print(f"❌ Could not release expired holds: {e}")
+
+    def maybe_release_expired(self):
+        now = time.monotonic()
+        if now - self._swept_at < self.sweep_interval:
+            return 0
+        with self._lock:
+            if now - self._swept_at < self.sweep_interval:
+                return 0
+            self._swept_at = now
+        try:
+            released = self.release_expired(limit=self.sweep_limit)
+        except Exception as e:
+            print(f"❌ Could not release expired holds: {e}")
+            return 0
+        if released >= self.sweep_limit:
+            # A backlog: release the rest off the request, one background sweep per worker at a time
+            with self._lock:
+                if self._sweeper is None or not self._sweeper.is_alive():
+                    self._sweeper = threading.Thread(target=self._sweep_rest, name='hold-sweeper', daemon=True)
+                    self._sweeper.start()
+        return released
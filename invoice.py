@@ -0,0 +1,220 @@
+import datetime
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from bson.binary import Binary
+from pymongo import UpdateOne
+
+import metrics
+
+# ReportLab is imported inside the functions that draw: it is the heaviest import in the app, and with
+# INVOICE_WORKERS > 0 only the render processes ever need it.
+
+ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def _pool_context():
+    # Not fork(): the pool starts from request and outbox threads, and a child forked from a threaded
+    # process can inherit a lock (imports, logging, ReportLab's) another thread held, and hang on it
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+PRIMARY_COLOR = "#28a745"
+TEXT_COLOR = "#333333"
+LIGHT_GRAY = "#f4f4f4"
+
+
+@lru_cache(maxsize=1)
+def load_logo():
+    """Find and decode the logo once per process. Returns an ImageReader or None."""
+    from reportlab.lib.utils import ImageReader
+
+    for base in (ROOT_PATH, os.getcwd()):
+        logo_path = os.path.join(base, 'static', 'img', 'logo.png')
+        if os.path.exists(logo_path):
+            try:
+                logo = ImageReader(logo_path)
+                logo.getRGBData()  # decode now, not on every drawImage
+                print(f"✅ Invoice logo loaded from {logo_path}")
+                return logo
+            except Exception as e:
+                print(f"❌ Error loading invoice logo: {e}")
+                return None
+    print("❌ Invoice logo NOT found, falling back to text")
+    return None
+
+
+def render_invoice(booking, price, payment_id, date=None):
+    """Draw the invoice PDF and return its bytes.
+
+    Only plain data goes in and out so it can run in a worker process.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    price = float(price or 0)
+    date = date or datetime.datetime.now().strftime('%Y-%m-%d')
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    # --- Header Section ---
+    logo = load_logo()
+    if logo is not None:
+        c.drawImage(logo, 50, height - 100, width=120, height=50, preserveAspectRatio=True, mask='auto')
+    else:
+        c.setFont("Helvetica-Bold", 24)
+        c.setFillColor(PRIMARY_COLOR)
+        c.drawString(50, height - 80, "Wanderer")
+
+    # Invoice Details (Top Right)
+    c.setFillColor(TEXT_COLOR)
+    c.setFont("Helvetica-Bold", 20)
+    c.drawRightString(width - 50, height - 70, "INVOICE")
+
+    c.setFont("Helvetica", 10)
+    c.drawRightString(width - 50, height - 90, f"Date: {date}")
+    c.drawRightString(width - 50, height - 105, f"ID: {payment_id}")
+
+    c.setStrokeColor(colors.lightgrey)
+    c.line(50, height - 120, width - 50, height - 120)
+
+    # --- Bill To Section ---
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, height - 150, "Billed To:")
+
+    c.setFont("Helvetica", 12)
+    c.drawString(50, height - 170, booking.get('name', 'Traveler'))
+    c.drawString(50, height - 190, booking.get('email', ''))
+
+    # --- Table Header ---
+    y = height - 240
+    c.setFillColor(LIGHT_GRAY)
+    c.rect(50, y, width - 100, 30, fill=1, stroke=0)
+
+    c.setFillColor(TEXT_COLOR)
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(60, y + 10, "DESCRIPTION")
+    c.drawRightString(width - 60, y + 10, "AMOUNT")
+
+    # --- Table Content ---
+    y -= 30
+    c.setFont("Helvetica", 10)
+    c.drawString(60, y + 10, f"Trip Package: {booking.get('trip')}")
+    c.drawRightString(width - 60, y + 10, f"INR {price:,.2f}")
+
+    c.setStrokeColor(colors.lightgrey)
+    c.line(50, y, width - 50, y)
+
+    # --- Total ---
+    y -= 40
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(width - 200, y, "Total:")
+    c.setFillColor(PRIMARY_COLOR)
+    c.drawString(width - 60, y, f"INR {price:,.2f}")
+
+    # --- Footer ---
+    c.setFillColor(TEXT_COLOR)
+    c.setFont("Helvetica-Oblique", 10)
+    c.drawCentredString(width / 2, 50, "Thank you for traveling with Wanderer!")
+
+    c.save()
+    return buffer.getvalue()
+
+
+class InvoiceStore:
+    """Renders invoices off the request thread and keeps the PDFs by payment id.
+
+    ``workers`` > 0 renders in a process pool; 0 renders inline in whichever
+    thread asks (useful on serverless platforms that can't fork).
+    """
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.get_collection = None
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def bind(self, get_collection):
+        self.get_collection = get_collection
+
+    @property
+    def collection(self):
+        return self.get_collection()
+
+    def _executor(self):
+        # A pool inherited through fork() is unusable, so each process gets its own
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def reset(self):
+        """Forget a pool inherited through fork(), e.g. from a post-fork hook; the next render starts this process's own."""
+        with self._lock:
+            if self._pool_pid != os.getpid():
+                self._pool = None
+                self._pool_pid = None
+
+    def render(self, booking, price, payment_id, date=None):
+        booking = {k: booking.get(k) for k in ('name', 'email', 'trip')}
+        with metrics.timed('reportlab'):
+            if self.workers <= 0:
+                return render_invoice(booking, price, payment_id, date)
+            return self._executor().submit(render_invoice, booking, price, payment_id, date).result()
+
+    def get(self, payment_id):
+        doc = self.collection.find_one({"_id": payment_id, "pdf": {"$exists": True}}, {"pdf": 1})
+        return bytes(doc['pdf']) if doc else None
+
+    def get_or_create(self, payment_id, booking=None, price=None):
+        """Return the stored PDF, rendering and storing it first if needed."""
+        pdf = self.get(payment_id)
+        if pdf is not None:
+            return pdf
+
+        if booking is None:
+            doc = self.collection.find_one({"_id": payment_id}, {"booking": 1, "price": 1, "date": 1})
+            if doc is None:
+                return None
+            booking, price, date = doc['booking'], doc['price'], doc.get('date')
+        else:
+            date = datetime.datetime.now().strftime('%Y-%m-%d')
+
+        pdf = self.render(booking, price, payment_id, date)
+        self.collection.update_one(
+            {"_id": payment_id},
+            {"$set": {"pdf": Binary(pdf), "rendered_at": datetime.datetime.utcnow()}},
+            upsert=True
+        )
+        return pdf
+
+    def _request(self, payment_id, booking, price):
+        return UpdateOne(
+            {"_id": payment_id},
+            {"$setOnInsert": {
+                "booking_id": booking.get('_id'),
+                "booking": {k: booking.get(k) for k in ('name', 'email', 'trip')},
+                "price": price,
+                "date": datetime.datetime.now().strftime('%Y-%m-%d'),
+                "created_at": datetime.datetime.utcnow(),
+            }},
+            upsert=True
+        )
+
+    def request(self, payment_id, booking, price):
+        """Record what the invoice for ``payment_id`` should contain; rendering happens later."""
+        self.request_many([(payment_id, booking, price)])
+
+    def request_many(self, requests):
+        """request() for several ``(payment_id, booking, price)`` at once, in one bulk write."""
+        if requests:
+            self.collection.bulk_write([self._request(*r) for r in requests], ordered=False)
@@ -0,0 +1,150 @@
+"""Admin CMS uploads to Cloudinary.
+
+Files submitted together (a trip's main image and its itinerary day images)
+are uploaded concurrently through a small per-process thread pool, so saving
+a trip takes about as long as its slowest upload.
+
+Every upload is keyed by the SHA-256 of its content in ``media_hashes``
+(``_id`` is the hex digest). A file that was uploaded before, or that appears
+twice in the same form, reuses the stored URL instead of being sent again.
+
+Videos go through Cloudinary's chunked ``upload_large``, which reads the
+request's spooled temp file a chunk at a time instead of loading it whole.
+"""
+import datetime
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import metrics
+from images import upload_with_variants
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Cloudinary's minimum for upload_large parts is 5 MB
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+VIDEO_EXTENSIONS = {'mp4'}
+
+
+def content_hash(stream, chunk_size=HASH_CHUNK_SIZE):
+    """SHA-256 of a file-like object, read in chunks. Leaves the stream rewound."""
+    stream.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def is_video(filename):
+    return '.' in (filename or '') and filename.rsplit('.', 1)[1].lower() in VIDEO_EXTENSIONS
+
+
+class MediaUploader:
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.get_collection = None
+        self.cloudinary_config = None
+        self._configured = False
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def bind(self, get_collection):
+        """``get_collection`` returns the collection holding the hash -> URL index."""
+        self.get_collection = get_collection
+
+    @property
+    def collection(self):
+        return self.get_collection()
+
+    def configure(self, **config):
+        """Cloudinary credentials, applied (and the SDK imported) on the first upload."""
+        self.cloudinary_config = config
+        self._configured = False
+
+    def _ensure_configured(self):
+        if self._configured:
+            return
+        with self._lock:
+            if not self._configured:
+                import cloudinary
+                if self.cloudinary_config:
+                    cloudinary.config(**self.cloudinary_config)
+                self._configured = True
+
+    def _executor(self):
+        # Threads don't survive fork(), so each process starts its own pool
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='upload')
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def reset(self):
+        """Forget a pool inherited through fork(), e.g. from a post-fork hook; the next upload starts this process's own."""
+        with self._lock:
+            if self._pool_pid != os.getpid():
+                self._pool = None
+                self._pool_pid = None
+
+    def lookup(self, sha256):
+        doc = self.collection.find_one({"_id": sha256}, {"url": 1, "variants": 1})
+        return (doc['url'], doc.get('variants')) if doc else None
+
+    def _remember(self, sha256, url, variants, file):
+        self.collection.update_one(
+            {"_id": sha256},
+            {"$setOnInsert": {
+                "url": url,
+                "variants": variants,
+                "filename": file.filename,
+                "created_at": datetime.datetime.utcnow(),
+            }},
+            upsert=True
+        )
+
+    def _upload(self, sha256, file):
+        self._ensure_configured()
+        with metrics.timed('cloudinary'):
+            if is_video(file.filename):
+                import cloudinary.uploader
+                result = cloudinary.uploader.upload_large(
+                    file.stream, resource_type='video', chunk_size=UPLOAD_CHUNK_SIZE, filename=file.filename
+                )
+                url, variants = result['secure_url'], None
+            else:
+                url, variants = upload_with_variants(file)
+        try:
+            self._remember(sha256, url, variants, file)
+        except Exception as e:
+            # The upload itself worked; only the next identical file will be sent again
+            print(f"❌ Could not record upload hash {sha256[:12]}: {e}")
+        return url, variants
+
+    def submit_all(self, files):
+        """Start uploading ``{key: FileStorage}`` and return ``{key: Future}``.
+
+        Each future resolves to ``(secure_url, variants)``. Identical files
+        share one future; files already in the index resolve immediately.
+        """
+        futures, by_hash = {}, {}
+        for key, file in files.items():
+            sha256 = content_hash(file.stream)
+            if sha256 in by_hash:
+                futures[key] = by_hash[sha256]
+                continue
+
+            known = None
+            try:
+                known = self.lookup(sha256)
+            except Exception as e:
+                print(f"❌ Upload hash lookup failed: {e}")
+            if known is not None:
+                future = Future()
+                future.set_result(known)
+            else:
+                future = self._executor().submit(metrics.propagate(self._upload), sha256, file)
+            futures[key] = by_hash[sha256] = future
+        return futures
@@ -0,0 +1,259 @@
+"""Per-request timing, Server-Timing headers and Prometheus metrics.
+
+Inside a request, time spent in each dependency (MongoDB commands, Razorpay
+and other HTTP calls, SMTP, Cloudinary, ReportLab, Jinja rendering) is added
+up and sent back as a ``Server-Timing`` header, so the browser's network panel
+shows where a slow checkout went. Requests slower than ``slow_request_ms`` are
+logged with the same breakdown.
+
+Every request and dependency call is also observed into a histogram. Each
+worker buffers its histograms in memory and every ``flush_interval`` seconds
+adds them into the ``metrics`` collection with ``$inc``. ``/metrics`` renders
+the combined totals of all workers in the Prometheus text format.
+
+Library code marks a dependency with::
+
+    with metrics.timed('smtp'):
+        ...
+"""
+import atexit
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import before_render_template, g, request, template_rendered
+from pymongo import UpdateOne, monitoring
+
+log = logging.getLogger(__name__)
+
+PREFIX = 'wanderer'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+_collector = None
+
+
+class RequestTimings:
+    """Total seconds and call count per dependency for one request."""
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, dependency, seconds):
+        with self._lock:
+            span = self.spans.setdefault(dependency, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self, total):
+        parts = [f'{name};dur={seconds * 1000:.1f};desc="{count} call{"s" if count != 1 else ""}"'
+                 for name, (seconds, count) in sorted(self.spans.items())]
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+    def summary(self):
+        return ', '.join(f"{name} {seconds * 1000:.0f} ms x{count}"
+                         for name, (seconds, count) in sorted(self.spans.items(), key=lambda s: -s[1][0]))
+
+
+def record(dependency, seconds):
+    """Attribute ``seconds`` of ``dependency`` time to the current request, if any, and observe it."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(dependency, seconds)
+    if _collector is not None:
+        _collector.observe('dependency_duration_seconds',
+                           {'route': timings.route if timings else '-', 'dependency': dependency}, seconds)
+
+
+@contextmanager
+def timed(dependency):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(dependency, time.perf_counter() - started)
+
+
+def propagate(fn):
+    """Wrap ``fn`` to run in the caller's context, so work handed to a thread pool is billed to the request."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+class MongoTimer(monitoring.CommandListener):
+    """Times every command the client sends. Commands outside a request (background threads) are not counted."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if _current.get() is not None:
+            record('mongo', event.duration_micros / 1e6)
+
+    def failed(self, event):
+        if _current.get() is not None:
+            record('mongo', event.duration_micros / 1e6)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    items = sorted(labels.items()) + ([extra] if extra else [])
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+class Metrics:
+    HELP = {
+        'request_duration_seconds': 'Time to handle a request, by route, method and status.',
+        'dependency_duration_seconds': 'Time spent in one call to an external dependency or in template rendering.',
+    }
+
+    def __init__(self, flush_interval=10, slow_request_ms=1000, token=None):
+        self.flush_interval = flush_interval
+        self.slow_request_ms = slow_request_ms
+        self.token = token
+        self.get_collection = None
+        self.is_configured = None
+        self._buffer = {}
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def bind(self, get_collection, is_configured=None):
+        """``get_collection`` returns the collection the workers aggregate their histograms into.
+
+        ``is_configured`` says whether there is a database to flush to at all; without one, flush() drops the buffer.
+        """
+        self.get_collection = get_collection
+        self.is_configured = is_configured
+
+    # --- Recording ---
+
+    def observe(self, metric, labels, seconds):
+        key = (metric, tuple(sorted(labels.items())))
+        bucket = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+        with self._lock:
+            entry = self._buffer.get(key)
+            if entry is None:
+                entry = self._buffer[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            entry[bucket] += 1
+            entry[-1] += seconds
+
+    def flush(self):
+        """Add this worker's buffered observations to the shared totals."""
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+            self._flushed_at = time.monotonic()
+        if not buffer or self.get_collection is None or (self.is_configured is not None and not self.is_configured()):
+            return
+        operations = []
+        for (metric, labels), entry in buffer.items():
+            inc = {f"buckets.{i}": n for i, n in enumerate(entry[:-1]) if n}
+            inc.update({"count": sum(entry[:-1]), "sum": entry[-1]})
+            doc_id = metric + '|' + '|'.join(f"{k}={v}" for k, v in labels)
+            operations.append(UpdateOne({"_id": doc_id}, {"$inc": inc, "$setOnInsert": {"metric": metric, "labels": dict(labels)}},
+                                        upsert=True))
+        token = _current.set(None)  # the flush's own commands are not part of any request
+        try:
+            self.get_collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Also runs at exit: stderr, so it can't corrupt output a parent process parses
+            log.warning("Could not flush metrics: %s", e)
+        finally:
+            _current.reset(token)
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    # --- Exposition ---
+
+    def render(self):
+        self.flush()
+        docs = sorted(self.get_collection().find(), key=lambda d: (d['metric'], sorted(d['labels'].items())))
+        lines, seen = [], set()
+        for doc in docs:
+            name = f"{PREFIX}_{doc['metric']}"
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {self.HELP.get(doc['metric'], doc['metric'])}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            buckets = doc.get('buckets', {})
+            for i, bound in enumerate(BUCKETS):
+                cumulative += buckets.get(str(i), 0)
+                lines.append(f"{name}_bucket{_format_labels(doc['labels'], ('le', bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(doc['labels'], ('le', '+Inf'))} {doc.get('count', 0)}")
+            lines.append(f"{name}_sum{_format_labels(doc['labels'])} {doc.get('sum', 0.0)}")
+            lines.append(f"{name}_count{_format_labels(doc['labels'])} {doc.get('count', 0)}")
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        # Every scrape flushes and reads the whole collection, so it is never left open: no token, no endpoint
+        if not self.token:
+            return "Not Found", 404
+        if request.headers.get('Authorization') != f"Bearer {self.token}":
+            return "Unauthorized", 401
+        try:
+            body = self.render()
+        except Exception as e:
+            return f"Metrics unavailable: {e}", 503
+        return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8', 'Cache-Control': 'no-store'}
+
+    # --- Flask wiring ---
+
+    def _before_request(self):
+        g.request_timings = RequestTimings(request.endpoint or 'unmatched')
+        g.request_timings_token = _current.set(g.request_timings)
+
+    def _after_request(self, response):
+        timings = g.get('request_timings')
+        if timings is None or request.endpoint == 'metrics':
+            return response
+        total = timings.elapsed()
+        response.headers['Server-Timing'] = timings.header(total)
+        self.observe('request_duration_seconds',
+                     {'route': timings.route, 'method': request.method, 'status': str(response.status_code)}, total)
+        if total * 1000 >= self.slow_request_ms:
+            print(f"🐢 Slow request: {request.method} {request.full_path.rstrip('?')} -> {response.status_code} "
+                  f"in {total * 1000:.0f} ms ({timings.summary() or 'no dependency calls'})")
+        # After the response is sent, so no client waits on the flush
+        response.call_on_close(self.maybe_flush)
+        return response
+
+    def _teardown_request(self, exc):
+        token = g.pop('request_timings_token', None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                _current.set(None)
+
+    def _template_started(self, sender, template, context, **extra):
+        g.setdefault('template_starts', []).append(time.perf_counter())
+
+    def _template_finished(self, sender, template, context, **extra):
+        starts = g.get('template_starts')
+        if starts:
+            record('jinja', time.perf_counter() - starts.pop())
+
+    def init_app(self, app):
+        global _collector
+        _collector = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        atexit.register(self.flush)
@@ -0,0 +1,239 @@
+import datetime
+import os
+import smtplib
+import threading
+import time
+
+from bson.binary import Binary
+from pymongo import ReturnDocument
+
+import metrics
+
+
+class Outbox:
+    """Durable, Mongo-backed email queue.
+
+    Routes call ``enqueue()`` and return immediately. A worker (a daemon
+    thread in each web process, or ``flask outbox-worker`` as a separate
+    process) claims pending messages in batches and sends them over a single
+    SMTP connection, retrying failures with exponential backoff. Messages that
+    run out of attempts stay in the collection with ``status: 'failed'`` and
+    the last error so they can be inspected and re-queued.
+    """
+
+    def __init__(self, batch_size=20, max_attempts=5, backoff_base=30, poll_interval=5, lock_timeout=300):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.app = None
+        self.get_mail = None
+        self.get_collection = None
+        self.attachment_loaders = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def bind(self, app, get_mail, get_collection):
+        """``get_mail`` returns the Flask-Mail instance; it is only called when a batch is sent."""
+        self.app = app
+        self.get_mail = get_mail
+        self.get_collection = get_collection
+
+    @property
+    def collection(self):
+        return self.get_collection()
+
+    def register_attachment_loader(self, source, loader):
+        """Let attachments be stored as a reference that ``loader(ref)`` turns into bytes at send time."""
+        self.attachment_loaders[source] = loader
+
+    # --- Producer side ---
+
+    def _message(self, subject, recipients, html=None, body=None, attachments=None, attachment_refs=None):
+        now = datetime.datetime.utcnow()
+        return {
+            "subject": subject,
+            "recipients": list(recipients),
+            "html": html,
+            "body": body,
+            "attachments": [
+                {"filename": filename, "content_type": content_type, "data": Binary(data)}
+                for filename, content_type, data in (attachments or [])
+            ] + [
+                {"filename": filename, "content_type": content_type, "source": source, "ref": ref}
+                for filename, content_type, source, ref in (attachment_refs or [])
+            ],
+            "status": "pending",
+            "attempts": 0,
+            "created_at": now,
+            "next_attempt_at": now,
+            "last_error": None,
+        }
+
+    def enqueue(self, subject, recipients, html=None, body=None, attachments=None, attachment_refs=None, start_worker=True):
+        """Queue a message.
+
+        ``attachments`` is a list of (filename, content_type, bytes);
+        ``attachment_refs`` is a list of (filename, content_type, source, ref)
+        resolved through a registered attachment loader when the mail is sent.
+        """
+        result = self.collection.insert_one(self._message(subject, recipients, html, body, attachments, attachment_refs))
+        if start_worker:
+            self.start()
+            self._wake.set()
+        return result.inserted_id
+
+    def enqueue_many(self, messages, start_worker=True):
+        """Queue several messages with one insert; each is a dict of enqueue()'s keyword arguments."""
+        docs = [self._message(**message) for message in messages]
+        if not docs:
+            return []
+        result = self.collection.insert_many(docs, ordered=False)
+        if start_worker:
+            self.start()
+            self._wake.set()
+        return result.inserted_ids
+
+    # --- Worker side ---
+
+    def start(self):
+        """Start the background sender thread once per process (safe after fork)."""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run_forever, name="outbox-worker", daemon=True)
+            self._thread.start()
+
+    def run_forever(self):
+        while True:
+            try:
+                sent = self.drain()
+            except Exception as e:
+                print(f"❌ Outbox worker error: {e}")
+                sent = 0
+            if not sent:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def drain(self, deadline=None):
+        """Send every message that is due, reusing one SMTP connection. Returns the number processed.
+
+        With ``deadline`` (a time.monotonic() value) no new batch is claimed after it, so a
+        serverless call can stop before its time limit; the rest waits for the next drain.
+        """
+        with self.app.app_context():
+            batch = self._claim_batch()
+            if not batch:
+                return 0
+
+            connection = self.get_mail().connect()
+            try:
+                with metrics.timed('smtp'):
+                    conn = connection.__enter__()
+            except Exception as e:
+                print(f"❌ Outbox could not connect to SMTP: {e}")
+                for doc in batch:
+                    self._mark_failed(doc, e)
+                return len(batch)
+
+            processed = 0
+            try:
+                while batch:
+                    for i, doc in enumerate(batch):
+                        try:
+                            message = self._to_message(doc)
+                            with metrics.timed('smtp'):
+                                conn.send(message)
+                        except Exception as e:
+                            self._mark_failed(doc, e)
+                            if _is_connection_error(e):
+                                # The connection itself is gone; give the rest of the batch back.
+                                for rest in batch[i + 1:]:
+                                    self._release(rest)
+                                return processed + i + 1
+                        else:
+                            self._mark_sent(doc)
+                    processed += len(batch)
+                    batch = self._claim_batch() if deadline is None or time.monotonic() < deadline else []
+            finally:
+                connection.__exit__(None, None, None)
+            return processed
+
+    def _claim_batch(self):
+        now = datetime.datetime.utcnow()
+        stale = now - datetime.timedelta(seconds=self.lock_timeout)
+        batch = []
+        for _ in range(self.batch_size):
+            doc = self.collection.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    # A worker died mid-send; take its claim over
+                    {"status": "sending", "locked_at": {"$lte": stale}},
+                ]},
+                {"$set": {"status": "sending", "locked_at": now}},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if doc is None:
+                break
+            batch.append(doc)
+        return batch
+
+    def _to_message(self, doc):
+        from flask_mail import Message
+
+        msg = Message(doc['subject'], recipients=doc['recipients'])
+        if doc.get('html'): msg.html = doc['html']
+        if doc.get('body'): msg.body = doc['body']
+        for attachment in doc.get('attachments', []):
+            if 'data' in attachment:
+                data = bytes(attachment['data'])
+            else:
+                data = self.attachment_loaders[attachment['source']](attachment['ref'])
+                if data is None:
+                    raise LookupError(f"{attachment['source']} attachment {attachment['ref']} is not available")
+            msg.attach(attachment['filename'], attachment['content_type'], data)
+        return msg
+
+    def _mark_sent(self, doc):
+        self.collection.update_one(
+            {"_id": doc['_id']},
+            {"$set": {"status": "sent", "sent_at": datetime.datetime.utcnow(), "last_error": None},
+             "$unset": {"locked_at": "", "attachments": ""}}
+        )
+        print(f"✅ Email '{doc['subject']}' sent to {', '.join(doc['recipients'])}")
+
+    def _mark_failed(self, doc, error):
+        attempts = doc.get('attempts', 0) + 1
+        update = {"attempts": attempts, "last_error": str(error)}
+        if attempts >= self.max_attempts:
+            update["status"] = "failed"
+            print(f"❌ Email '{doc['subject']}' to {', '.join(doc['recipients'])} failed permanently: {error}")
+        else:
+            update["status"] = "pending"
+            update["next_attempt_at"] = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.backoff_base * 2 ** (attempts - 1))
+        self.collection.update_one({"_id": doc['_id']}, {"$set": update, "$unset": {"locked_at": ""}})
+
+    def _release(self, doc):
+        self.collection.update_one({"_id": doc['_id']}, {"$set": {"status": "pending"}, "$unset": {"locked_at": ""}})
+
+    def retry_failed(self):
+        """Put every permanently failed message back in the queue."""
+        result = self.collection.update_many(
+            {"status": "failed"},
+            {"$set": {"status": "pending", "attempts": 0, "next_attempt_at": datetime.datetime.utcnow()}}
+        )
+        return result.modified_count
+
+
+def _is_connection_error(error):
+    # SMTPException subclasses OSError, but only a dropped socket means the rest of the batch can't go out
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
@@ -0,0 +1,83 @@
+import datetime
+import os
+import threading
+import time
+
+
+def make_client(key_id, key_secret, connect_timeout=3.05, read_timeout=10, pool_size=10):
+    import razorpay
+    from http_session import TimeoutSession
+
+    session = TimeoutSession(timeout=(connect_timeout, read_timeout), pool_size=pool_size, name='razorpay')
+    return razorpay.Client(session=session, auth=(key_id, key_secret))
+
+
+class LazyClient:
+    """Stands in for the Razorpay client until a route first uses it.
+
+    The SDK is only imported and the pooled session only opened on the first
+    attribute access, once per process, so pages that never take a payment
+    don't pay for either at startup.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._client_pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        pid = os.getpid()
+        if self._client is None or self._client_pid != pid:
+            with self._lock:
+                if self._client is None or self._client_pid != pid:
+                    self._client = self._factory()
+                    self._client_pid = pid
+        return self._client
+
+    def reset(self):
+        with self._lock:
+            self._client = None
+            self._client_pid = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def get_or_create_order(client, bookings_collection, booking, amount_paise, currency="INR", notes=None):
+    """Return a Razorpay order for ``booking``, creating one only when needed.
+
+    An unpaid booking that already has an order for the same amount and
+    currency gets that order back without calling Razorpay, so refreshing the
+    payment page neither costs a round trip nor leaves orphaned orders.
+    """
+    stored = booking.get('razorpay_order') or {}
+    if (booking.get('payment_status') != 'Paid' and stored.get('id')
+            and stored.get('amount') == amount_paise and stored.get('currency') == currency):
+        return {"id": stored['id'], "amount": stored['amount'], "currency": stored['currency']}
+
+    started = time.perf_counter()
+    order = client.order.create(data={
+        "amount": amount_paise,
+        "currency": currency,
+        "receipt": str(booking['_id']),
+        "notes": notes or {},
+    })
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"💳 Razorpay order {order['id']} created in {elapsed_ms:.0f} ms")
+
+    record = {
+        "id": order['id'], "amount": amount_paise, "currency": currency,
+        "created_at": datetime.datetime.utcnow(), "create_ms": round(elapsed_ms, 1),
+    }
+    # Only replace the order we read; if another request got there first, use theirs
+    result = bookings_collection.update_one(
+        {"_id": booking['_id'], "razorpay_order_id": booking.get('razorpay_order_id')},
+        {"$set": {"razorpay_order_id": order['id'], "razorpay_order": record}}
+    )
+    if result.modified_count == 0:
+        current = bookings_collection.find_one({"_id": booking['_id']}, {"razorpay_order": 1}) or {}
+        winner = current.get('razorpay_order') or {}
+        if winner.get('amount') == amount_paise and winner.get('currency') == currency:
+            return {"id": winner['id'], "amount": winner['amount'], "currency": winner['currency']}
+    return {"id": order['id'], "amount": amount_paise, "currency": currency}
@@ -0,0 +1,124 @@
+"""Catch payments whose browser never came back to /payment/verify.
+
+A booking becomes Paid only when the checkout page posts the signed result
+back. If the traveller closes the tab after paying, Razorpay has captured the
+money but the booking stays Unpaid. ``PaymentReconciler`` pages through
+unpaid bookings that have an order, asks Razorpay for each order's payments
+from a small thread pool under a requests-per-second cap, and hands the
+captured ones to ``apply`` a batch at a time.
+
+Bookings are read by ``_id`` ranges, a batch at a time, and every checked
+booking gets ``payment_checked_at`` so the next run skips it for
+``recheck_after_minutes``; a backlog of any size is walked in bounded memory
+and each order is asked about at most once per run.
+"""
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+
+
+class RateLimiter:
+    """At most ``rate`` acquisitions per second across all threads, spaced evenly."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def captured_payment(client, order_id):
+    """The captured payment of a Razorpay order, or None if nothing has been captured."""
+    payments = client.order.payments(order_id).get('items', [])  # timed as 'razorpay' by its TimeoutSession
+    return next((p for p in payments if p.get('status') == 'captured'), None)
+
+
+class PaymentReconciler:
+    def __init__(self, client, max_workers=4, requests_per_second=5, batch_size=200, retries=3, backoff=1.0):
+        self.client = client
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(requests_per_second)
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.get_bookings = None
+
+    def bind(self, get_bookings):
+        self.get_bookings = get_bookings
+
+    def pending(self, min_age_minutes=15, since_days=30, recheck_after_minutes=60, now=None):
+        """Unpaid bookings with an order, in ``_id`` order, one batch at a time.
+
+        Orders younger than ``min_age_minutes`` are left alone (the traveller may still be paying).
+        """
+        now = now or datetime.datetime.utcnow()
+        query = {
+            "payment_status": "Unpaid",
+            "razorpay_order_id": {"$exists": True},
+            # Orders from before their creation time was stored count as old enough
+            "razorpay_order.created_at": {"$not": {"$gt": now - datetime.timedelta(minutes=min_age_minutes)}},
+            "$or": [{"payment_checked_at": {"$exists": False}},
+                    {"payment_checked_at": {"$lte": now - datetime.timedelta(minutes=recheck_after_minutes)}}],
+        }
+        # Walk forward from the oldest booking in range; an ObjectId starts with its creation time
+        bound = {"$gte": ObjectId.from_datetime(now - datetime.timedelta(days=since_days))}
+        while True:
+            batch = list(self.get_bookings().find(dict(query, _id=bound)).sort("_id", 1).limit(self.batch_size))
+            if not batch:
+                return
+            yield batch
+            bound = {"$gt": batch[-1]['_id']}
+
+    def _fetch_one(self, booking):
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                return booking, captured_payment(self.client, booking['razorpay_order_id']), None
+            except Exception as e:
+                if attempt == self.retries:
+                    return booking, None, e
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def fetch(self, bookings, pool):
+        """``(booking, captured payment or None, error or None)`` for each booking."""
+        return list(pool.map(self._fetch_one, bookings))
+
+    def run(self, apply, dry_run=False, **pending_options):
+        """Reconcile every pending booking. ``apply(paid)`` receives ``[(booking, payment), ...]`` per batch."""
+        stats = {"checked": 0, "paid": 0, "errors": 0}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for batch in self.pending(**pending_options):
+                results = self.fetch(batch, pool)
+                paid = [(booking, payment) for booking, payment, error in results if payment is not None]
+                errors = [(booking, error) for booking, _, error in results if error is not None]
+                for booking, error in errors:
+                    print(f"❌ Could not check order {booking['razorpay_order_id']} (booking {booking['_id']}): {error}")
+                stats["checked"] += len(results) - len(errors)
+                stats["paid"] += len(paid)
+                stats["errors"] += len(errors)
+                if dry_run:
+                    for booking, payment in paid:
+                        print(f"💳 Booking {booking['_id']} was paid ({payment['id']})")
+                    continue
+                if paid:
+                    apply(paid)
+                # Unpaid ones wait recheck_after minutes; failed lookups are retried on the next run
+                checked_at = datetime.datetime.utcnow()
+                marks = [UpdateOne({"_id": booking['_id']}, {"$set": {"payment_checked_at": checked_at}})
+                         for booking, payment, error in results if payment is None and error is None]
+                if marks:
+                    self.get_bookings().bulk_write(marks, ordered=False)
+        stats["seconds"] = time.perf_counter() - started
+        return stats
@@ -0,0 +1,158 @@
+import functools
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request, session
+
+
+class SharedVersion:
+    """A counter in the meta collection that every worker can bump and watch.
+
+    Reads are rate-limited to one per ``check_interval`` seconds per worker.
+    """
+
+    def __init__(self, doc_id, check_interval=2):
+        self.doc_id = doc_id
+        self.check_interval = check_interval
+        self.get_meta = None
+        self.clock = None
+        self._value = 0
+        self._checked_at = 0.0
+        # As CatalogCache.read_after: reads of the data this counter versions wait for this causal position
+        self.read_after = None
+
+    def bind(self, get_meta, clock=None):
+        self.get_meta = get_meta
+        self.clock = clock
+
+    @property
+    def value(self):
+        now = time.monotonic()
+        if self.get_meta is not None and now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                doc = self.get_meta().find_one({'_id': self.doc_id})
+                value = doc['value'] if doc else 0
+                if value != self._value:
+                    self.read_after = self.clock() if self.clock else None
+                self._value = value
+            except Exception as e:
+                print(f"❌ Version check for {self.doc_id} failed: {e}")
+        return self._value
+
+    def bump(self):
+        if self.get_meta is None:
+            return
+        try:
+            self.get_meta().update_one({'_id': self.doc_id}, {'$inc': {'value': 1}}, upsert=True)
+        except Exception as e:
+            print(f"❌ Version bump for {self.doc_id} failed: {e}")
+        # Re-read on next use so this worker sees its own write immediately
+        self._checked_at = 0.0
+
+
+class ResponseCache:
+    """Size-bounded cache of rendered public pages, stored gzip-compressed.
+
+    Keys combine the endpoint, its URL arguments, the query arguments the
+    view reads and the current content versions, so a version bump makes
+    every older entry unreachable; LRU eviction then reclaims the space.
+    Responses carry a strong ETag and ``If-None-Match`` is answered with 304.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, versions=None, compresslevel=6):
+        self.max_bytes = max_bytes
+        self.versions = versions or (lambda: ())
+        self.compresslevel = compresslevel
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        size = len(entry['body'])
+        # One page should never push out most of the cache
+        if size > self.max_bytes // 8:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old['body'])
+            self._entries[key] = entry
+            self.size += size
+            while self.size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted['body'])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _store(self, response):
+        body = response.get_data()
+        return {
+            'etag': hashlib.sha256(body).hexdigest()[:32],
+            'body': gzip.compress(body, compresslevel=self.compresslevel, mtime=0),
+            'content_type': response.content_type,
+        }
+
+    def _respond(self, entry, status):
+        gzipped = bool(request.accept_encodings['gzip'])
+        # Strong validators must differ between encodings of the same page
+        etag = entry['etag'] + ('-gz' if gzipped else '')
+        if request.if_none_match.contains_weak(entry['etag']) or request.if_none_match.contains_weak(entry['etag'] + '-gz'):
+            response = Response(status=304)
+        else:
+            body = entry['body'] if gzipped else gzip.decompress(entry['body'])
+            response = Response(body, content_type=entry['content_type'])
+            if gzipped:
+                response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = status
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def bypass(self):
+        # Logged-in admins always get a fresh render, since pages show them extra controls
+        return request.method != 'GET' or bool(session.get('admin_logged_in'))
+
+    def key(self, view_args, args=()):
+        return (request.endpoint, tuple(sorted(view_args.items())),
+                tuple((name, tuple(request.args.getlist(name))) for name in args), self.versions())
+
+    def lookup(self, key):
+        """The cached response for ``key`` (a 304 when the client's copy is current), or None."""
+        entry = self.get(key)
+        return self._respond(entry, 'HIT') if entry is not None else None
+
+    def store(self, key, rv):
+        """Cache a freshly rendered view result if it is a 200 HTML page; returns the response to send."""
+        response = make_response(rv)
+        if response.status_code != 200 or response.mimetype != 'text/html' or response.direct_passthrough:
+            return response
+        entry = self._store(response)
+        self.put(key, entry)
+        return self._respond(entry, 'MISS')
+
+    def cached(self, args=()):
+        """Cache a GET view's 200 HTML responses, keyed on its URL arguments and the query arguments in ``args``."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(**kwargs):
+                if self.bypass():
+                    return view(**kwargs)
+                key = self.key(kwargs, args)
+                return self.lookup(key) or self.store(key, view(**kwargs))
+            return wrapper
+        return decorator
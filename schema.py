@@ -0,0 +1,181 @@
+"""Field types for trips and bookings, and the projections each page reads them with.
+
+Writes go through ``clean()``, which coerces form strings to the stored types
+(prices and seat counts are ints, so MongoDB can add them up) and collects
+every problem into one SchemaError. ``flask migrate-schema`` converts
+documents written before this existed; reads stay tolerant of both.
+
+List pages fetch trips through a named projection instead of whole
+documents: a trip's itinerary, with every day's description and image
+variants, is most of its size and only the itinerary page shows it.
+"""
+import datetime
+import re
+
+from pymongo import UpdateOne
+
+EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class SchemaError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(f"{field}: {message}" for field, message in errors.items()))
+
+
+# --- Field types ---
+# Each takes the raw value and returns the stored one, raising ValueError with a message for the admin.
+
+def text(max_length=None, required=False):
+    def coerce(value):
+        value = str(value).strip() if value is not None else ''
+        if not value:
+            if required: raise ValueError("is required")
+            return None
+        if max_length and len(value) > max_length:
+            raise ValueError(f"must be at most {max_length} characters")
+        return value
+    return coerce
+
+
+def integer(minimum=0, required=False):
+    def coerce(value):
+        if value is None or str(value).strip() == '':
+            if required: raise ValueError("is required")
+            return None
+        try:
+            number = int(float(str(value).strip().replace(',', '')))
+        except ValueError:
+            raise ValueError(f"must be a whole number, not '{value}'")
+        if minimum is not None and number < minimum:
+            raise ValueError(f"must be at least {minimum}")
+        return number
+    return coerce
+
+
+def email(required=False):
+    check = text(254, required)
+    def coerce(value):
+        value = check(value)
+        if value is not None and not EMAIL.match(value):
+            raise ValueError(f"'{value}' is not an email address")
+        return value.lower() if value else value
+    return coerce
+
+
+def day():
+    def coerce(value):
+        value = str(value).strip() if value is not None else ''
+        if not value:
+            return None
+        try:
+            return datetime.datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"'{value}' is not a date (YYYY-MM-DD)")
+    return coerce
+
+
+TRIP = {
+    'name': text(120, required=True),
+    'description': text(10000),
+    'price': integer(minimum=0, required=True),
+    'capacity': integer(minimum=0),
+    'image': text(2000),
+}
+
+ITINERARY_DAY = {
+    'title': text(200, required=True),
+    'description': text(10000),
+}
+
+BOOKING = {
+    'name': text(120, required=True),
+    'email': email(required=True),
+    'trip': text(200, required=True),
+    'trip_slug': text(200),
+    'travel_date': day(),
+}
+
+
+def clean(schema, data, fields=None):
+    """Coerce ``data`` to ``schema``. Only ``fields`` (default: all of the schema) are read; others are ignored.
+
+    Raises SchemaError listing every invalid field.
+    """
+    cleaned, errors = {}, {}
+    for field in fields or schema:
+        try:
+            cleaned[field] = schema[field](data.get(field))
+        except ValueError as e:
+            errors[field] = str(e)
+    if errors:
+        raise SchemaError(errors)
+    return cleaned
+
+
+# --- Projections ---
+# What each view renders; pass as the projection of a find().
+
+PROJECTIONS = {
+    # Home page cards
+    'card': {"name": 1, "slug": 1, "price": 1, "spots": 1, "image": 1, "image_variants": 1},
+    # Cards plus the text the home page search indexes (no itinerary images)
+    'search': {"name": 1, "slug": 1, "price": 1, "spots": 1, "image": 1, "image_variants": 1, "description": 1,
+               "itinerary.title": 1, "itinerary.description": 1},
+    # Admin dashboard table rows
+    'row': {"name": 1, "slug": 1, "price": 1, "spots": 1, "capacity": 1},
+    # Itinerary page, edit form, booking and payment: the whole document
+    'detail': None,
+}
+
+
+# --- Migration ---
+
+NUMERIC_FIELDS = {
+    'trips': ('price', 'capacity', 'spots'),
+    'bookings': ('amount', 'seats'),
+}
+# Trips from before seat inventory kept only their total, as a string in spots: that is also their capacity
+FILL_FIELDS = {
+    'trips': {'capacity': 'spots'},
+}
+
+
+def numeric_updates(doc, fields):
+    """$set/$unset turning the string-typed ``fields`` of ``doc`` into ints, and the values that couldn't be read."""
+    to_int = integer(minimum=None)
+    update, unreadable = {}, {}
+    for field in fields:
+        value = doc.get(field)
+        if not isinstance(value, str):
+            continue
+        try:
+            update.setdefault("$set", {})[field] = to_int(value)
+        except ValueError:
+            unreadable[field] = value
+            update.setdefault("$unset", {})[field] = ""
+    return update, unreadable
+
+
+def migrate_numbers(collection, fields, fill=None, batch_size=1000):
+    """Convert string-typed numeric fields in ``collection`` to ints, a bulk_write per batch.
+
+    ``fill`` maps a missing field to the converted field that should supply it. Returns
+    (documents changed, {_id: {field: unreadable value}}); unreadable values are removed.
+    """
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    projection = {field: 1 for field in set(fields) | set(fill or {})}
+    changed, unreadable, batch = 0, {}, []
+    for doc in collection.find(query, projection).batch_size(batch_size):
+        update, bad = numeric_updates(doc, fields)
+        for field, source in (fill or {}).items():
+            if field not in doc and source in update.get("$set", {}):
+                update["$set"][field] = update["$set"][source]
+        if bad: unreadable[doc['_id']] = bad
+        batch.append(UpdateOne({"_id": doc['_id']}, update))
+        if len(batch) == batch_size:
+            changed += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        changed += collection.bulk_write(batch, ordered=False).modified_count
+    return changed, unreadable
@@ -0,0 +1,166 @@
+"""Trip search for the home page.
+
+An in-memory inverted index over each trip's name, description and itinerary
+day titles and descriptions. Text is lowercased, stripped of accents and split
+into alphanumeric tokens; user input goes through the same tokenizer and is
+only ever looked up as tokens, never run as a pattern.
+
+Every query token must match a trip (as a whole word, or as the start of one
+for tokens of two or more characters), and trips are ranked by where the
+words appear (the name counts most) weighted by how rare they are.
+
+Posting lists are kept best match first. A query walks the list of its
+rarest term, checks the other terms against each trip, and stops after
+MAX_CANDIDATES full matches or MAX_SCANNED trips, so its cost is bounded
+however large the catalog grows; the trips it skips could only rank below the
+ones it kept on the rarest term.
+
+The index is built from the catalog's trip list and rebuilt whenever that list
+is replaced, i.e. after an admin edit invalidates the catalog cache or its
+entry expires.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+
+TOKEN = re.compile(r'[a-z0-9]+')
+FIELD_WEIGHTS = {'name': 8.0, 'day_title': 3.0, 'description': 1.0, 'day_description': 0.5}
+PREFIX_QUALITY = 0.6
+MAX_QUERY_TERMS = 8
+MAX_TERM_LENGTH = 40
+MAX_EXPANSIONS = 32
+MAX_CANDIDATES = 200
+MAX_SCANNED = 2000
+
+
+def tokenize(text):
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode('ascii')
+    return TOKEN.findall(text.lower())
+
+
+def trip_fields(trip):
+    yield 'name', trip.get('name')
+    yield 'description', trip.get('description')
+    for day in trip.get('itinerary') or []:
+        yield 'day_title', day.get('title')
+        yield 'day_description', day.get('description')
+
+
+class SearchIndex:
+    def __init__(self, trips):
+        self.trips = list(trips)
+        postings = {}
+        for i, trip in enumerate(self.trips):
+            weights = {}
+            for field, text in trip_fields(trip):
+                for token in set(tokenize(text)):
+                    # Each field counts once per token, however often the word repeats in it
+                    weights[(token, field)] = FIELD_WEIGHTS[field]
+            for (token, _), weight in weights.items():
+                docs = postings.setdefault(token, {})
+                docs[i] = docs.get(i, 0.0) + weight
+        self.postings = postings
+        self.ranked = {token: sorted(docs.items(), key=lambda item: (-item[1], item[0])) for token, docs in postings.items()}
+        self.vocabulary = sorted(postings)
+        self.idf = {token: math.log(1 + len(self.trips) / len(docs)) for token, docs in postings.items()}
+
+    def expand(self, term):
+        """Index tokens ``term`` matches, with how well: 1.0 for the word itself, less for longer words it starts."""
+        if term in self.postings:
+            yield term, 1.0
+        if len(term) < 2:
+            return
+        start = bisect.bisect_right(self.vocabulary, term)
+        for token in self.vocabulary[start:start + MAX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            yield token, PREFIX_QUALITY
+
+    def _stream(self, token, quality):
+        boost = self.idf[token] * quality
+        return ((-weight * boost, doc) for doc, weight in self.ranked[token])
+
+    def _score(self, doc, expansions):
+        return max((self.postings[token].get(doc, 0.0) * self.idf[token] * quality for token, quality in expansions), default=0.0)
+
+    def search(self, query, limit):
+        terms = dict.fromkeys(t[:MAX_TERM_LENGTH] for t in tokenize(query)[:MAX_QUERY_TERMS])
+        matches = [list(self.expand(term)) for term in terms]
+        if not matches or not all(matches):
+            return []
+        # Drive the scan from the term that matches fewest trips; the others are checked per trip
+        matches.sort(key=lambda expansions: sum(len(self.postings[token]) for token, _ in expansions))
+        driver, others = matches[0], matches[1:]
+
+        scores, seen = {}, set()
+        for neg_score, doc in heapq.merge(*(self._stream(token, quality) for token, quality in driver)):
+            if doc in seen:
+                continue
+            seen.add(doc)
+            if len(seen) > MAX_SCANNED or len(scores) >= MAX_CANDIDATES:
+                break
+            total = -neg_score
+            for expansions in others:
+                score = self._score(doc, expansions)
+                if not score:
+                    break
+                total += score
+            else:
+                scores[doc] = total
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [self.trips[doc] for doc, _ in ranked]
+
+
+class TripSearch:
+    """Keeps one SearchIndex per worker, rebuilt when the trip list it was built from is replaced.
+
+    Catalogs of up to ``sync_limit`` trips are indexed on the request path (a few milliseconds per hundred
+    trips). For larger ones only the first index is; later rebuilds run in a background thread while
+    searches keep using the previous index.
+    """
+
+    def __init__(self, max_results=24, sync_limit=2000):
+        self.max_results = max_results
+        self.sync_limit = sync_limit
+        self._source = None
+        self._index = None
+        self._building = None
+        self._lock = threading.Lock()
+
+    def _build(self, trips):
+        index = SearchIndex(trips)
+        with self._lock:
+            self._index, self._source = index, trips
+            if self._building is trips:
+                self._building = None
+        return index
+
+    def _build_in_background(self, trips):
+        try:
+            self._build(trips)
+        except Exception as e:
+            print(f"❌ Could not rebuild the search index: {e}")
+            with self._lock:
+                self._building = None
+
+    def index(self, trips):
+        with self._lock:
+            index, current = self._index, self._source is trips
+            start = (index is not None and not current and self._building is None
+                     and len(trips) > self.sync_limit)
+            if start:
+                self._building = trips
+        if current:
+            return index
+        if index is None or len(trips) <= self.sync_limit:
+            return self._build(trips)
+        if start:
+            threading.Thread(target=self._build_in_background, args=(trips,), name="search-index", daemon=True).start()
+        return index
+
+    def search(self, trips, query, limit=None):
+        """The trips matching ``query``, best first, at most ``limit`` (default max_results)."""
+        return self.index(trips).search(query, limit or self.max_results)
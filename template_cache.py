@@ -0,0 +1,81 @@
+"""Compiled templates shipped with the build, and rendered trip fragments kept in memory.
+
+``flask compile-templates`` (run by the Dockerfile and the Vercel build)
+compiles every template into TemplateBytecodeCache's directory, so a new
+worker or serverless instance loads ready-made Python bytecode instead of
+parsing and compiling template source. Entries are keyed by template name alone, so a cache built in one
+checkout works from another path; Jinja still checks each entry against the
+template's source checksum and the Python version, and recompiles a stale one.
+
+FragmentCache keeps the HTML of the parts of a page that depend on one trip
+alone (its home page card, its itinerary days), keyed by a digest of the
+fields they show. A card is rendered once and reused by every home page and
+search result listing it until the trip's name, price, seats or images
+change; the rest of the page (reviews, pagination, the booking form) is
+rendered per request as before.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    def get_cache_key(self, name, filename=None):
+        # Not the template's absolute path: the build and the running app may live in different directories
+        return super().get_cache_key(name)
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            # Missing or read-only directory (e.g. Vercel): the template stays compiled in memory only
+            pass
+
+    def compile_all(self, environment):
+        """Compile every template ``environment`` can load into the cache. Returns the names compiled."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.clear()
+        if environment.cache is not None:
+            environment.cache.clear()  # templates already loaded would not be written out again
+        names = environment.list_templates(filter_func=lambda name: name.endswith('.html'))
+        for name in names:
+            environment.get_template(name)
+        return names
+
+
+def fingerprint(values):
+    """A short digest of ``values`` (anything with a stable repr, like a trip document's fields)."""
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=16).digest()
+
+
+class FragmentCache:
+    """Bounded LRU of rendered HTML fragments, keyed by fragment name and the data rendered into it."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, values, render):
+        """The fragment ``name`` for ``values``, calling ``render()`` on a miss."""
+        key = (name, fingerprint(values))
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                return html
+        html = Markup(render())
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,61 @@
+import datetime
+
+import pytest
+
+from inventory import SeatInventory
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def store():
+    database = mongomock.MongoClient()['inventory-test']
+    inventory = SeatInventory()
+    inventory.bind(lambda: database.trips, lambda: database.bookings)
+    trip_id = database.trips.insert_one({"name": "Ziro", "spots": 1, "capacity": 2}).inserted_id
+    return inventory, database, trip_id
+
+
+def book(inventory, database, trip_id):
+    assert inventory.reserve(trip_id) is not False
+    booking = {"trip": "Ziro", "status": "Pending", **inventory.hold_fields(trip_id)}
+    booking['_id'] = database.bookings.insert_one(booking).inserted_id
+    return booking
+
+
+def test_renew_refuses_a_cancelled_booking(store):
+    inventory, database, trip_id = store
+    booking = book(inventory, database, trip_id)
+    inventory.cancel(booking)
+    database.bookings.update_one({"_id": booking['_id']}, {"$set": {"status": "Cancelled"}})
+    # Someone else takes the seat the cancellation gave back
+    book(inventory, database, trip_id)
+
+    cancelled = database.bookings.find_one({"_id": booking['_id']})
+    assert inventory.is_cancelled(cancelled)
+    assert inventory.renew(cancelled) is False
+    assert database.trips.find_one({"_id": trip_id})['spots'] == 0
+    assert database.bookings.find_one({"_id": booking['_id']})['hold'] == 'released'
+
+
+def test_renew_takes_seats_again_for_a_reopened_booking(store):
+    inventory, database, trip_id = store
+    booking = book(inventory, database, trip_id)
+    inventory.cancel(booking)
+    # An admin moved it back to Pending: it may be paid for if the seats are still free
+    reopened = database.bookings.find_one({"_id": booking['_id']})
+    reopened['status'] = 'Pending'
+
+    assert inventory.renew(reopened) is True
+    assert database.trips.find_one({"_id": trip_id})['spots'] == 0
+    assert database.bookings.find_one({"_id": booking['_id']})['hold'] == 'held'
+
+
+def test_renew_extends_an_expired_hold_that_was_not_swept(store):
+    inventory, database, trip_id = store
+    booking = book(inventory, database, trip_id)
+    booking['hold_expires_at'] = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+
+    assert inventory.renew(booking) is True
+    assert database.trips.find_one({"_id": trip_id})['spots'] == 0
+    assert database.bookings.find_one({"_id": booking['_id']})['hold_expires_at'] > datetime.datetime.utcnow()